@@ -0,0 +1,200 @@
+"""
+Offline batch scoring of web server access logs.
+
+This script scores nginx/Apache access log files (plain or gzip) with the
+preprocessing pipeline and the model loaded in-process, without going
+through the HTTP API. Lines are read by batches, scored in parallel by a
+pool of worker processes and written as Parquet or CSV part files.
+
+A checkpoint file in the output directory records the batches already
+written, so that an interrupted run can be restarted with the same command
+and only scores the remaining batches.
+
+Usage:
+------
+    python app/batch_score.py access.log access.log.1.gz --output-dir results \\
+        --format parquet --workers 4 --batch-size 100000
+"""
+
+import argparse  # Analyse des arguments de la ligne de commande
+import hashlib  # Identifiant stable des fichiers d'entrée
+import os  # Module pour interagir avec le système d'exploitation
+from collections import deque  # Lots en cours de traitement
+from multiprocessing import Pool  # Scoring sur plusieurs cœurs
+
+import joblib  # Pour charger le pipeline de prétraitement
+import pandas as pd  # Manipulation des données
+from src.data.access_logs import LOG_FORMATS, iter_log_batches, parse_log_line
+from src.data.save_data import FILE_FORMATS, load_json, save_frame, save_json
+from src.models.inference import DATASET_COLUMNS, extract_urls, predict_frame
+from utils import get_model
+
+CHECKPOINT_FILE = "_checkpoint.json"
+
+# État de chaque processus de scoring, initialisé par '_init_worker'
+_worker = {}
+
+
+def _init_worker(model_uri, pipeline_path, log_format, default_host, output_dir, file_format):
+    """
+    Load the model and the preprocessing pipeline in a worker process.
+    """
+    model_name, model_version = model_uri.split("/")[-2:]
+    _worker["model"] = get_model(model_name, model_version)
+    _worker["pipeline"] = joblib.load(pipeline_path)
+    _worker["log_format"] = log_format
+    _worker["default_host"] = default_host
+    _worker["output_dir"] = output_dir
+    _worker["file_format"] = file_format
+
+
+def _score_batch(file_key, batch_index, first_line, lines):
+    """
+    Parse and score a batch of raw log lines, then write its part file.
+
+    Parameters:
+    file_key (str): The identifier of the input file.
+    batch_index (int): The index of the batch in the input file.
+    first_line (int): The line number of the first line of the batch.
+    lines (list of bytes): The raw log lines.
+
+    Returns:
+    tuple: The file key, the batch index, the number of scored rows and the
+    number of skipped (unparsable) lines.
+    """
+    rows, line_numbers = [], []
+    for offset, line in enumerate(lines):
+        row = parse_log_line(line, _worker["log_format"], _worker["default_host"])
+        if row is not None:
+            rows.append(row)
+            line_numbers.append(first_line + offset)
+
+    result = pd.DataFrame(
+        {"line": [], "method": [], "host": [], "url": [], "prediction": []}
+    )
+    if rows:
+        # Horodatage du journal conservé pour les features par fenêtre glissante
+        data = pd.DataFrame(rows, columns=DATASET_COLUMNS + ["timestamp"])
+        predictions, _ = predict_frame(data, _worker["pipeline"], _worker["model"])
+        result = pd.DataFrame(
+            {
+                "line": line_numbers,
+                "method": data["Method"],
+                "host": data["host"],
+                "url": extract_urls(data["URL"]),
+                "prediction": predictions.astype(int),
+            }
+        )
+
+    file_format = _worker["file_format"]
+    path = os.path.join(
+        _worker["output_dir"], f"part-{file_key}-{batch_index:06d}.{file_format}"
+    )
+    save_frame(result, path, file_format)
+    return file_key, batch_index, len(rows), len(lines) - len(rows)
+
+
+def _file_key(path):
+    """
+    Return a stable identifier for an input file.
+    """
+    return hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:12]
+
+
+def _iter_tasks(paths, batch_size, checkpoint):
+    """
+    Iterate over the batches that are not recorded in the checkpoint yet.
+    """
+    for path in paths:
+        key = _file_key(path)
+        done = set(checkpoint["files"].get(key, {}).get("done", []))
+        for batch_index, lines in enumerate(iter_log_batches(path, batch_size)):
+            if batch_index not in done:
+                yield key, batch_index, batch_index * batch_size + 1, lines
+
+
+def run(args):
+    """
+    Score the input files and write the results in the output directory.
+
+    Parameters:
+    args (argparse.Namespace): The command-line arguments.
+
+    Returns:
+    dict: The checkpoint of the run.
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(args.output_dir, CHECKPOINT_FILE)
+    checkpoint = load_json(checkpoint_path, {"batch_size": args.batch_size, "files": {}})
+    if checkpoint["batch_size"] != args.batch_size:
+        raise ValueError(
+            f"The checkpoint was written with --batch-size {checkpoint['batch_size']}, "
+            "resume with the same batch size or use another output directory."
+        )
+    for path in args.inputs:
+        checkpoint["files"].setdefault(
+            _file_key(path), {"path": os.path.abspath(path), "done": [], "rows": 0, "skipped": 0}
+        )
+
+    def record(result):
+        key, batch_index, rows, skipped = result
+        entry = checkpoint["files"][key]
+        entry["done"].append(batch_index)
+        entry["rows"] += rows
+        entry["skipped"] += skipped
+        save_json(checkpoint, checkpoint_path)
+        print(f"{entry['path']} : lot {batch_index} ({rows} lignes, {skipped} ignorées)")
+
+    init_args = (
+        args.model_uri,
+        args.pipeline,
+        args.log_format,
+        args.default_host,
+        args.output_dir,
+        args.format,
+    )
+    tasks = _iter_tasks(args.inputs, args.batch_size, checkpoint)
+    if args.workers <= 1:
+        _init_worker(*init_args)
+        for task in tasks:
+            record(_score_batch(*task))
+        return checkpoint
+
+    with Pool(args.workers, initializer=_init_worker, initargs=init_args) as pool:
+        # Nombre de lots en vol borné pour ne pas lire tout le fichier en mémoire
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_score_batch, task))
+            if len(pending) >= 2 * args.workers:
+                record(pending.popleft().get())
+        while pending:
+            record(pending.popleft().get())
+    return checkpoint
+
+
+def parse_args(argv=None):
+    """
+    Parse the command-line arguments.
+    """
+    model_name = os.getenv("MLFLOW_MODEL_NAME", "random_forest_detection")
+    model_version = os.getenv("MLFLOW_MODEL_VERSION", "6")
+    parser = argparse.ArgumentParser(description="Score web server access logs offline.")
+    parser.add_argument("inputs", nargs="+", help="Access log files (plain or .gz).")
+    parser.add_argument("--output-dir", required=True, help="Directory of the results.")
+    parser.add_argument("--format", choices=FILE_FORMATS, default="parquet")
+    parser.add_argument("--log-format", choices=sorted(LOG_FORMATS), default="combined")
+    parser.add_argument(
+        "--default-host", default=None, help="Host used when the log does not record it."
+    )
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--model-uri", default=f"models:/{model_name}/{model_version}"
+    )
+    parser.add_argument("--pipeline", default="complete_preprocessor_pipeline.pkl")
+    return parser.parse_args(argv)
+
+
+# Point d'entrée du script
+if __name__ == "__main__":
+    run(parse_args())
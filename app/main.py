@@ -7,8 +7,22 @@ and a preprocessing pipeline. It supports prediction from individual requests an
 Endpoints:
 ----------
 - GET / : Returns a welcome message with model details.
-- POST /predict : Predicts the classification for a single request.
+- POST /predict : Predicts the classification for a single request; identical concurrent
+  requests share a single computation and results are cached.
 - POST /predict_csv : Predicts the classification for multiple requests from a CSV file.
+- POST /predict_raw : Predicts the classification for one or several raw HTTP requests.
+- POST /predict_records : Predicts the classification for one or several JSON requests,
+  decoded and encoded with the fast codec.
+- POST /jobs : Submits a CSV file for asynchronous scoring.
+- GET /jobs/{job_id} : Returns the state and the progress of a job.
+- GET /jobs/{job_id}/result : Downloads the result of a finished job (Parquet or CSV).
+- DELETE /jobs/{job_id} : Deletes a finished job and its files.
+- GET /shadow : Returns the agreement statistics of the shadow model versions.
+- GET /drift : Returns the running statistics of the features of the scored requests.
+- GET /features : Returns the features used by the model and those computed at inference.
+- GET /metrics : Returns the API metrics in the Prometheus text format.
+- WEBSOCKET /ws/predict : Streams request records in and predictions out on a persistent
+  connection, with correlation IDs, internal batching and flow control.
 
 Usage:
 ------
@@ -16,6 +30,7 @@ Run the API using the command:
     uvicorn main:app --reload
 """
 
+import hashlib  # Empreinte des règles du pré-filtre
 import os  # Module pour interagir avec le système d'exploitation
 from contextlib import (
     asynccontextmanager,
@@ -24,13 +39,69 @@ from typing import Dict, Optional  # Typage pour les dictionnaires et options
 from fastapi import (
     FastAPI,
     HTTPException,
+    Request,
+    Response,
     UploadFile,
     File,
+    WebSocket,
 )  # Framework FastAPI et gestion des exceptions
+from fastapi.concurrency import run_in_threadpool  # Calculs bloquants hors de la boucle
+from fastapi.responses import FileResponse  # Téléchargement des résultats des jobs
 from pydantic import BaseModel  # Validation et sérialisation des données
 import mlflow  # Module pour le suivi des expériences MLflow
 import joblib  # Pour charger le modèle pré-entraîné
 import pandas as pd  # Manipulation des données
+from src.data.raw_http import parse_raw_requests  # Parsing des requêtes HTTP brutes
+from src.features.build_features import (
+    CATEGORICAL_FEATURES,
+    NUMERIC_FEATURES,
+)  # Features produites par 'build_features'
+from src.models.early_exit import (
+    EarlyExitPredictor,
+    get_forest,
+)  # Évaluation de la forêt avec arrêt anticipé
+from src.models.inference import (
+    DATASET_COLUMNS,
+    extract_urls,
+    predict_chunks,
+    predict_frame,
+    predict_frames,
+    reusable_predictions,
+)  # Prétraitement et prédiction partagés avec le scoring hors ligne
+from src.models.lazy_features import select_features  # Features utilisées par la forêt
+from src.models.onnx_backend import OnnxBackend  # Inférence avec onnxruntime
+from src.models.shadow import ShadowScorer  # Scoring par des versions fantômes du modèle
+from src.monitoring.capture import TrafficCapture  # Capture du trafic scoré
+from src.monitoring.drift import (
+    DriftMonitor,
+    training_reference,
+)  # Statistiques de dérive des features
+from src.serving.admission import (
+    count_raw_requests,
+    count_records,
+    count_rows,
+    from_env as admission_from_env,
+)  # Contrôle d'admission des endpoints de prédiction
+from src.serving.coalescing import SingleFlight  # Regroupement des requêtes identiques
+from src.serving.codec import (
+    decode_records,
+    encode_predictions,
+)  # Décodage et encodage JSON rapides
+from src.serving.fingerprint import request_fingerprint  # Empreinte des requêtes
+from src.serving.jobs import JobManager, JobQuotaExceeded  # Jobs de scoring asynchrones
+from src.serving.memory import (
+    from_env as memory_from_env,
+)  # Budget mémoire des requêtes par lots
+from src.serving.metrics import render as render_metrics  # Exposition des métriques
+from src.serving.prediction_cache import PredictionCache  # Cache des prédictions
+from src.serving.prefilter import load_prefilter  # Pré-filtre à règles
+from src.serving.streaming import (
+    StreamBatcher,
+    serve_stream,
+)  # Canal WebSocket de classification en continu
+from src.serving.threads import (
+    from_env as threads_from_env,
+)  # Nombre de threads de la prédiction selon la taille des appels
 
 
 # Gestionnaire de contexte asynchrone pour la durée de vie de l'application
@@ -38,6 +109,16 @@ import pandas as pd  # Manipulation des données
 async def lifespan(app: FastAPI):
     global model  # Déclaration globale pour le modèle
     global complete_pipeline  # Déclaration globale pour le pipeline de prétraitement
+    global drift_monitor  # Déclaration globale pour le suivi de la dérive des features
+    global predictor  # Déclaration globale pour le mode d'inférence
+    global prefilter  # Déclaration globale pour le pré-filtre à règles
+    global single_flight  # Déclaration globale pour le regroupement des requêtes identiques
+    global shadow_scorer  # Déclaration globale pour les versions fantômes du modèle
+    global job_manager  # Déclaration globale pour les jobs de scoring asynchrones
+    global prediction_cache  # Déclaration globale pour le cache des prédictions
+    global traffic_capture  # Déclaration globale pour la capture du trafic scoré
+    global feature_selection  # Déclaration globale pour les features utilisées par le modèle
+    global stream_batcher  # Déclaration globale pour les lots du canal WebSocket
 
     # Vérification de la variable d'environnement pour l'URI de suivi MLflow
     if "MLFLOW_TRACKING_URI" in os.environ:
@@ -53,6 +134,23 @@ async def lifespan(app: FastAPI):
     # Chargement du modèle MLflow
     model = mlflow.pyfunc.load_model(model_uri=f"models:/{MODEL_NAME}/{VERSION}")
 
+    # Versions fantômes du modèle, scorées en arrière-plan (SHADOW_MODEL_VERSIONS=7,8)
+    shadow_scorer = None
+    shadow_versions = [
+        version.strip()
+        for version in os.getenv("SHADOW_MODEL_VERSIONS", "").split(",")
+        if version.strip()
+    ]
+    if shadow_versions:
+        shadow_scorer = ShadowScorer(
+            {
+                version: mlflow.pyfunc.load_model(model_uri=f"models:/{MODEL_NAME}/{version}")
+                for version in shadow_versions
+            },
+            max_pending=int(os.getenv("SHADOW_MAX_PENDING", "64")),
+        )
+        print(f"Versions fantômes chargées : {', '.join(shadow_versions)}")
+
     # Chargement du pipeline de prétraitement
     os.system(
         "mc cp s3/mthomassin/preprocessor/complete_preprocessor_pipeline.pkl "
@@ -60,6 +158,178 @@ async def lifespan(app: FastAPI):
     )
     complete_pipeline = joblib.load("complete_preprocessor_pipeline.pkl")
 
+    # Représentation compacte des features (COMPACT_FEATURES=1)
+    complete_pipeline.named_steps["feature_builder"].compact = (
+        os.getenv("COMPACT_FEATURES", "0") == "1"
+    )
+
+    # Coût borné des features : au plus FEATURE_SCAN_CAP caractères parcourus par
+    # URL et par corps (début et fin), quelle que soit leur taille ; désactivé par défaut
+    # (0), les prédictions des valeurs plus longues pouvant changer
+    complete_pipeline.named_steps["feature_builder"].scan_cap = (
+        int(os.getenv("FEATURE_SCAN_CAP", "0")) or None
+    )
+
+    # Features lues par les arbres du modèle et des versions fantômes ; avec LAZY_FEATURES=1,
+    # les autres ne sont pas calculées et prennent une constante sans effet sur les arbres
+    feature_selection = None
+    forests = [get_forest(model)]
+    if shadow_scorer is not None:
+        forests += [get_forest(shadow) for shadow in shadow_scorer.models.values()]
+    if None in forests:
+        print("Sélection des features ignorée : un modèle n'est pas une forêt scikit-learn")
+    else:
+        try:
+            feature_selection = select_features(
+                complete_pipeline.named_steps["preprocessor"], forests
+            )
+        except ValueError as e:
+            print(f"Sélection des features ignorée : {e}")
+    skipped_features = None
+    if feature_selection is not None and os.getenv("LAZY_FEATURES", "0") == "1":
+        skipped_features = feature_selection["skipped"] or None
+        print(f"Features non calculées : {', '.join(skipped_features or []) or 'aucune'}")
+    complete_pipeline.named_steps["feature_builder"].skipped_features = skipped_features
+
+    # Suivi de la dérive des features (désactivable avec DRIFT_MONITOR=0),
+    # sans les features remplacées par une constante
+    drift_monitor = None
+    if os.getenv("DRIFT_MONITOR", "1") != "0":
+        drift_monitor = DriftMonitor(
+            [feature for feature in NUMERIC_FEATURES if feature not in (skipped_features or {})],
+            CATEGORICAL_FEATURES,
+            reference=training_reference(complete_pipeline.named_steps["preprocessor"]),
+        )
+
+    # Mode d'inférence : évaluation complète ou arrêt anticipé de la forêt
+    predictor = None
+    if os.getenv("INFERENCE_MODE", "full") == "early_exit":
+        forest = get_forest(model)
+        if forest is None:
+            print("INFERENCE_MODE=early_exit ignoré : le modèle n'est pas une forêt scikit-learn")
+        else:
+            confidence = os.getenv("EARLY_EXIT_CONFIDENCE")
+            predictor = EarlyExitPredictor(
+                forest,
+                chunk_size=int(os.getenv("EARLY_EXIT_CHUNK_SIZE", "8")),
+                confidence=float(confidence) if confidence else None,
+            )
+
+    # Backend d'inférence : scikit-learn (défaut) ou onnxruntime (INFERENCE_BACKEND=onnx),
+    # à partir du graphe exporté par 'src/models/export_onnx.py'
+    if os.getenv("INFERENCE_BACKEND", "sklearn") == "onnx":
+        backend = OnnxBackend(
+            os.getenv("ONNX_MODEL_PATH", "model.onnx"),
+            intra_op_threads=int(os.getenv("ONNX_INTRA_OP_THREADS", "1")),
+        )
+        if not backend.matches(get_forest(model)):
+            print("INFERENCE_BACKEND=onnx ignoré : le graphe n'a pas été exporté depuis ce modèle")
+        else:
+            if predictor is not None:
+                print("INFERENCE_MODE=early_exit ignoré : remplacé par le backend ONNX")
+            predictor = backend
+
+    # Parallélisme de la forêt et des pools BLAS/OpenMP choisi à chaque appel
+    # (aucun thread pour les petits appels)
+    thread_scheduler.configure(get_forest(model), complete_pipeline)
+    print(
+        f"Threads de prédiction : {thread_scheduler.max_threads} au plus "
+        f"({thread_scheduler.cpus} CPU disponible(s))"
+    )
+
+    # Pré-filtre à règles devant le modèle (PREFILTER_RULES=chemin du fichier YAML)
+    prefilter = None
+    prefilter_digest = ""  # Empreinte du contenu des règles, pour l'espace de noms du cache
+    if os.getenv("PREFILTER_RULES"):
+        prefilter = load_prefilter(os.environ["PREFILTER_RULES"])
+        with open(os.environ["PREFILTER_RULES"], "rb") as file:
+            prefilter_digest = hashlib.sha256(file.read()).hexdigest()[:16]
+        print(f"Pré-filtre : {len(prefilter.rules)} règle(s) chargée(s)")
+
+    # Features par fenêtre glissante : chaque requête doit mettre à jour les compteurs,
+    # une prédiction réutilisée (cache, regroupement) ne passerait pas par eux
+    reusable = reusable_predictions(complete_pipeline)
+    if not reusable:
+        print("Features par fenêtre glissante : cache et regroupement des prédictions désactivés")
+
+    # Regroupement des requêtes identiques simultanées (désactivable avec COALESCING=0)
+    single_flight = None
+    if reusable and os.getenv("COALESCING", "1") != "0":
+        single_flight = SingleFlight()
+
+    # Cache des prédictions de /predict : L1 par worker, L2 partagé par les workers du nœud
+    # (PREDICTION_CACHE_PATH, par exemple sur /dev/shm) ; désactivable avec PREDICTION_CACHE=0
+    prediction_cache = None
+    if reusable and os.getenv("PREDICTION_CACHE", "1") != "0":
+        namespace = ":".join(
+            [
+                MODEL_NAME,
+                str(VERSION),
+                os.getenv("INFERENCE_MODE", "full"),
+                os.getenv("INFERENCE_BACKEND", "sklearn"),
+                os.getenv("FEATURE_SCAN_CAP", "0"),
+                os.getenv("EARLY_EXIT_CONFIDENCE", ""),
+                prefilter_digest,
+            ]
+        )
+        prediction_cache = PredictionCache(
+            namespace,
+            path=os.getenv("PREDICTION_CACHE_PATH") or None,
+            l1_size=int(os.getenv("PREDICTION_CACHE_L1_SIZE", "4096")),
+            max_entries=int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "100000")),
+        )
+
+    # Capture du trafic scoré en JSONL compressé (CAPTURE_DIR=répertoire des fichiers)
+    traffic_capture = None
+    if os.getenv("CAPTURE_DIR"):
+        traffic_capture = TrafficCapture(
+            os.environ["CAPTURE_DIR"],
+            model_version=f"{MODEL_NAME}:{VERSION}",
+            sample_rate=float(os.getenv("CAPTURE_SAMPLE_RATE", "1.0")),
+            max_queued_rows=int(os.getenv("CAPTURE_MAX_QUEUED_ROWS", "100000")),
+            max_bytes=int(os.getenv("CAPTURE_MAX_MB", "64")) * 1024 * 1024,
+            max_seconds=float(os.getenv("CAPTURE_ROTATE_SECONDS", "3600")),
+        )
+
+    # Jobs de scoring asynchrones, repris depuis leurs checkpoints au démarrage
+    job_manager = JobManager(
+        os.getenv("JOBS_DIR", "jobs"),
+        lambda chunk: predict_frame(
+            chunk,
+            complete_pipeline,
+            model,
+            drift_monitor,
+            predictor,
+            prefilter,
+            shadow_scorer,
+            traffic_capture,
+            thread_scheduler,
+        ),
+        workers=int(os.getenv("JOBS_WORKERS", "1")),
+        chunk_size=int(os.getenv("JOBS_CHUNK_SIZE", "10000")),
+        quota_bytes=int(os.getenv("JOBS_QUOTA_MB", "1024")) * 1024 * 1024,
+    )
+    job_manager.resume()
+
+    # Lots du canal WebSocket, formés à partir des messages de toutes les connexions :
+    # features calculées par message, preprocessor et modèle appelés une fois par lot
+    stream_batcher = StreamBatcher(
+        lambda frames: predict_frames(
+            frames,
+            complete_pipeline,
+            model,
+            drift_monitor,
+            predictor,
+            prefilter,
+            shadow_scorer,
+            traffic_capture,
+            thread_scheduler,
+        ),
+        max_batch_rows=int(os.getenv("STREAM_MAX_BATCH_ROWS", "512")),
+        max_delay=float(os.getenv("STREAM_MAX_DELAY_MS", "2")) / 1000,
+        max_queued_rows=int(os.getenv("STREAM_MAX_QUEUED_ROWS", "8192")),
+    )
+
     model_name = os.getenv("MLFLOW_MODEL_NAME", MODEL_NAME)
     model_version = os.getenv("MLFLOW_MODEL_VERSION", str(VERSION))
     print(f"model_name = {model_name}")
@@ -67,6 +337,155 @@ async def lifespan(app: FastAPI):
 
     yield  # Assure que le gestionnaire de contexte est utilisé correctement
 
+    # Arrêter la formation des lots du canal WebSocket
+    await stream_batcher.close()
+
+    # Écrire les lignes capturées encore en file et fermer le fichier courant
+    if traffic_capture is not None:
+        traffic_capture.close()
+
+    # Arrêter le traçage des allocations (MEMORY_TRACE=1)
+    memory_budget.close()
+
+
+# Contrôle d'admission : requêtes simultanées, file d'attente et budget de lignes par endpoint
+admission = {
+    "predict": admission_from_env("predict", concurrency=4, queue_size=64),
+    "predict_csv": admission_from_env("predict_csv", concurrency=1, queue_size=4, max_rows=200000),
+    "predict_raw": admission_from_env("predict_raw", concurrency=1, queue_size=8, max_rows=50000),
+    "predict_records": admission_from_env(
+        "predict_records", concurrency=1, queue_size=8, max_rows=50000
+    ),
+}
+
+# Budget mémoire par requête des endpoints par lots : rejet (par défaut) ou traitement par blocs
+memory_budget = memory_from_env()
+
+# Nombre de threads de la prédiction, selon la taille des appels et les CPU du conteneur
+thread_scheduler = threads_from_env()
+
+
+def read_csv_chunks(file, chunk_rows=None):
+    """
+    Read an uploaded CSV file at once, or chunk by chunk, checking its columns.
+
+    Parameters:
+    file (file-like): The uploaded file.
+    chunk_rows (int): The number of rows per chunk (None: the whole file).
+
+    Yields:
+    pd.DataFrame: The rows of the file.
+    """
+    chunks = [pd.read_csv(file)] if chunk_rows is None else pd.read_csv(file, chunksize=chunk_rows)
+    for df in chunks:
+        print("Données reçues pour la prédiction à partir du fichier CSV:")
+        print(df)
+
+        # Vérifier que le fichier contient les bonnes colonnes
+        if not all(col in df.columns for col in DATASET_COLUMNS):
+            raise HTTPException(
+                status_code=400,
+                detail="Le fichier CSV ne contient pas les colonnes nécessaires",
+            )
+        yield df
+
+
+def frame_chunks(df, chunk_rows=None):
+    """
+    Split a DataFrame into chunks of `chunk_rows` rows (None: a single chunk).
+    """
+    if chunk_rows is None:
+        return [df]
+    return (df.iloc[start:start + chunk_rows] for start in range(0, len(df), chunk_rows))
+
+
+async def read_body(request, endpoint):
+    """
+    Read the body of a request after checking its size against the memory budget.
+
+    Parameters:
+    request (Request): The HTTP request.
+    endpoint (str): The endpoint name, for the memory budget.
+
+    Returns:
+    bytes: The body.
+
+    Raises:
+    HTTPException: 413 if the body, parsed as a whole, would exceed the memory budget.
+    """
+    # Content-Length annoncé : rejet avant la lecture du corps
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit():
+        memory_budget.check_upload(endpoint, int(declared))
+    body = await request.body()
+    memory_budget.check_upload(endpoint, len(body))
+    return body
+
+
+def raw_frame(body):
+    """
+    Parse concatenated raw HTTP requests into a DataFrame.
+
+    Parameters:
+    body (bytes): The raw requests.
+
+    Returns:
+    pd.DataFrame: The requests, with the columns of `DATASET_COLUMNS`.
+
+    Raises:
+    ValueError: If a request line is malformed or the body contains no request.
+    """
+    records = parse_raw_requests(body)
+    if not records:
+        raise ValueError("Le corps de la requête ne contient aucune requête HTTP")
+    print(f"Requêtes HTTP brutes reçues pour la prédiction: {len(records)}")
+    return pd.DataFrame.from_records(records, columns=DATASET_COLUMNS)
+
+
+def records_frame(body):
+    """
+    Decode JSON requests into a DataFrame.
+
+    Parameters:
+    body (bytes): A JSON object with the fields of `PredictionRequest`, or an array of such objects.
+
+    Returns:
+    pd.DataFrame: The requests, with the columns of `DATASET_COLUMNS`.
+
+    Raises:
+    ValueError: If the body is not valid JSON, a request is invalid or the body contains no request.
+    """
+    df = decode_records(body)
+    if df.empty:
+        raise ValueError("Le corps de la requête ne contient aucune requête")
+    return df
+
+
+def predict_body(decode, body, chunk_rows):
+    """
+    Decode a request body and predict its rows; blocking, call it in the thread pool.
+
+    Parameters:
+    decode (callable): Turns the body into a DataFrame with the columns of `DATASET_COLUMNS`.
+    body (bytes): The request body.
+    chunk_rows (int): The number of rows per chunk, or None to predict the rows at once.
+
+    Returns:
+    tuple: The URLs, the predictions and the details, see `predict_chunks`.
+    """
+    df = decode(body)
+    return predict_chunks(
+        frame_chunks(df, chunk_rows),
+        complete_pipeline,
+        model,
+        drift_monitor,
+        predictor,
+        prefilter,
+        shadow_scorer,
+        traffic_capture,
+        thread_scheduler,
+    )
+
 
 # Définition du modèle de données pour les requêtes de prédiction
 class PredictionRequest(BaseModel):
@@ -142,53 +561,54 @@ async def predict(request: PredictionRequest) -> Dict:
         print(data)
 
         # Renommer les colonnes pour correspondre au dataset original
-        data.columns = [
-            "Method",
-            "User-Agent",
-            "Pragma",
-            "Cache-Control",
-            "Accept",
-            "Accept-encoding",
-            "Accept-charset",
-            "language",
-            "host",
-            "cookie",
-            "content-type",
-            "connection",
-            "lenght",
-            "content",
-            "URL",
-        ]
-
-        # Ajouter la colonne 'classification' avec une valeur par défaut
-        data["classification"] = 0  # ou une autre valeur par défaut
-
-        # Afficher les colonnes avant transformation
-        print("Colonnes avant transformation:")
-        print(data.columns)
-
-        # Appliquer les transformations de prétraitement
-        feature_builder = complete_pipeline.named_steps["feature_builder"]
-        X_transformed, _ = feature_builder.transform(data)
-
-        if isinstance(X_transformed, pd.DataFrame):
-            print(f"Colonnes après feature_builder.transform: {X_transformed.columns}")
+        data.columns = DATASET_COLUMNS
+
+        url = extract_urls(data["URL"])[0]
+
+        # Résultat déjà calculé par ce worker (L1, lu directement) ou par un autre worker
+        # du nœud (L2) ; la lecture SQLite du niveau L2 est bloquante, hors de la boucle
+        # d'événements
+        fingerprint = request_fingerprint(data.iloc[0])
+        if prediction_cache is not None:
+            cached = prediction_cache.get_local(fingerprint)
+            if cached is None and prediction_cache.shared:
+                cached = await run_in_threadpool(prediction_cache.get_shared, fingerprint)
+            if cached is not None:
+                return {"url": url, **cached}
+
+        # Prétraitement et prédiction, hors de la boucle d'événements ; les requêtes
+        # identiques reçues pendant le calcul attendent le même résultat
+        arguments = (
+            data,
+            complete_pipeline,
+            model,
+            drift_monitor,
+            predictor,
+            prefilter,
+            shadow_scorer,
+            traffic_capture,
+            thread_scheduler,
+        )
+        # Seul le calcul partagé est admis : les requêtes qui l'attendent n'occupent
+        # pas de place du contrôle d'admission
+        if single_flight is not None:
+            predictions, details = await single_flight.run(
+                fingerprint, predict_frame, *arguments, admission=admission["predict"]
+            )
         else:
-            print(f"Forme de X_transformed: {X_transformed.shape}")
-
-        preprocessor = complete_pipeline.named_steps["preprocessor"]
-        X = preprocessor.transform(X_transformed)
-
-        print("Forme de X après preprocessor.transform:", X.shape)
-
-        # Prédiction
-        predictions = model.predict(X)
-
-        url = data["URL"].tolist()[0].split(" ")[0]
-        prediction = int(predictions[0])
-
-        return {"url": url, "prediction": prediction}
-
+            async with admission["predict"].admit():
+                predictions, details = await run_in_threadpool(predict_frame, *arguments)
+
+        result = {"prediction": int(predictions[0])}
+        result.update({key: values.tolist()[0] for key, values in details.items()})
+        if prediction_cache is not None:
+            prediction_cache.put_local(fingerprint, result)
+            if prediction_cache.shared:
+                await run_in_threadpool(prediction_cache.put_shared, fingerprint, result)
+        return {"url": url, **result}
+
+    except HTTPException:
+        raise
     except ValueError as e:
         print(f"ValueError: {e}")
         raise HTTPException(
@@ -208,83 +628,152 @@ async def predict(request: PredictionRequest) -> Dict:
         )
 
 
+# Canal WebSocket : flux continu de requêtes et de prédictions sur une connexion persistante
+@app.websocket("/ws/predict")
+async def predict_stream(websocket: WebSocket, columnar: bool = False):
+    await websocket.accept()
+    await serve_stream(
+        websocket,
+        stream_batcher,
+        columnar=columnar,
+        max_pending_rows=int(os.getenv("STREAM_MAX_PENDING_ROWS", "1024")),
+    )
+
+
 # Endpoint pour prédire la classification à partir d'un fichier CSV
 @app.post("/predict_csv", tags=["Predict CSV"])
-async def predict_csv(file: UploadFile = File(...)) -> Dict:
+async def predict_csv(file: UploadFile = File(...), columnar: bool = False) -> Response:
     try:
-        # Lire le fichier CSV téléchargé
-        df = pd.read_csv(file.file)
-
-        print("Données reçues pour la prédiction à partir du fichier CSV:")
-        print(df)
+        # Nombre de lignes compté avant le parsing, pour refuser tôt les fichiers trop gros
+        rows = await run_in_threadpool(count_rows, file.file)
+        # Empreinte mémoire estimée avant le parsing : rejet ou lecture par blocs
+        file.file.seek(0, os.SEEK_END)
+        plan = memory_budget.plan("predict_csv", rows, file.file.tell())
+        file.file.seek(0)
+        async with admission["predict_csv"].admit(rows):
+            # Lire le fichier CSV téléchargé, prétraitement et prédiction
+            with memory_budget.track(plan):
+                urls, predictions, details = await run_in_threadpool(
+                    predict_chunks,
+                    read_csv_chunks(file.file, plan.chunk_rows),
+                    complete_pipeline,
+                    model,
+                    drift_monitor,
+                    predictor,
+                    prefilter,
+                    shadow_scorer,
+                    traffic_capture,
+                    thread_scheduler,
+                )
 
-        # Vérifier que le fichier contient les bonnes colonnes
-        expected_columns = [
-            "Method",
-            "User-Agent",
-            "Pragma",
-            "Cache-Control",
-            "Accept",
-            "Accept-encoding",
-            "Accept-charset",
-            "language",
-            "host",
-            "cookie",
-            "content-type",
-            "connection",
-            "lenght",
-            "content",
-            "URL",
-        ]
-        if not all(col in df.columns for col in expected_columns):
-            raise HTTPException(
-                status_code=400,
-                detail="Le fichier CSV ne contient pas les colonnes nécessaires",
-            )
+        # Préparer la réponse
+        return Response(
+            encode_predictions(urls, predictions, columnar=columnar, details=details),
+            media_type="application/json",
+        )
 
-        # Ajouter la colonne 'classification' avec une valeur par défaut
-        df["classification"] = 0  # ou une autre valeur par défaut
+    except HTTPException:
+        raise
+    except ValueError as e:
+        print(f"ValueError: {e}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"ValueError during transformation or prediction: {e}",
+        )
+    except KeyError as e:
+        print(f"KeyError: {e}")
+        raise HTTPException(
+            status_code=400, detail=f"KeyError during transformation ou prediction: {e}"
+        )
+    except Exception as e:
+        print(f"Exception: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Unexpected error during transformation or prediction: {e}",
+        )
 
-        # Afficher les colonnes avant transformation
-        print("Colonnes avant transformation:")
-        print(df.columns)
 
-        # Appliquer les transformations de prétraitement
-        feature_builder = complete_pipeline.named_steps["feature_builder"]
-        X_transformed, _ = feature_builder.transform(df)
+# Endpoint pour prédire la classification de requêtes HTTP brutes
+@app.post("/predict_raw", tags=["Predict raw"])
+async def predict_raw(request: Request, columnar: bool = False) -> Response:
+    try:
+        # Taille du corps vérifiée avant sa lecture : il est analysé en entier
+        body = await read_body(request, "predict_raw")
+
+        # Nombre de requêtes estimé sans analyse, pour le budget mémoire et l'admission ;
+        # l'analyse des requêtes HTTP brutes (une ou plusieurs, concaténées) se fait
+        # ensuite dans le pool de threads, une fois la requête admise
+        rows = await run_in_threadpool(count_raw_requests, body)
+        plan = memory_budget.plan("predict_raw", rows, len(body))
+        async with admission["predict_raw"].admit(rows):
+            with memory_budget.track(plan):
+                urls, predictions, details = await run_in_threadpool(
+                    predict_body, raw_frame, body, plan.chunk_rows
+                )
 
-        if isinstance(X_transformed, pd.DataFrame):
-            print(f"Colonnes après feature_builder.transform: {X_transformed.columns}")
-        else:
-            print(f"Forme de X_transformed: {X_transformed.shape}")
+        # Préparer la réponse
+        return Response(
+            encode_predictions(urls, predictions, columnar=columnar, details=details),
+            media_type="application/json",
+        )
 
-        preprocessor = complete_pipeline.named_steps["preprocessor"]
-        X = preprocessor.transform(X_transformed)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        print(f"ValueError: {e}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"ValueError during parsing, transformation or prediction: {e}",
+        )
+    except KeyError as e:
+        print(f"KeyError: {e}")
+        raise HTTPException(
+            status_code=400, detail=f"KeyError during transformation or prediction: {e}"
+        )
+    except Exception as e:
+        print(f"Exception: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Unexpected error during transformation or prediction: {e}",
+        )
 
-        print("Forme de X après preprocessor.transform:", X.shape)
 
-        # Prédiction
-        predictions = model.predict(X)
+# Endpoint pour prédire la classification de requêtes JSON avec le codec rapide
+@app.post("/predict_records", tags=["Predict records"])
+async def predict_records(request: Request, columnar: bool = False) -> Response:
+    try:
+        # Taille du corps vérifiée avant sa lecture : il est décodé en entier
+        body = await read_body(request, "predict_records")
+
+        # Nombre de requêtes compté sans décodage, pour le budget mémoire et l'admission ;
+        # le décodage (une requête ou un tableau de requêtes) se fait ensuite dans le
+        # pool de threads, une fois la requête admise
+        rows = await run_in_threadpool(count_records, body)
+        plan = memory_budget.plan("predict_records", rows, len(body))
+        async with admission["predict_records"].admit(rows):
+            with memory_budget.track(plan):
+                urls, predictions, details = await run_in_threadpool(
+                    predict_body, records_frame, body, plan.chunk_rows
+                )
 
         # Préparer la réponse
-        response = []
-        urls = df["URL"].tolist()
-        for i, prediction in enumerate(predictions):
-            url = urls[i].split(" ")[0]  # Extraire l'URL avant " HTTP/1.1"
-            response.append({"url": url, "prediction": int(prediction)})
-
-        return {"predictions": response}
+        return Response(
+            encode_predictions(urls, predictions, columnar=columnar, details=details),
+            media_type="application/json",
+        )
 
+    except HTTPException:
+        raise
     except ValueError as e:
         print(f"ValueError: {e}")
         raise HTTPException(
             status_code=400,
-            detail=f"ValueError during transformation or prediction: {e}",
+            detail=f"ValueError during decoding, transformation or prediction: {e}",
         )
     except KeyError as e:
         print(f"KeyError: {e}")
         raise HTTPException(
-            status_code=400, detail=f"KeyError during transformation ou prediction: {e}"
+            status_code=400, detail=f"KeyError during transformation or prediction: {e}"
         )
     except Exception as e:
         print(f"Exception: {e}")
@@ -294,6 +783,99 @@ async def predict_csv(file: UploadFile = File(...)) -> Dict:
         )
 
 
+# Endpoint pour soumettre un fichier CSV au scoring asynchrone
+@app.post("/jobs", tags=["Jobs"], status_code=202)
+async def submit_job(file: UploadFile = File(...), format: str = "parquet") -> Dict:
+    try:
+        job_id = await run_in_threadpool(job_manager.submit, file.file, format)
+    except JobQuotaExceeded as e:
+        print(f"JobQuotaExceeded: {e}")
+        raise HTTPException(status_code=507, detail=str(e))
+    except ValueError as e:
+        print(f"ValueError: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"job_id": job_id, "status_url": f"/jobs/{job_id}"}
+
+
+# Endpoint pour consulter l'état et la progression d'un job
+@app.get("/jobs/{job_id}", tags=["Jobs"])
+def show_job(job_id: str) -> Dict:
+    try:
+        return job_manager.status(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Job inconnu : {job_id}")
+
+
+# Endpoint pour télécharger le résultat d'un job terminé
+@app.get("/jobs/{job_id}/result", tags=["Jobs"])
+def download_job_result(job_id: str) -> FileResponse:
+    try:
+        path = job_manager.result_path(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Job inconnu : {job_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    media_type = "text/csv" if path.endswith(".csv") else "application/vnd.apache.parquet"
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
+
+# Endpoint pour supprimer un job terminé et ses fichiers
+@app.delete("/jobs/{job_id}", tags=["Jobs"])
+def delete_job(job_id: str) -> Dict:
+    try:
+        job_manager.delete(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Job inconnu : {job_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"job_id": job_id, "deleted": True}
+
+
+# Endpoint pour consulter l'accord des versions fantômes avec le modèle principal
+@app.get("/shadow", tags=["Monitoring"])
+def show_shadow() -> Dict:
+    if shadow_scorer is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Aucune version fantôme chargée (SHADOW_MODEL_VERSIONS non défini)",
+        )
+    return shadow_scorer.snapshot()
+
+
+# Endpoint pour consulter les features lues par le modèle et celles calculées à l'inférence
+@app.get("/features", tags=["Monitoring"])
+def show_features() -> Dict:
+    if feature_selection is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Features utilisées inconnues : le modèle n'est pas une forêt scikit-learn",
+        )
+    skipped = complete_pipeline.named_steps["feature_builder"].skipped_features or {}
+    return {
+        "lazy": bool(skipped),
+        "splits": feature_selection["splits"],
+        "used": feature_selection["computed"],
+        "unused": list(feature_selection["skipped"]),
+        "constants": skipped,
+    }
+
+
+# Endpoint pour consulter les statistiques de dérive des features
+@app.get("/drift", tags=["Monitoring"])
+def show_drift() -> Dict:
+    if drift_monitor is None:
+        raise HTTPException(
+            status_code=404, detail="Le suivi de la dérive est désactivé (DRIFT_MONITOR=0)"
+        )
+    return drift_monitor.snapshot()
+
+
+# Endpoint pour exposer les métriques au format Prometheus
+@app.get("/metrics", tags=["Monitoring"])
+def show_metrics() -> Response:
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # Point d'entrée de l'application
 if __name__ == "__main__":
     import uvicorn
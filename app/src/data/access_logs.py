@@ -0,0 +1,145 @@
+"""
+Module for parsing web server access logs.
+
+This module streams nginx/Apache access log files (plain or gzip) and maps
+each line to the columns of the original dataset, so that the lines can be
+scored with the same preprocessing pipeline as the API requests.
+
+Supported formats:
+------------------
+- "combined": the nginx/Apache combined format
+  `$remote_addr - $remote_user [$time_local] "$request" $status $bytes "$referer" "$user_agent"`
+- "vhost_combined": the combined format prefixed by `$host:$port `.
+
+Example usage:
+--------------
+for batch in iter_log_batches("access.log.gz", batch_size=100_000):
+    records = [parse_log_line(line) for line in batch]
+
+Functions:
+----------
+- open_log(path): Opens a plain or gzip log file in binary mode.
+- iter_log_batches(path, batch_size): Iterates over the raw lines of a log file by batches.
+- parse_log_line(line, log_format, default_host): Maps a raw log line to a dataset row.
+"""
+
+import gzip  # Lecture des journaux compressés
+import re  # Expressions régulières pour le parsing des lignes
+from datetime import datetime  # Horodatage des lignes
+from functools import lru_cache  # Horodatages répétés d'une même seconde
+from itertools import islice  # Découpage du flux de lignes en lots
+
+_COMBINED = (
+    rb'(?P<remote>\S+) \S+ \S+ \[(?P<time>[^\]]*)\] '
+    rb'"(?P<method>[A-Z]+) (?P<target>\S+)(?: (?P<protocol>HTTP/[0-9.]+))?" '
+    rb'(?P<status>\d{3}) (?P<bytes>\S+)'
+    rb'(?: "(?P<referer>[^"]*)" "(?P<user_agent>[^"]*)")?'
+)
+
+LOG_FORMATS = {
+    "combined": re.compile(_COMBINED),
+    "vhost_combined": re.compile(rb"(?P<vhost>[^\s:]+)(?::\d+)? " + _COMBINED),
+}
+
+
+def open_log(path):
+    """
+    Open a plain or gzip log file in binary mode.
+
+    Parameters:
+    path (str): The path to the log file. Files ending with ".gz" are decompressed.
+
+    Returns:
+    file object: The opened file.
+    """
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")  # pylint: disable=consider-using-with
+
+
+def iter_log_batches(path, batch_size):
+    """
+    Iterate over the raw lines of a log file by batches.
+
+    Parameters:
+    path (str): The path to the log file.
+    batch_size (int): The number of lines per batch.
+
+    Returns:
+    Iterator[list of bytes]: The batches of raw lines.
+    """
+    with open_log(path) as file:
+        while True:
+            batch = list(islice(file, batch_size))
+            if not batch:
+                return
+            yield batch
+
+
+@lru_cache(maxsize=4096)
+def _parse_time(value):
+    """
+    Convert a `$time_local` value ("10/Oct/2000:13:55:36 -0700") to seconds since the epoch.
+
+    Parameters:
+    value (bytes): The time field of the log line.
+
+    Returns:
+    float or None: The timestamp, or None if the value cannot be parsed.
+    """
+    try:
+        return datetime.strptime(value.decode("latin-1"), "%d/%b/%Y:%H:%M:%S %z").timestamp()
+    except ValueError:
+        return None
+
+
+def parse_log_line(line, log_format="combined", default_host=None):
+    """
+    Map a raw log line to a row of the original dataset.
+
+    Parameters:
+    line (bytes): The raw log line.
+    log_format (str): The name of the log format, see `LOG_FORMATS`.
+    default_host (str): The host used when the format does not record it.
+
+    Returns:
+    dict or None: The row, keyed by the dataset columns plus "timestamp" (the
+    time of the line in seconds, None if unparsable), or None if the line does
+    not match the format.
+
+    Access logs do not record the request headers or body, so the
+    corresponding columns are left empty (None), like the GET requests of the
+    training data. When a host is known, the URL is made absolute as in the
+    training data ("http://host/path HTTP/1.1").
+    """
+    match = LOG_FORMATS[log_format].match(line)
+    if match is None:
+        return None
+
+    groups = match.groupdict()
+    host = groups.get("vhost")
+    host = host.decode("latin-1") if host else default_host
+    target = groups["target"].decode("latin-1")
+    protocol = (groups["protocol"] or b"HTTP/1.1").decode("latin-1")
+    if host and target.startswith("/"):
+        target = f"http://{host}{target}"
+    user_agent = groups["user_agent"]
+
+    return {
+        "Method": groups["method"].decode("latin-1"),
+        "User-Agent": user_agent.decode("utf-8", "replace") if user_agent else None,
+        "Pragma": None,
+        "Cache-Control": None,
+        "Accept": None,
+        "Accept-encoding": None,
+        "Accept-charset": None,
+        "language": None,
+        "host": host,
+        "cookie": None,
+        "content-type": None,
+        "connection": None,
+        "lenght": None,
+        "content": None,
+        "URL": f"{target} {protocol}",
+        "timestamp": _parse_time(groups["time"]),
+    }
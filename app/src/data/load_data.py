@@ -1,33 +1,216 @@
 """
 Module for loading data.
 
-This module provides a function `load_csv_data` to load data
-from a specified CSV file path into a DataFrame.
+This module provides functions to load the training data from a CSV file
+into a DataFrame while keeping the memory footprint small: only the columns
+used by `build_features` are read, their dtypes are declared up front and
+low-cardinality fields are stored as `category`.
 
 Example usage:
 --------------
 data = load_csv_data("path/to/file.csv")
 print(data)
 
+for chunk in iter_csv_data("path/to/file.csv", chunksize=100_000):
+    print(chunk.shape)
+
 Functions:
 ----------
-- load_csv_data(filepath): Loads the data from the specified CSV file path.
+- load_csv_data(filepath, ...): Loads the data from the specified CSV file path.
+- iter_csv_data(filepath, chunksize, ...): Iterates over the CSV file chunk by chunk.
+- memory_report(data): Reports the memory used by a DataFrame and the memory saved
+  by its categorical columns.
 """
 
+import sys  # Pour estimer la taille des objets Python
+
 import pandas as pd  # Importation de la bibliothèque pandas pour manipuler les données
+from pandas.api.types import union_categoricals  # Fusion de catégories entre chunks
+
+# Colonnes lues par 'build_features' (cible comprise)
+FEATURE_COLUMNS = [
+    "Method",
+    "User-Agent",
+    "Pragma",
+    "Cache-Control",
+    "Accept",
+    "Accept-encoding",
+    "Accept-charset",
+    "language",
+    "host",
+    "cookie",
+    "content-type",
+    "connection",
+    "lenght",
+    "content",
+    "URL",
+    "classification",
+]
+
+# Colonnes à faible cardinalité stockées en 'category', les autres restent des chaînes
+CATEGORICAL_COLUMNS = [
+    "Method",
+    "User-Agent",
+    "Pragma",
+    "Cache-Control",
+    "Accept",
+    "Accept-encoding",
+    "Accept-charset",
+    "language",
+    "host",
+    "content-type",
+    "connection",
+    "lenght",
+    "classification",
+]
+
+DEFAULT_DTYPES = {
+    column: ("category" if column in CATEGORICAL_COLUMNS else "object")
+    for column in FEATURE_COLUMNS
+}
+
+
+def _read_csv_kwargs(usecols, dtype, engine):
+    """
+    Build the keyword arguments shared by the CSV readers.
+
+    Parameters:
+    usecols (list, callable or None): The columns to read. None reads
+    `FEATURE_COLUMNS`. A callable (c engine only) selects the columns of the
+    header for which it returns True.
+    dtype (dict or None): The dtypes to declare. None uses `DEFAULT_DTYPES`.
+    engine (str): The pandas parser engine ("c" or "pyarrow").
+
+    Returns:
+    dict: The keyword arguments for `pd.read_csv`.
+    """
+    dtype = DEFAULT_DTYPES if dtype is None else dtype
+    if callable(usecols):
+        # Colonnes inconnues avant la lecture de l'en-tête : tous les dtypes sont passés
+        return {"usecols": usecols, "dtype": dtype, "engine": engine}
+    usecols = list(FEATURE_COLUMNS if usecols is None else usecols)
+    return {
+        "usecols": usecols,
+        "dtype": {column: dtype[column] for column in usecols if column in dtype},
+        "engine": engine,
+    }
+
+
+def iter_csv_data(filepath, chunksize, usecols=None, dtype=None):
+    """
+    Iterate over the CSV file chunk by chunk.
+
+    Parameters:
+    filepath (str or file-like): The path to the CSV file.
+    chunksize (int): The number of rows per chunk.
+    usecols (list or callable): The columns to read. Default is `FEATURE_COLUMNS`.
+    dtype (dict): The dtypes to declare. Default is `DEFAULT_DTYPES`.
+
+    Returns:
+    Iterator[pd.DataFrame]: The chunks of the CSV file.
+
+    The "pyarrow" engine does not support chunked reading, so the "c" engine
+    is always used here.
+    """
+    kwargs = _read_csv_kwargs(usecols, dtype, engine="c")
+    with pd.read_csv(filepath, chunksize=chunksize, **kwargs) as reader:
+        yield from reader
 
 
-def load_csv_data(filepath):
+def _concat_chunks(chunks):
+    """
+    Concatenate chunks while keeping their categorical columns categorical.
+
+    Parameters:
+    chunks (list of pd.DataFrame): The chunks to concatenate.
+
+    Returns:
+    pd.DataFrame: The concatenated data.
+    """
+    if not chunks:
+        return pd.DataFrame()
+    categorical = [
+        column
+        for column in chunks[0].columns
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype)
+    ]
+    # Chaque chunk a ses propres catégories : on les unifie avant la concaténation
+    for column in categorical:
+        categories = union_categoricals(
+            [chunk[column] for chunk in chunks], ignore_order=True
+        ).categories
+        for chunk in chunks:
+            chunk[column] = chunk[column].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def memory_report(data):
+    """
+    Report the memory used by a DataFrame and the memory saved by its categorical columns.
+
+    Parameters:
+    data (pd.DataFrame): The loaded data.
+
+    Returns:
+    dict: The memory used ("memory_bytes"), the estimated memory of the same
+    data loaded with object dtypes ("object_memory_bytes") and the difference
+    ("saved_bytes").
+
+    The object estimate is computed from the categories and their counts, so
+    no column is converted back to object to produce it.
+    """
+    used = int(data.memory_usage(index=True, deep=True).sum())
+    estimate = used
+    for column in data.columns:
+        series = data[column]
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        counts = series.value_counts(dropna=False)
+        # Un pointeur par ligne plus la taille de chaque valeur répétée
+        object_bytes = 8 * len(series) + sum(
+            int(count) * sys.getsizeof(value) for value, count in counts.items()
+        )
+        estimate += object_bytes - int(series.memory_usage(index=False, deep=True))
+    return {
+        "memory_bytes": used,
+        "object_memory_bytes": estimate,
+        "saved_bytes": estimate - used,
+    }
+
+
+def load_csv_data(
+    filepath, usecols=None, dtype=None, engine="c", chunksize=None, verbose=True
+):
     """
     Load data from the specified CSV file path.
-    
+
     Parameters:
-    filepath (str): The path to the CSV file.
-    
+    filepath (str or file-like): The path to the CSV file.
+    usecols (list): The columns to read. Default is `FEATURE_COLUMNS`.
+    dtype (dict): The dtypes to declare. Default is `DEFAULT_DTYPES`.
+    engine (str): The parser engine, "c" (default) or "pyarrow".
+    chunksize (int): If given, the file is read chunk by chunk so that only one
+    chunk of raw strings is held in memory at a time.
+    verbose (bool): Whether to print the memory report.
+
     Returns:
     pd.DataFrame: The loaded data as a DataFrame.
-    
-    This function reads the CSV file from the specified path and loads it
-    into a pandas DataFrame.
+
+    This function reads the columns needed by `build_features` from the CSV
+    file and loads them into a pandas DataFrame with compact dtypes.
     """
-    return pd.read_csv(filepath)  # Lecture du fichier CSV et chargement dans un DataFrame
+    if chunksize:
+        data = _concat_chunks(
+            list(iter_csv_data(filepath, chunksize, usecols=usecols, dtype=dtype))
+        )
+    else:
+        data = pd.read_csv(filepath, **_read_csv_kwargs(usecols, dtype, engine))
+
+    if verbose:
+        report = memory_report(data)
+        print(
+            f"Mémoire utilisée : {report['memory_bytes'] / 1e6:.1f} Mo "
+            f"(object : {report['object_memory_bytes'] / 1e6:.1f} Mo, "
+            f"économisé : {report['saved_bytes'] / 1e6:.1f} Mo)"
+        )
+    return data  # DataFrame chargé avec des types compacts
@@ -0,0 +1,150 @@
+"""
+Module for parsing raw HTTP requests.
+
+This module parses raw HTTP/1.x requests, as found in the CSIC 2010 dataset
+(a request line, headers, a blank line and an optional body), directly from
+bytes into the columns of the original dataset. Several requests can be
+concatenated in the same buffer.
+
+The parser works on offsets in the buffer: header names are only compared
+when their length matches one of the headers used by the dataset, so no
+Python string is built for the headers that are ignored.
+
+Example usage:
+--------------
+records = parse_raw_requests(
+    b"GET http://localhost:8080/index.jsp HTTP/1.1\\r\\nHost: localhost:8080\\r\\n\\r\\n"
+)
+
+Functions:
+----------
+- parse_raw_requests(buffer): Parses one or several concatenated raw HTTP requests.
+"""
+
+from src.models.inference import DATASET_COLUMNS  # Colonnes du dataset original
+
+# En-têtes HTTP conservés, avec leur casse usuelle et la colonne du dataset associée
+_HEADERS = {
+    b"User-Agent": "User-Agent",
+    b"Pragma": "Pragma",
+    b"Cache-Control": "Cache-Control",
+    b"Accept": "Accept",
+    b"Accept-Encoding": "Accept-encoding",
+    b"Accept-Charset": "Accept-charset",
+    b"Accept-Language": "language",
+    b"Host": "host",
+    b"Cookie": "cookie",
+    b"Content-Type": "content-type",
+    b"Connection": "connection",
+    b"Content-Length": "lenght",
+}
+
+# En-têtes regroupés par longueur de nom : (nom usuel, nom en minuscules, colonne)
+_HEADERS_BY_LENGTH = {}
+for _name, _column in _HEADERS.items():
+    _HEADERS_BY_LENGTH.setdefault(len(_name), []).append((_name, _name.lower(), _column))
+
+_BLANK = b" \t"
+_NEWLINES = b"\r\n"
+
+
+def _line_end(buffer, pos, size):
+    """
+    Return the offsets of the end of the line (without CR/LF) and of the next line.
+    """
+    eol = buffer.find(b"\n", pos)
+    if eol == -1:
+        eol = size
+    end = eol - 1 if eol > pos and buffer[eol - 1] == 13 else eol
+    return end, eol + 1
+
+
+def _header_column(buffer, pos, colon):
+    """
+    Return the dataset column of the header whose name spans buffer[pos:colon], or None.
+    """
+    candidates = _HEADERS_BY_LENGTH.get(colon - pos)
+    if not candidates:
+        return None
+    for name, lower_name, column in candidates:
+        if buffer.startswith(name, pos):
+            return column
+    # Casse inhabituelle : seul le nom de longueur compatible est copié
+    lowered = buffer[pos:colon].lower()
+    for name, lower_name, column in candidates:
+        if lowered == lower_name:
+            return column
+    return None
+
+
+def parse_raw_requests(buffer):
+    """
+    Parse one or several concatenated raw HTTP requests.
+
+    Parameters:
+    buffer (bytes): The raw requests. Lines may end with CRLF or LF and
+    requests may be separated by blank lines.
+
+    Returns:
+    list of dict: One row per request, keyed by the dataset columns. Headers
+    missing from a request are None.
+
+    Raises:
+    ValueError: If a request line is malformed.
+
+    The body of a request is read according to its Content-Length header;
+    requests without this header have no body.
+    """
+    buffer = bytes(buffer)
+    view = memoryview(buffer)
+    size = len(buffer)
+    pos = 0
+    records = []
+
+    while True:
+        # Ignorer les lignes vides entre deux requêtes
+        while pos < size and buffer[pos] in _NEWLINES:
+            pos += 1
+        if pos >= size:
+            return records
+
+        # Ligne de requête : "METHOD target HTTP/1.1"
+        end, pos_next = _line_end(buffer, pos, size)
+        space = buffer.find(b" ", pos, end)
+        if space <= pos:
+            raise ValueError(
+                f"Malformed request line at offset {pos}: "
+                f"{str(view[pos:end], 'latin-1')[:80]!r}"
+            )
+        record = dict.fromkeys(DATASET_COLUMNS)
+        record["Method"] = str(view[pos:space], "latin-1")
+        record["URL"] = str(view[space + 1:end], "latin-1")
+        pos = pos_next
+
+        # En-têtes jusqu'à la ligne vide
+        content_length = 0
+        while pos < size:
+            end, pos_next = _line_end(buffer, pos, size)
+            if end == pos:
+                pos = pos_next
+                break
+            colon = buffer.find(b":", pos, end)
+            column = _header_column(buffer, pos, colon) if colon > pos else None
+            if column is not None:
+                start = colon + 1
+                while start < end and buffer[start] in _BLANK:
+                    start += 1
+                stop = end
+                while stop > start and buffer[stop - 1] in _BLANK:
+                    stop -= 1
+                value = str(view[start:stop], "latin-1")
+                record[column] = value
+                if column == "lenght" and value.isdigit():
+                    content_length = int(value)
+            pos = pos_next
+
+        # Corps de la requête selon Content-Length
+        if content_length:
+            record["content"] = str(view[pos:pos + content_length], "utf-8", "replace")
+            pos += content_length
+        records.append(record)
@@ -0,0 +1,82 @@
+"""
+Module for saving data.
+
+This module provides functions to write DataFrames and checkpoint files
+atomically: the content is first written to a temporary file in the same
+directory, which is then renamed, so that a reader never sees a partial file
+even if the process is killed while writing.
+
+Example usage:
+--------------
+save_frame(df, "results/part-0000.parquet", "parquet")
+save_json({"done": [0, 1]}, "results/_checkpoint.json")
+
+Functions:
+----------
+- save_frame(data, path, file_format): Writes a DataFrame as Parquet or CSV.
+- save_json(content, path): Writes a JSON file.
+- load_json(path, default): Reads a JSON file, or returns a default value.
+"""
+
+import json  # Lecture et écriture des checkpoints
+import os  # Renommage atomique des fichiers
+
+FILE_FORMATS = ("parquet", "csv")
+
+
+def save_frame(data, path, file_format="parquet"):
+    """
+    Write a DataFrame atomically as Parquet or CSV.
+
+    Parameters:
+    data (pd.DataFrame): The data to write.
+    path (str): The destination path.
+    file_format (str): "parquet" (requires pyarrow) or "csv".
+
+    Returns:
+    str: The destination path.
+    """
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"Unsupported file format: {file_format}")
+    tmp_path = f"{path}.tmp"
+    if file_format == "parquet":
+        data.to_parquet(tmp_path, index=False)
+    else:
+        data.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)  # Renommage atomique
+    return path
+
+
+def save_json(content, path):
+    """
+    Write a JSON file atomically.
+
+    Parameters:
+    content (dict): The content to write.
+    path (str): The destination path.
+
+    Returns:
+    str: The destination path.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(content, file)
+    os.replace(tmp_path, path)  # Renommage atomique
+    return path
+
+
+def load_json(path, default=None):
+    """
+    Read a JSON file, or return a default value if it does not exist.
+
+    Parameters:
+    path (str): The path to the JSON file.
+    default (any): The value returned when the file does not exist.
+
+    Returns:
+    any: The content of the file, or the default value.
+    """
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
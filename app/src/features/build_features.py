@@ -35,15 +35,187 @@ from src.utils.content_utils import (
     count_special_characters as special_count_content,
     is_encoded as is_encoded_content,
 )
+import numpy as np
+import pandas as pd
 from sklearn.preprocessing import LabelEncoder
 
+# Numeric features produced by 'build_features' ("content_length" appears twice,
+# as in the fitted preprocessor)
+NUMERIC_FEATURES = [
+    "content_length", "count_dot_url", "count_dir_url", "count_embed_domain_url",
+    "shortening_service_url", "count_http_url", "count%_url", "count?_url",
+    "count-_url", "count=_url", "url_length", "hostname_length_url", "sus_url",
+    "count_digits_url", "count_letters_url", "number_of_parameters_url",
+    "number_of_fragments_url", "is_encoded_url", "special_count_url",
+    "unusual_character_ratio_url", "count_dot_content", "count_dir_content",
+    "count_embed_domain_content", "count%_content", "count?_content",
+    "count-_content", "count=_content", "sus_content", "count_digits_content",
+    "count_letters_content", "content_length", "is_encoded_content",
+    "special_count_content"
+]
 
-def build_features(data):
+# Categorical features, label-encoded by 'build_features'
+CATEGORICAL_FEATURES = ["Method", "host", "cookie", "Accept", "content", "URL"]
+
+# Truncation flags added by the bounded-cost mode ('scan_cap')
+SCAN_CAP_FEATURES = ["url_truncated", "content_truncated"]
+
+# Features computed from the "URL" column
+URL_FEATURE_FUNCTIONS = {
+    "count_dot_url": count_dot,
+    "count_dir_url": no_of_dir,
+    "count_embed_domain_url": no_of_embed,
+    "shortening_service_url": shortening_service,
+    "count_http_url": count_http,
+    "count%_url": count_per,
+    "count?_url": count_ques,
+    "count-_url": count_hyphen,
+    "count=_url": count_equal,
+    "url_length": url_length,
+    "hostname_length_url": hostname_length,
+    "sus_url": suspicious_words,
+    "count_digits_url": digit_count,
+    "count_letters_url": letter_count,
+    "number_of_parameters_url": number_of_parameters,
+    "number_of_fragments_url": number_of_fragments,
+    "is_encoded_url": is_encoded,
+    "special_count_url": count_special_characters,
+    "unusual_character_ratio_url": unusual_character_ratio,
+}
+
+# Features computed from the "content" column (through 'apply_to_content')
+CONTENT_FEATURE_FUNCTIONS = {
+    "count_dot_content": count_dot_content,
+    "count_dir_content": count_dir_content,
+    "count_embed_domain_content": count_embed_domain_content,
+    "count%_content": count_per_content,
+    "count?_content": count_ques_content,
+    "count-_content": count_hyphen_content,
+    "count=_content": count_equal_content,
+    "sus_content": sus_content,
+    "count_digits_content": count_digits_content,
+    "count_letters_content": count_letters_content,
+    "content_length": content_length,
+    "is_encoded_content": is_encoded_content,
+    "special_count_content": special_count_content,
+}
+
+
+def cap_scan(values, scan_cap):
+    """
+    Reduce the values longer than `scan_cap` characters to their prefix and suffix.
+
+    Parameters:
+    values (pd.Series): The string values.
+    scan_cap (int): The maximum number of characters kept: the first half of the
+    cap at the start of the value and the other half at its end.
+
+    Returns:
+    pd.Series: The capped values.
+    """
+    long_values = values.str.len() > scan_cap
+    if not long_values.any():
+        return values
+    head = scan_cap // 2
+    tail = scan_cap - head
+    values = values.copy()
+    long_part = values[long_values]
+    values[long_values] = long_part.str[:head] + (long_part.str[-tail:] if tail else "")
+    return values
+
+
+def _apply_scan_cap(X, urls, contents, scan_cap):
+    """
+    Restore the exact length features, add the truncation flags and cap the
+    categorical values of features computed on capped URLs and bodies.
+
+    Parameters:
+    X (pd.DataFrame): The features, computed on the capped values.
+    urls (pd.Series): The full "URL" values.
+    contents (pd.Series): The full "content" values, as strings.
+    scan_cap (int): The scan cap.
+
+    Returns:
+    pd.DataFrame: The features.
+    """
+    url_lengths = urls.astype(str).str.len()
+    content_lengths = contents.str.len()
+    X["url_length"] = url_lengths
+    X["content_length"] = content_lengths
+    X["URL"] = cap_scan(urls.astype(str), scan_cap)
+    X["content"] = cap_scan(contents, scan_cap)
+    X["url_truncated"] = (url_lengths > scan_cap).astype(int)
+    X["content_truncated"] = (content_lengths > scan_cap).astype(int)
+    return X
+
+
+def _compact_counters(X, numeric_features):
+    """
+    Downcast the integer counters to the narrowest integer dtype holding their values.
+
+    Parameters:
+    X (pd.DataFrame): The features.
+    numeric_features (list of str): The numeric features.
+
+    Returns:
+    pd.DataFrame: The features, with narrow integer counters. Float features
+    are left unchanged so that the scaler receives exactly the same values.
+    """
+    for feature in dict.fromkeys(numeric_features):
+        if pd.api.types.is_integer_dtype(X[feature]):
+            downcast = "unsigned" if len(X) == 0 or X[feature].min() >= 0 else "integer"
+            X[feature] = pd.to_numeric(X[feature], downcast=downcast)
+    return X
+
+
+def _encode_categoricals(X, y, categorical_features, compact=False):
+    """
+    Label-encode the categorical features and the target variable.
+
+    Parameters:
+    X (pd.DataFrame): The features, with the raw values of the categorical features.
+    y (pd.Series): The raw target variable.
+    categorical_features (list of str): The categorical features.
+    compact (bool): If True, the codes are stored as a `category` column whose
+    categories are the code strings, otherwise as strings.
+
+    Returns:
+    pd.DataFrame: The features, with encoded categorical features.
+    np.ndarray: The encoded target variable.
+    """
+    le = LabelEncoder()
+    for feature in categorical_features:
+        X[feature] = le.fit_transform(X[feature].astype(str))
+    y = le.fit_transform(y.astype(str))
+
+    # Ensure categorical features are treated as strings for imputation
+    for feature in categorical_features:
+        if compact:
+            codes = X[feature].to_numpy()
+            categories = pd.Index(np.arange(codes.max() + 1 if len(codes) else 0).astype(str))
+            X[feature] = pd.Categorical.from_codes(codes, categories=categories)
+        else:
+            X[feature] = X[feature].astype(str)
+    return X, y
+
+
+def build_features(data, compact=False, scan_cap=None, skipped_features=None):
     """
     Preprocess and extract features from the raw data.
 
     Parameters:
     data (pd.DataFrame): The raw data.
+    compact (bool): If True, the counters use narrow integer dtypes and the
+    categorical features are stored as integer codes (a `category` column whose
+    categories are the code strings) instead of one Python string per row. The
+    values seen by the preprocessor are unchanged.
+    scan_cap (int): If given, bounded-cost mode: the URL and content features
+    are computed on at most `scan_cap` characters of each value (see `cap_scan`),
+    the length features stay exact, the categorical "URL" and "content" values
+    are capped the same way and the `SCAN_CAP_FEATURES` flags are added.
+    skipped_features (dict): If given, {feature: constant}: these URL and content
+    features are not computed, their column holds the constant (see
+    `src.models.lazy_features`).
 
     Returns:
     pd.DataFrame: The features.
@@ -93,85 +265,103 @@ def build_features(data):
         X["content_length"].astype(str).str.extract(r"(\d+)").fillna(0).astype(int)
     )
 
-    url_feature_functions = {
-        "count_dot_url": count_dot,
-        "count_dir_url": no_of_dir,
-        "count_embed_domain_url": no_of_embed,
-        "shortening_service_url": shortening_service,
-        "count_http_url": count_http,
-        "count%_url": count_per,
-        "count?_url": count_ques,
-        "count-_url": count_hyphen,
-        "count=_url": count_equal,
-        "url_length": url_length,
-        "hostname_length_url": hostname_length,
-        "sus_url": suspicious_words,
-        "count_digits_url": digit_count,
-        "count_letters_url": letter_count,
-        "number_of_parameters_url": number_of_parameters,
-        "number_of_fragments_url": number_of_fragments,
-        "is_encoded_url": is_encoded,
-        "special_count_url": count_special_characters,
-        "unusual_character_ratio_url": unusual_character_ratio,
-    }
-
-    for feature, func in url_feature_functions.items():
-        X[feature] = X["URL"].apply(func)
-
     # Convert 'content' column to string to avoid issues with float
     X["content"] = X["content"].astype(str)
 
-    content_feature_functions = {
-        "count_dot_content": count_dot_content,
-        "count_dir_content": count_dir_content,
-        "count_embed_domain_content": count_embed_domain_content,
-        "count%_content": count_per_content,
-        "count?_content": count_ques_content,
-        "count-_content": count_hyphen_content,
-        "count=_content": count_equal_content,
-        "sus_content": sus_content,
-        "count_digits_content": count_digits_content,
-        "count_letters_content": count_letters_content,
-        "content_length": content_length,
-        "is_encoded_content": is_encoded_content,
-        "special_count_content": special_count_content,
-    }
-
-    for feature, func in content_feature_functions.items():
-        X[feature] = X["content"].apply(lambda x: apply_to_content(x, func))
-
-    # Encode categorical features
-    categorical_features = ["Method", "host", "cookie", "Accept", "content",
-                            "URL"]
-    le = LabelEncoder()
-    for feature in categorical_features:
-        X[feature] = le.fit_transform(X[feature].astype(str))
+    # Mode à coût borné : les features de parcours ne lisent que le début et la fin
+    urls, contents = X["URL"], X["content"]
+    if scan_cap:
+        urls, contents = cap_scan(urls.astype(str), scan_cap), cap_scan(contents, scan_cap)
 
-    # Encode target variable
-    y = le.fit_transform(y.astype(str))
+    # Features inutilisées par le modèle : une constante au lieu du calcul
+    skipped_features = skipped_features or {}
+    for feature, func in URL_FEATURE_FUNCTIONS.items():
+        if feature in skipped_features:
+            X[feature] = skipped_features[feature]
+        else:
+            X[feature] = urls.apply(func)
 
-    print(f"Target variable 'y' (classification) après encodage: {y}")
+    for feature, func in CONTENT_FEATURE_FUNCTIONS.items():
+        if feature in skipped_features:
+            X[feature] = skipped_features[feature]
+        else:
+            X[feature] = contents.apply(lambda x: apply_to_content(x, func))
 
-    # Ensure categorical features are treated as strings for imputation
-    for feature in categorical_features:
-        X[feature] = X[feature].astype(str)
+    if scan_cap:
+        X = _apply_scan_cap(X, X["URL"], X["content"], scan_cap)
+
+    # Encode categorical features and target variable
+    categorical_features = list(CATEGORICAL_FEATURES)
+    X, y = _encode_categoricals(X, y, categorical_features, compact)
+
+    print(f"Target variable 'y' (classification) après encodage: {y}")
 
     # Identify the new numeric and categorical features
-    numeric_features = [
-        "content_length", "count_dot_url", "count_dir_url", "count_embed_domain_url",
-        "shortening_service_url", "count_http_url", "count%_url", "count?_url", 
-        "count-_url", "count=_url", "url_length", "hostname_length_url", "sus_url",
-        "count_digits_url", "count_letters_url", "number_of_parameters_url", 
-        "number_of_fragments_url", "is_encoded_url", "special_count_url", 
-        "unusual_character_ratio_url", "count_dot_content", "count_dir_content", 
-        "count_embed_domain_content", "count%_content", "count?_content", 
-        "count-_content", "count=_content", "sus_content", "count_digits_content", 
-        "count_letters_content", "content_length", "is_encoded_content", 
-        "special_count_content"
-    ]
+    numeric_features = list(NUMERIC_FEATURES)
+    if compact:
+        X = _compact_counters(X, numeric_features)
 
     print(f"Features generated: {numeric_features + categorical_features}")
     print("Colonnes après transformation dans 'build_features':")
     print(X.columns)
 
     return X, y, numeric_features, categorical_features
+
+
+def build_features_parallel(
+    data, n_jobs=None, chunk_rows=50000, compact=False, scan_cap=None, skipped_features=None
+):
+    """
+    Build the features of a large DataFrame with several processes.
+
+    The rows are split into chunks of `chunk_rows` rows whose URL and content
+    features are computed in parallel by `build_features`. The label encoding
+    of the categorical features and of the target depends on all the rows, so
+    it is done once on the whole DataFrame: the output is identical to
+    `build_features(data, compact)`.
+
+    Parameters:
+    data (pd.DataFrame): The raw data.
+    n_jobs (int): The number of processes (None or 1: no parallelism, -1: all cores).
+    chunk_rows (int): The number of rows per chunk.
+    compact (bool): See `build_features`.
+    scan_cap (int): See `build_features`.
+    skipped_features (dict): See `build_features`.
+
+    Returns:
+    pd.DataFrame: The features.
+    np.ndarray: The target variable.
+    list: The numeric features.
+    list: The categorical features.
+    """
+    if n_jobs in (None, 1) or len(data) <= chunk_rows:
+        return build_features(
+            data, compact=compact, scan_cap=scan_cap, skipped_features=skipped_features
+        )
+
+    from joblib import Parallel, delayed  # Calcul des chunks sur plusieurs cœurs
+
+    chunks = Parallel(n_jobs=n_jobs)(
+        delayed(build_features)(
+            data.iloc[start:start + chunk_rows],
+            scan_cap=scan_cap,
+            skipped_features=skipped_features,
+        )
+        for start in range(0, len(data), chunk_rows)
+    )
+    X = pd.concat([chunk[0] for chunk in chunks])
+
+    # Encodage sur l'ensemble des lignes, à partir des valeurs brutes
+    categorical_features = list(CATEGORICAL_FEATURES)
+    for feature in categorical_features:
+        X[feature] = data[feature]
+    X["content"] = X["content"].astype(str)
+    if scan_cap:
+        X["URL"] = cap_scan(X["URL"].astype(str), scan_cap)
+        X["content"] = cap_scan(X["content"], scan_cap)
+    X, y = _encode_categoricals(X, data["classification"], categorical_features, compact)
+
+    numeric_features = list(NUMERIC_FEATURES)
+    if compact:
+        X = _compact_counters(X, numeric_features)
+    return X, y, numeric_features, categorical_features
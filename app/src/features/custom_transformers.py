@@ -1,21 +1,126 @@
+import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
-from src.features.build_features import build_features
+from src.features.build_features import (
+    CATEGORICAL_FEATURES,
+    NUMERIC_FEATURES,
+    SCAN_CAP_FEATURES,
+    build_features_parallel,
+)
+from src.features.feature_store import FeatureStore
+from src.features.window_features import (
+    WINDOW_FEATURES,
+    SlidingWindowFeatures,
+    check_timestamps,
+)
 
 
 class FeatureBuilder(BaseEstimator, TransformerMixin):
-    def __init__(self):
+    """
+    Build the features of the raw requests with `build_features`.
+
+    Parameters:
+    compact (bool): Whether to use the compact representation of the features.
+    return_target (bool): If True (default, as in the fitted pipeline used by the
+    API), `transform` returns the features and the target; if False, only the
+    features, so that the transformer can be chained in a `Pipeline`.
+    n_jobs (int): The number of processes computing the features of large inputs
+    (None: no parallelism).
+    chunk_rows (int): The number of rows per process chunk.
+    feature_store (str): If given, the directory of a `FeatureStore`: only the
+    URLs and bodies not featurized by a previous run are featurized.
+    window_features (bool): If True, the sliding-window features per host and
+    per cookie (`WINDOW_FEATURES`) are appended to the numeric features; the
+    requests need a "timestamp" column, and the counters are kept across the
+    calls of `transform` and reset by `fit`.
+    window_seconds (float): The length of the sliding window.
+    scan_cap (int): If given, bounded-cost mode: the URL and content features are
+    computed on at most `scan_cap` characters of each value and the truncation
+    flags (`SCAN_CAP_FEATURES`) are appended to the numeric features.
+    skipped_features (dict): If given, {feature: constant}: these URL and content
+    features are not computed and hold the constant, see `build_features`.
+    Ignored with a feature store, whose entries hold every feature.
+    """
+
+    def __init__(
+        self,
+        compact=False,
+        return_target=True,
+        n_jobs=None,
+        chunk_rows=50000,
+        feature_store=None,
+        window_features=False,
+        window_seconds=60.0,
+        scan_cap=None,
+        skipped_features=None,
+    ):
+        self.compact = compact
+        self.return_target = return_target
+        self.n_jobs = n_jobs
+        self.chunk_rows = chunk_rows
+        self.feature_store = feature_store
+        self.window_features = window_features
+        self.window_seconds = window_seconds
+        self.scan_cap = scan_cap
+        self.skipped_features = skipped_features
         self.numeric_features = []
         self.categorical_features = []
 
     def fit(self, X, y=None):
+        # Listes connues avant la première transformation
+        self.numeric_features = list(NUMERIC_FEATURES)
+        self.categorical_features = list(CATEGORICAL_FEATURES)
+        if getattr(self, "scan_cap", None):
+            self.numeric_features += SCAN_CAP_FEATURES
+        if getattr(self, "window_features", False):
+            check_timestamps(X)
+            self.numeric_features += WINDOW_FEATURES
+            # Compteurs remis à zéro : un nouvel ajustement ne voit pas les requêtes du précédent
+            self.window_ = None
         return self
 
+    def _window(self):
+        # Compteurs créés au premier appel et conservés d'un appel à l'autre
+        if getattr(self, "window_", None) is None:
+            self.window_ = SlidingWindowFeatures(window_seconds=self.window_seconds)
+        return self.window_
+
+    def _store(self):
+        # Store ouvert au premier appel et réutilisé, rouvert si le répertoire change
+        store = getattr(self, "store_", None)
+        if store is None or store.root != self.feature_store:
+            self.store_ = FeatureStore(self.feature_store)
+        return self.store_
+
     def transform(self, X):
-        X_transformed, y, self.numeric_features, self.categorical_features = build_features(X)
+        # 'getattr' : les pipelines sauvegardés avant ces paramètres restent utilisables
+        scan_cap = getattr(self, "scan_cap", None)
+        if getattr(self, "window_features", False):
+            check_timestamps(X)
+        if getattr(self, "feature_store", None):
+            features = self._store().build_features(
+                X, compact=getattr(self, "compact", False), scan_cap=scan_cap
+            )
+        else:
+            features = build_features_parallel(
+                X,
+                n_jobs=getattr(self, "n_jobs", None),
+                chunk_rows=getattr(self, "chunk_rows", 50000),
+                compact=getattr(self, "compact", False),
+                scan_cap=scan_cap,
+                skipped_features=getattr(self, "skipped_features", None),
+            )
+        X_transformed, y, self.numeric_features, self.categorical_features = features
+        if scan_cap:
+            self.numeric_features = self.numeric_features + SCAN_CAP_FEATURES
+        if getattr(self, "window_features", False):
+            X_transformed = pd.concat([X_transformed, self._window().transform(X)], axis=1)
+            self.numeric_features = self.numeric_features + WINDOW_FEATURES
         print(f"Numeric features: {self.numeric_features}")
         print(f"Categorical features: {self.categorical_features}")
         print(f"Transformed features shape: {X_transformed.shape}")
+        if not getattr(self, "return_target", True):
+            return X_transformed
         return X_transformed, y
 
     def get_feature_names_out(self, input_features=None):
-        return self.numeric_features + self.categorical_features
\ No newline at end of file
+        return self.numeric_features + self.categorical_features
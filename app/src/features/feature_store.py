@@ -0,0 +1,282 @@
+"""
+Module for the on-disk feature store of the training data.
+
+Computing the URL and content features of a large training set is the
+slowest step of a retraining, while most rows were already featurized by the
+previous run. The feature store keeps the output of these functions on disk
+and only computes the features of the values it has never seen:
+
+- each feature group ("url", "content") is keyed by a 64-bit hash of its
+  input value (`pd.util.hash_pandas_object`), so identical URLs or bodies are
+  featurized once;
+- the keys are split into partitions by hash prefix, each stored as an
+  uncompressed Feather file read back by memory mapping;
+- each group has a version, the hash of the source code of the functions of
+  `url_utils`/`content_utils` it uses: changing one of them changes the
+  version, so the partitions of this group are recomputed (the partitions of
+  the other group are kept).
+
+The stale versions are only removed by an explicit `prune` (or the command
+line below), never when a store is opened: another process sharing the
+directory may still run an older version of the code.
+
+The label encoding of the categorical features depends on all the rows of a
+batch, so it is not stored: `build_features` encodes them for each call and
+returns exactly the output of `src.features.build_features.build_features`.
+
+Layout:
+-------
+<root>/<group>/<version>/part-00.feather
+
+Usage:
+------
+    PYTHONPATH=app python app/src/features/feature_store.py feature_store
+
+Example usage:
+--------------
+store = FeatureStore("feature_store")
+X, y, numeric_features, categorical_features = store.build_features(data)
+print(store.last_stats)
+store.prune()
+
+Classes:
+--------
+- FeatureStore: Featurizes DataFrames, reusing the features stored on disk.
+"""
+
+import argparse  # Analyse des arguments de la ligne de commande
+import hashlib  # Version du code des features
+import inspect  # Code source des fonctions de features
+import os  # Gestion des partitions
+import shutil  # Suppression des versions périmées
+
+import numpy as np  # Manipulation des clés
+import pandas as pd  # Manipulation des données
+from src.features.build_features import (
+    CATEGORICAL_FEATURES,
+    CONTENT_FEATURE_FUNCTIONS,
+    NUMERIC_FEATURES,
+    URL_FEATURE_FUNCTIONS,
+    _apply_scan_cap,
+    _compact_counters,
+    _encode_categoricals,
+    cap_scan,
+)
+from src.utils.content_utils import apply_to_content
+
+try:
+    import pyarrow as pa  # Fichiers Feather lus par projection mémoire
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover
+    pa = feather = None
+
+# Nombre de bits du préfixe de hachage : 2**6 = 64 partitions par groupe
+PARTITION_BITS = 6
+
+
+def _group_version(functions):
+    """
+    Return the version of a feature group: a hash of the source code of its functions.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for name, function in functions:
+        digest.update(name.encode("utf-8"))
+        digest.update(inspect.getsource(function).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# Groupes de features : colonne d'entrée, fonctions appliquées à chaque valeur
+_GROUPS = {
+    "url": {
+        "source": lambda data: data["URL"],
+        "features": URL_FEATURE_FUNCTIONS,
+        "apply": lambda value, function: function(value),
+        "version": _group_version(list(URL_FEATURE_FUNCTIONS.items())),
+    },
+    "content": {
+        # Même conversion que 'build_features' : un corps absent devient "nan"
+        "source": lambda data: data["content"].astype(str),
+        "features": CONTENT_FEATURE_FUNCTIONS,
+        "apply": lambda value, function: apply_to_content(value, function),
+        "version": _group_version(
+            list(CONTENT_FEATURE_FUNCTIONS.items()) + [("apply_to_content", apply_to_content)]
+        ),
+    },
+}
+
+
+class FeatureStore:
+    """
+    Featurize DataFrames, reusing the URL and content features stored on disk.
+
+    Parameters:
+    root (str): The directory of the store.
+    partition_bits (int): The number of bits of the hash prefix of the partitions.
+    """
+
+    def __init__(self, root, partition_bits=PARTITION_BITS):
+        if feather is None:
+            raise ImportError("The feature store requires pyarrow")
+        self.root = root
+        self.partition_bits = partition_bits
+        self.last_stats = {}
+        for group, spec in _GROUPS.items():
+            os.makedirs(os.path.join(root, group, spec["version"]), exist_ok=True)
+
+    def prune(self):
+        """
+        Remove the partitions written by other versions of the feature code.
+
+        Returns:
+        list: The removed directories, as "<group>/<version>".
+        """
+        removed = []
+        for group, spec in _GROUPS.items():
+            group_dir = os.path.join(self.root, group)
+            for name in os.listdir(group_dir):
+                if name != spec["version"]:
+                    print(f"Feature store : version périmée supprimée ({group}/{name})")
+                    shutil.rmtree(os.path.join(group_dir, name), ignore_errors=True)
+                    removed.append(f"{group}/{name}")
+        return removed
+
+    def _partition_path(self, group, partition):
+        version = _GROUPS[group]["version"]
+        return os.path.join(self.root, group, version, f"part-{partition:02x}.feather")
+
+    def _read_partition(self, group, partition):
+        path = self._partition_path(group, partition)
+        if not os.path.exists(path):
+            return None
+        # Projection mémoire : les colonnes numériques ne sont pas copiées à la lecture
+        return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+
+    def _write_partition(self, group, partition, frame):
+        path = self._partition_path(group, partition)
+        tmp_path = f"{path}.tmp"
+        feather.write_feather(
+            pa.Table.from_pandas(frame, preserve_index=False),
+            tmp_path,
+            compression="uncompressed",
+        )
+        os.replace(tmp_path, path)  # Renommage atomique
+
+    def _compute(self, group, values):
+        spec = _GROUPS[group]
+        frame = pd.DataFrame(index=values.index)
+        for feature, function in spec["features"].items():
+            frame[feature] = values.apply(lambda value: spec["apply"](value, function))
+        return frame
+
+    def group_features(self, group, values):
+        """
+        Return the features of a group for each value, computing only the unknown values.
+
+        Parameters:
+        group (str): The feature group, "url" or "content".
+        values (pd.Series): The input values of the group.
+
+        Returns:
+        pd.DataFrame: The features of the group, aligned with `values`.
+        """
+        keys = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        unique_keys, first_rows, inverse = np.unique(
+            keys, return_index=True, return_inverse=True
+        )
+        partitions = unique_keys >> np.uint64(64 - self.partition_bits)
+        frames = []
+        computed = 0
+        for partition in np.unique(partitions).tolist():
+            positions = np.flatnonzero(partitions == partition)
+            wanted = unique_keys[positions]
+            stored = self._read_partition(group, partition)
+            found = np.full(len(wanted), -1)
+            if stored is not None:
+                found = pd.Index(stored["key"]).get_indexer(wanted)
+            hits = found >= 0
+
+            if hits.any():
+                frame = stored.iloc[found[hits]].drop(columns="key")
+                frame.index = positions[hits]
+                frames.append(frame)
+            if not hits.all():
+                missing = positions[~hits]
+                new = self._compute(group, values.iloc[first_rows[missing]])
+                new.index = missing
+                frames.append(new)
+                computed += len(missing)
+                new = new.assign(key=unique_keys[missing])
+                self._write_partition(
+                    group, partition, new if stored is None else pd.concat([stored, new])
+                )
+
+        self.last_stats[group] = {"values": len(unique_keys), "computed": computed}
+        columns = list(_GROUPS[group]["features"])
+        if not frames:
+            return self._compute(group, values)
+        features = pd.concat(frames).sort_index()[columns]
+        features = features.iloc[inverse]
+        features.index = values.index
+        return features
+
+    def build_features(self, data, compact=False, scan_cap=None):
+        """
+        Preprocess and extract features from the raw data, reusing the stored features.
+
+        Parameters:
+        data (pd.DataFrame): The raw data, with the columns read by `build_features`.
+        compact (bool): See `build_features`.
+        scan_cap (int): See `build_features`. The capped values are stored under
+        their own key, the values shorter than the cap share their features with
+        the uncapped mode.
+
+        Returns:
+        pd.DataFrame: The features, identical to the output of `build_features`.
+        np.ndarray: The target variable.
+        list: The numeric features.
+        list: The categorical features.
+        """
+        self.last_stats = {}
+        urls = _GROUPS["url"]["source"](data)
+        contents = _GROUPS["content"]["source"](data)
+        if scan_cap:
+            url_features = self.group_features("url", cap_scan(urls.astype(str), scan_cap))
+            content_features = self.group_features("content", cap_scan(contents, scan_cap))
+        else:
+            url_features = self.group_features("url", urls)
+            content_features = self.group_features("content", contents)
+
+        # Même ordre de colonnes que 'build_features'
+        X = data[["Method", "host", "cookie", "Accept"]].copy()
+        X["content_length"] = content_features["content_length"]
+        X["content"] = _GROUPS["content"]["source"](data)
+        X["URL"] = data["URL"]
+        X = pd.concat(
+            [X, url_features, content_features.drop(columns="content_length")], axis=1
+        )
+        if scan_cap:
+            X = _apply_scan_cap(X, X["URL"], X["content"], scan_cap)
+
+        categorical_features = list(CATEGORICAL_FEATURES)
+        X, y = _encode_categoricals(X, data["classification"], categorical_features, compact)
+        numeric_features = list(NUMERIC_FEATURES)
+        if compact:
+            X = _compact_counters(X, numeric_features)
+        print(f"Feature store : {self.last_stats}")
+        return X, y, numeric_features, categorical_features
+
+
+def main(argv=None):
+    """
+    Remove the stale versions of a feature store.
+    """
+    parser = argparse.ArgumentParser(description="Remove the stale versions of a feature store.")
+    parser.add_argument("root", nargs="?", default="feature_store")
+    args = parser.parse_args(argv)
+    removed = FeatureStore(args.root).prune()
+    print(f"Feature store : {len(removed)} version(s) périmée(s) supprimée(s)")
+
+
+# Point d'entrée du script
+if __name__ == "__main__":
+    main()
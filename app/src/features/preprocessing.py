@@ -4,7 +4,14 @@ from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.impute import SimpleImputer
+from sklearn.ensemble import RandomForestClassifier
+from src.features.build_features import (
+    CATEGORICAL_FEATURES,
+    NUMERIC_FEATURES,
+    SCAN_CAP_FEATURES,
+)
 from src.features.custom_transformers import FeatureBuilder
+from src.features.window_features import WINDOW_FEATURES
 
 
 def filtrage_colonnes(data):
@@ -64,14 +71,49 @@ def build_features(data):
     return X[selected_features], data["target_column"]
 
 
-def preprocessing_pipeline():
+def preprocessing_pipeline(
+    memory=None,
+    n_jobs=None,
+    compact=False,
+    feature_store=None,
+    window_features=False,
+    scan_cap=None,
+):
     """
     Create a preprocessing pipeline for the dataset.
 
+    Parameters:
+    memory (str or joblib.Memory): If given, the directory (or joblib memory) where
+    the fitted transformers and their outputs are cached. The cache is keyed by
+    the parameters of the transformers and a hash of their input data, so the
+    folds of a hyperparameter search only build the features of a given data
+    split once.
+    n_jobs (int): The number of processes building the features of large inputs
+    and fitting the numeric and categorical branches (None: no parallelism,
+    -1: all cores).
+    compact (bool): Whether to use the compact representation of the features.
+    feature_store (str): If given, the directory of the `FeatureStore` reused
+    across runs for the URL and content features.
+    window_features (bool): Whether to add the sliding-window features per host
+    and per cookie to the numeric features.
+    scan_cap (int): If given, the bounded-cost mode of the feature builder: the
+    URL and content features only read `scan_cap` characters of each value, and
+    the truncation flags are added to the numeric features.
+
     Returns:
     sklearn.pipeline.Pipeline: A pipeline that preprocesses the dataset.
+    sklearn.pipeline.Pipeline: The numeric transformer.
+    sklearn.pipeline.Pipeline: The categorical transformer.
     """
-    feature_builder = FeatureBuilder()
+    # Le pipeline enchaîne les étapes : seules les features sont transmises
+    feature_builder = FeatureBuilder(
+        compact=compact,
+        return_target=False,
+        n_jobs=n_jobs,
+        feature_store=feature_store,
+        window_features=window_features,
+        scan_cap=scan_cap,
+    )
     
     numeric_transformer = Pipeline(steps=[
         ('imputer', SimpleImputer(strategy='mean')),
@@ -84,15 +126,62 @@ def preprocessing_pipeline():
         ('onehot', OneHotEncoder(handle_unknown='ignore'))
     ])
 
+    # Listes de features connues à la construction ('content_length' n'est retenue qu'une fois)
+    numeric_features = list(dict.fromkeys(NUMERIC_FEATURES))
+    if scan_cap:
+        numeric_features += SCAN_CAP_FEATURES
+    if window_features:
+        numeric_features += WINDOW_FEATURES
     preprocessor = ColumnTransformer(
         transformers=[
-            ('num', numeric_transformer, feature_builder.numeric_features),
-            ('cat', categorical_transformer, feature_builder.categorical_features)
-        ])
+            ('num', numeric_transformer, numeric_features),
+            ('cat', categorical_transformer, list(CATEGORICAL_FEATURES))
+        ],
+        n_jobs=n_jobs)
 
     pipeline = Pipeline(steps=[
         ('feature_builder', feature_builder),
         ('preprocessor', preprocessor)
-    ])
+    ], memory=memory)
 
     return pipeline, numeric_transformer, categorical_transformer
+
+
+def training_pipeline(
+    memory=None, n_jobs=-1, compact=False, feature_store=None, window_features=False,
+    scan_cap=None, **forest_params
+):
+    """
+    Create the training pipeline: preprocessing followed by a random forest.
+
+    Parameters:
+    memory (str or joblib.Memory): The cache of the preprocessing steps, see
+    `preprocessing_pipeline`.
+    n_jobs (int): The number of cores used to build the features, fit the
+    preprocessor branches and train the trees (-1: all cores).
+    compact (bool): Whether to use the compact representation of the features.
+    feature_store (str): The directory of the feature store, see `preprocessing_pipeline`.
+    window_features (bool): Whether to add the sliding-window features.
+    scan_cap (int): The scan cap of the bounded-cost mode, see `preprocessing_pipeline`.
+    **forest_params: The parameters of the `RandomForestClassifier`.
+
+    Returns:
+    sklearn.pipeline.Pipeline: A pipeline whose last step, "classifier", is the forest.
+
+    Example:
+    pipeline = training_pipeline(memory="cache", n_estimators=200)
+    search = GridSearchCV(pipeline, {"classifier__max_depth": [10, 20]}, cv=3)
+    search.fit(data, data["classification"])
+    """
+    pipeline, _, _ = preprocessing_pipeline(
+        memory=memory,
+        n_jobs=n_jobs,
+        compact=compact,
+        feature_store=feature_store,
+        window_features=window_features,
+        scan_cap=scan_cap,
+    )
+    pipeline.steps.append(
+        ("classifier", RandomForestClassifier(n_jobs=n_jobs, **forest_params))
+    )
+    return pipeline
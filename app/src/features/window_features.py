@@ -0,0 +1,251 @@
+"""
+Module for the sliding-window behavioural features.
+
+`build_features` looks at each request in isolation, while scanners and
+brute-force attempts show up as rates across the requests of a same host or
+client. `SlidingWindowFeatures` keeps, for each value of the key columns
+("host" and "cookie"), counters over a sliding time window split into
+buckets, and returns for each request:
+
+- <key>_window_requests: the number of requests of the key in the window;
+- <key>_window_distinct_urls: the estimated number of distinct URL paths
+  (linear counting on a small bitmap per bucket);
+- <key>_window_suspicious_ratio: the share of requests matching an
+  error-prone pattern (encoded quote or bracket, path traversal, SQL keywords...).
+
+The requests of a DataFrame need their time, from a "timestamp" column or
+an explicit argument: without it, all the rows of a training set would fall
+in the same instant and the counters would only reflect their order. The API
+timestamps the requests with their reception time.
+
+Each request updates a fixed number of buckets, so the cost per request is
+O(1) (a few microseconds). Memory is bounded: at most `max_keys` keys are
+kept per key column, the least recently seen ones and the keys idle for a
+whole window being evicted.
+
+Example usage:
+--------------
+window = SlidingWindowFeatures(window_seconds=60, buckets=6)
+extra = window.transform(df)  # Colonnes WINDOW_FEATURES, alignées sur df
+window.reset()
+
+Classes:
+--------
+- SlidingWindowFeatures: The stateful sliding-window counters.
+
+Functions:
+----------
+- check_timestamps(data): Checks that a DataFrame has the time of its requests.
+"""
+
+import math  # Estimation du nombre d'URL distinctes
+import re  # Motifs de requêtes suspectes
+import threading  # Mises à jour concurrentes
+import time  # Horodatage des requêtes
+from collections import OrderedDict  # Éviction des clés inactives
+
+import pandas as pd  # Manipulation des données
+
+KEY_COLUMNS = ("host", "cookie")
+
+WINDOW_FEATURES = [
+    f"{key}_{feature}"
+    for key in KEY_COLUMNS
+    for feature in ("window_requests", "window_distinct_urls", "window_suspicious_ratio")
+]
+
+# Nombre de bits à 1 d'un entier ('int.bit_count' à partir de Python 3.10)
+_popcount = getattr(int, "bit_count", None) or (lambda value: bin(value).count("1"))
+
+# Motifs fréquents dans les requêtes d'attaque (injection, XSS, traversée de répertoires)
+_SUSPICIOUS = re.compile(
+    r"%27|%22|%3c|%3e|'|<|\.\./|\.\.%2f|--|/\*|\bunion\b|\bselect\b|\bscript\b", re.IGNORECASE
+)
+
+
+def check_timestamps(data):
+    """
+    Check that a DataFrame has the time of its requests.
+
+    Parameters:
+    data (pd.DataFrame): The requests.
+
+    Raises:
+    ValueError: If `data` has no "timestamp" column.
+    """
+    if "timestamp" not in data.columns:
+        raise ValueError(
+            "The sliding-window features require a 'timestamp' column "
+            "(the time of each request, in seconds)"
+        )
+
+
+class _KeyWindow:
+    """
+    The buckets of one key: a ring of `buckets` slots, each with its bucket number,
+    and the running totals of the buckets inside the window.
+    """
+
+    __slots__ = ("last", "epochs", "counts", "suspicious", "bitmaps", "total", "flagged", "union")
+
+    def __init__(self, buckets):
+        self.last = -1
+        self.epochs = [-1] * buckets
+        self.counts = [0] * buckets
+        self.suspicious = [0] * buckets
+        self.bitmaps = [0] * buckets
+        self.total = self.flagged = self.union = 0
+
+
+class SlidingWindowFeatures:
+    """
+    Sliding-window counters per host and per cookie.
+
+    Parameters:
+    window_seconds (float): The length of the sliding window.
+    buckets (int): The number of buckets of the window.
+    max_keys (int): The maximum number of keys kept per key column.
+    bitmap_bits (int): The size of the bitmap used to estimate distinct URLs.
+    """
+
+    def __init__(self, window_seconds=60.0, buckets=6, max_keys=100000, bitmap_bits=512):
+        self.window_seconds = window_seconds
+        self.buckets = buckets
+        self.max_keys = max_keys
+        self.bitmap_bits = bitmap_bits
+        self._init_state()
+
+    def reset(self):
+        """
+        Forget all the requests added to the counters.
+        """
+        self._init_state()
+
+    def _init_state(self):
+        self._bucket_seconds = self.window_seconds / self.buckets
+        self._keys = {column: OrderedDict() for column in KEY_COLUMNS}
+        self._lock = threading.Lock()
+
+    # L'état et le verrou ne sont pas sauvegardés avec le pipeline
+    def __getstate__(self):
+        return {
+            "window_seconds": self.window_seconds,
+            "buckets": self.buckets,
+            "max_keys": self.max_keys,
+            "bitmap_bits": self.bitmap_bits,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_state()
+
+    def _window(self, keys, key, bucket):
+        """
+        Return the buckets of a key, evicting the least recently seen and idle keys.
+        """
+        window = keys.get(key)
+        if window is None:
+            window = keys[key] = _KeyWindow(self.buckets)
+            # Au plus une clé évincée pour la taille et quelques-unes pour l'inactivité
+            if len(keys) > self.max_keys:
+                keys.popitem(last=False)
+            for _ in range(2):
+                oldest = next(iter(keys.values()))
+                if oldest is window or oldest.last > bucket - self.buckets:
+                    break
+                keys.popitem(last=False)
+        else:
+            keys.move_to_end(key)
+        return window
+
+    def _update(self, window, bucket, url_bit, suspicious):
+        """
+        Add a request to the buckets of a key and return its window features.
+        """
+        # Requêtes concurrentes légèrement désordonnées : rattachées au bucket courant
+        bucket = max(bucket, window.last)
+        size = self.buckets
+        slot = bucket % size
+        if window.last != bucket:
+            # Nouveau bucket pour cette clé : totaux recalculés sans les buckets expirés
+            window.epochs[slot] = bucket
+            window.counts[slot] = window.suspicious[slot] = window.bitmaps[slot] = 0
+            total = flagged = union = 0
+            oldest = bucket - size
+            for index in range(size):
+                if window.epochs[index] > oldest:
+                    total += window.counts[index]
+                    flagged += window.suspicious[index]
+                    union |= window.bitmaps[index]
+            window.total, window.flagged, window.union = total, flagged, union
+            window.last = bucket
+
+        window.counts[slot] += 1
+        window.suspicious[slot] += suspicious
+        window.bitmaps[slot] |= url_bit
+        window.total += 1
+        window.flagged += suspicious
+        window.union |= url_bit
+
+        # Comptage linéaire : n ≈ -m ln(V), V la proportion de bits à zéro
+        bits = self.bitmap_bits
+        zeros = bits - _popcount(window.union)
+        distinct = bits * math.log(bits / zeros) if zeros else bits * math.log(bits)
+        return window.total, distinct, window.flagged / window.total
+
+    def update(self, host, cookie, url, content, timestamp=None):
+        """
+        Add a request to the counters and return its window features.
+
+        Parameters:
+        host (str): The Host header.
+        cookie (str): The Cookie header.
+        url (str): The "URL" field.
+        content (str): The body.
+        timestamp (float): The time of the request (default: now).
+
+        Returns:
+        list: The values of `WINDOW_FEATURES`.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        bucket = int(timestamp // self._bucket_seconds)
+        url = str(url)
+        path = url.split(" ", 1)[0].split("?", 1)[0]
+        url_bit = 1 << (hash(path) % self.bitmap_bits)
+        suspicious = 1 if _SUSPICIOUS.search(url) or (
+            isinstance(content, str) and _SUSPICIOUS.search(content)
+        ) else 0
+
+        values = []
+        with self._lock:
+            for column, key in zip(KEY_COLUMNS, (host, cookie)):
+                window = self._window(self._keys[column], str(key), bucket)
+                values.extend(self._update(window, bucket, url_bit, suspicious))
+        return values
+
+    def transform(self, data, timestamps=None):
+        """
+        Add the requests of a DataFrame to the counters, in order, and return their features.
+
+        Parameters:
+        data (pd.DataFrame): The requests, with the columns of the dataset.
+        timestamps (array-like): The time of each request. Default: the "timestamp"
+        column.
+
+        Returns:
+        pd.DataFrame: The `WINDOW_FEATURES` columns, aligned with `data`.
+
+        Raises:
+        ValueError: If no timestamps are given and `data` has no "timestamp" column.
+        """
+        if timestamps is None:
+            check_timestamps(data)
+            timestamps = data["timestamp"]
+        rows = [
+            self.update(host, cookie, url, content, timestamp)
+            for host, cookie, url, content, timestamp in zip(
+                data["host"], data["cookie"], data["URL"], data["content"], timestamps
+            )
+        ]
+        return pd.DataFrame(rows, columns=WINDOW_FEATURES, index=data.index, dtype=float)
@@ -0,0 +1,128 @@
+"""
+Module for the early-exit evaluation of the random forest.
+
+A random forest predicts the class with the highest sum of the per-tree
+class probabilities. This module evaluates the trees by chunks and stops,
+row by row, as soon as the result can no longer change: each remaining tree
+adds at most 1 to the score of a class, so once the lead of the best class
+over the runner-up is larger than the number of trees left, the majority
+decision is certain and the row gives the same class as a full evaluation.
+
+An optional confidence threshold stops earlier, when the mean probability
+of the best class over the trees evaluated so far reaches the threshold.
+This mode is faster but no longer guaranteed to match the full evaluation.
+
+Example usage:
+--------------
+predictor = EarlyExitPredictor(get_forest(model), chunk_size=8)
+predictions, details = predictor(X)
+print(details["trees_evaluated"])
+
+Classes:
+--------
+- EarlyExitPredictor: Predicts with the forest, stopping once the decision is certain.
+
+Functions:
+----------
+- get_forest(model): Returns the scikit-learn forest wrapped by an MLflow model.
+"""
+
+import numpy as np  # Calculs vectorisés sur les scores des classes
+from sklearn.pipeline import Pipeline  # Modèles enregistrés sous forme de pipeline
+
+# Marge ajoutée à la condition de certitude pour absorber les erreurs d'arrondi
+_EPSILON = 1e-9
+
+
+def get_forest(model):
+    """
+    Return the scikit-learn forest wrapped by an MLflow pyfunc model.
+
+    Parameters:
+    model (mlflow.pyfunc.PyFuncModel or sklearn estimator): The loaded model.
+
+    Returns:
+    sklearn.ensemble.RandomForestClassifier or None: The forest, or None if
+    the model is not a single-output scikit-learn forest.
+    """
+    estimator = model
+    get_raw_model = getattr(model, "get_raw_model", None)
+    try:
+        estimator = get_raw_model() if get_raw_model else getattr(model, "_model_impl", model)
+    except Exception:  # pylint: disable=broad-except
+        estimator = getattr(model, "_model_impl", model)
+    # Selon la version de MLflow, l'estimateur est enveloppé dans '_SklearnModelWrapper'
+    estimator = getattr(estimator, "sklearn_model", estimator)
+    if isinstance(estimator, Pipeline):
+        estimator = estimator.steps[-1][1]
+    if not hasattr(estimator, "estimators_") or getattr(estimator, "n_outputs_", 1) != 1:
+        return None
+    if not hasattr(estimator.estimators_[0], "predict_proba"):
+        return None
+    return estimator
+
+
+class EarlyExitPredictor:
+    """
+    Predict with a random forest, evaluating the trees by chunks until the decision is certain.
+
+    Parameters:
+    forest (sklearn.ensemble.RandomForestClassifier): The fitted forest.
+    chunk_size (int): The number of trees evaluated between two checks.
+    confidence (float): If given, a row also stops once the mean probability
+    of its best class reaches this threshold (not guaranteed to match the
+    full evaluation).
+    """
+
+    def __init__(self, forest, chunk_size=8, confidence=None):
+        self.forest = forest
+        self.chunk_size = max(1, int(chunk_size))
+        self.confidence = confidence
+
+    def __call__(self, X):
+        """
+        Predict the class of each row.
+
+        Parameters:
+        X (array-like or sparse matrix): The output of the preprocessor.
+
+        Returns:
+        np.ndarray: The predicted classes.
+        dict: {"trees_evaluated": np.ndarray}, the number of trees evaluated per row.
+        """
+        forest = self.forest
+        # Même validation que 'forest.predict' (float32, CSR)
+        X = forest._validate_X_predict(X)  # pylint: disable=protected-access
+        trees = forest.estimators_
+        n_trees = len(trees)
+        n_rows = X.shape[0]
+
+        scores = np.zeros((n_rows, forest.n_classes_))
+        trees_evaluated = np.zeros(n_rows, dtype=np.int64)
+        active = np.arange(n_rows)
+
+        for start in range(0, n_trees, self.chunk_size):
+            stop = min(n_trees, start + self.chunk_size)
+            X_active = X[active]
+            chunk_scores = np.zeros((len(active), forest.n_classes_))
+            for tree in trees[start:stop]:
+                chunk_scores += tree.predict_proba(X_active, check_input=False)
+            scores[active] += chunk_scores
+            trees_evaluated[active] = stop
+
+            remaining = n_trees - stop
+            if remaining == 0 or forest.n_classes_ < 2:
+                break
+            active_scores = scores[active]
+            best = active_scores.max(axis=1)
+            runner_up = np.partition(active_scores, -2, axis=1)[:, -2]
+            # Décision certaine : les arbres restants ne peuvent plus combler l'écart
+            finished = best - runner_up > remaining + _EPSILON
+            if self.confidence is not None:
+                finished |= best / stop >= self.confidence
+            active = active[~finished]
+            if active.size == 0:
+                break
+
+        predictions = forest.classes_.take(np.argmax(scores, axis=1), axis=0)
+        return predictions, {"trees_evaluated": trees_evaluated}
@@ -0,0 +1,246 @@
+"""
+Module for exporting the preprocessor and the random forest to ONNX.
+
+The exported graph takes the output of the feature builder (one input per
+column of the preprocessor: float counters and categorical code strings) and
+returns the predicted label and the class probabilities, so that the
+`ColumnTransformer` and the forest run in onnxruntime instead of pandas and
+scikit-learn (see `src.models.onnx_backend`).
+
+The one-hot encoder of the categorical features has one column per value
+seen at training time, most of them never tested by the forest. A dense
+ONNX one-hot encoding of all of them would be huge, so the exported encoder
+only keeps the categories the trees split on, and the feature indices of the
+trees are remapped accordingly: the forest reads exactly the same values.
+The categorical imputer is dropped, the feature builder never returns
+missing codes.
+
+The graph records the columns of its inputs and a signature of the forest,
+checked by the backend against the model loaded by the API.
+
+Usage:
+------
+    PYTHONPATH=app python app/src/models/export_onnx.py --output model.onnx \\
+        --model-uri models:/random_forest_detection/6 --parity-csv data.csv
+
+Functions:
+----------
+- forest_signature(forest): Returns a hash of the trees of a forest.
+- export_onnx(complete_pipeline, model, path): Exports the preprocessor and the forest to ONNX.
+"""
+
+import argparse  # Analyse des arguments de la ligne de commande
+import copy  # Copie du preprocessor modifiée pour l'export
+import hashlib  # Signature de la forêt
+import json  # Colonnes enregistrées dans les métadonnées du graphe
+
+import numpy as np  # Indices des features utilisées par les arbres
+from sklearn.pipeline import Pipeline  # Assemblage du preprocessor et de la forêt
+from sklearn.preprocessing import OneHotEncoder  # Encodeur réduit aux catégories utiles
+from src.models.early_exit import get_forest
+
+try:
+    from skl2onnx import to_onnx  # Conversion des estimateurs scikit-learn
+    from skl2onnx.common.data_types import FloatTensorType, StringTensorType
+except ImportError:  # pragma: no cover
+    to_onnx = None
+
+# Versions des jeux d'opérateurs ONNX utilisés par le graphe
+TARGET_OPSET = {"": 17, "ai.onnx.ml": 3}
+# Catégorie jamais rencontrée, pour les features dont aucune valeur n'est testée
+_UNUSED_CATEGORY = "\x00unused"
+
+
+def forest_signature(forest):
+    """
+    Return a hash of the split features, thresholds and leaf values of a forest.
+
+    Parameters:
+    forest (sklearn.ensemble.RandomForestClassifier): The fitted forest.
+
+    Returns:
+    str: The signature, identical for two identical forests.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for tree in forest.estimators_:
+        digest.update(tree.tree_.feature.tobytes())
+        digest.update(tree.tree_.threshold.tobytes())
+        digest.update(tree.tree_.value.tobytes())
+    return digest.hexdigest()
+
+
+def _split_preprocessor(preprocessor):
+    """
+    Return the numeric pipeline, its columns, the one-hot encoder and the categorical columns.
+
+    Raises:
+    ValueError: If the preprocessor does not have the layout of `preprocessing_pipeline`.
+    """
+    transformers = {
+        name: (transformer, list(columns))
+        for name, transformer, columns in preprocessor.transformers_
+        if not (isinstance(transformer, str) and transformer == "drop")
+    }
+    if set(transformers) != {"num", "cat"}:
+        raise ValueError(f"Unsupported preprocessor transformers: {sorted(transformers)}")
+    numeric, numeric_features = transformers["num"]
+    categorical, categorical_features = transformers["cat"]
+    encoder = categorical.steps[-1][1] if isinstance(categorical, Pipeline) else categorical
+    if not isinstance(encoder, OneHotEncoder) or encoder.drop_idx_ is not None:
+        raise ValueError("The categorical features must end with a OneHotEncoder without drop")
+    if getattr(encoder, "infrequent_categories_", None) and any(
+        categories is not None for categories in encoder.infrequent_categories_
+    ):
+        raise ValueError("Infrequent categories of the OneHotEncoder are not supported")
+    return numeric, numeric_features, encoder, categorical_features
+
+
+def _reduced_preprocessor(preprocessor, forest):
+    """
+    Copy the preprocessor, keeping only the one-hot columns tested by the forest.
+
+    Returns:
+    ColumnTransformer: The reduced preprocessor, with one column name per input.
+    dict: The index of each feature of the forest in the reduced output.
+    list: The numeric columns.
+    list: The categorical columns.
+    """
+    numeric, numeric_features, encoder, categorical_features = _split_preprocessor(preprocessor)
+    n_numeric = len(numeric_features)
+    used = np.unique(
+        np.concatenate([tree.tree_.feature[tree.tree_.feature >= 0] for tree in forest.estimators_])
+    )
+
+    # Colonne one-hot d'origine -> (feature catégorielle, catégorie)
+    offsets = np.cumsum([n_numeric] + [len(values) for values in encoder.categories_])
+    kept = [[] for _ in categorical_features]
+    mapping = {}
+    for feature in used.tolist():
+        if feature < n_numeric:
+            mapping[feature] = feature
+        else:
+            kept[int(np.searchsorted(offsets, feature, side="right")) - 1].append(feature)
+
+    categories = []
+    index = n_numeric
+    for position, features in enumerate(kept):
+        values = [encoder.categories_[position][feature - offsets[position]] for feature in features]
+        for feature in features:
+            mapping[feature] = index
+            index += 1
+        if not values:
+            values = [_UNUSED_CATEGORY]
+            index += 1
+        categories.append(np.array(values, dtype=object))
+    reduced_encoder = OneHotEncoder(categories=categories, handle_unknown="ignore").fit(
+        np.array([[values[0] for values in categories]], dtype=object)
+    )
+
+    # Noms d'entrée uniques : "content_length" apparaît deux fois parmi les features numériques
+    numeric_inputs = [f"numeric_{position}" for position in range(n_numeric)]
+    categorical_inputs = [f"categorical_{position}" for position in range(len(categorical_features))]
+    reduced = copy.deepcopy(preprocessor)
+    reduced.transformers_ = [
+        ("num", copy.deepcopy(numeric), numeric_inputs),
+        ("cat", Pipeline([("onehot", reduced_encoder)]), categorical_inputs),
+    ]
+    reduced.feature_names_in_ = np.array(numeric_inputs + categorical_inputs, dtype=object)
+    return reduced, mapping, numeric_features, categorical_features
+
+
+def export_onnx(complete_pipeline, model, path=None):
+    """
+    Export the preprocessor and the random forest to a single ONNX graph.
+
+    Parameters:
+    complete_pipeline (sklearn.pipeline.Pipeline): The fitted preprocessing pipeline.
+    model (mlflow.pyfunc.PyFuncModel or sklearn estimator): The classification model.
+    path (str): If given, the file the graph is written to.
+
+    Returns:
+    onnx.ModelProto: The graph, with the inputs "numeric_<i>" (float) and
+    "categorical_<i>" (string), and the outputs "label" and "probabilities".
+
+    Raises:
+    ImportError: If skl2onnx is not installed.
+    ValueError: If the model is not a scikit-learn forest or the preprocessor
+    does not have the layout of `preprocessing_pipeline`.
+    """
+    if to_onnx is None:
+        raise ImportError("The ONNX export requires skl2onnx")
+    forest = get_forest(model)
+    if forest is None:
+        raise ValueError("The ONNX export requires a scikit-learn forest")
+
+    preprocessor = complete_pipeline.named_steps["preprocessor"]
+    reduced, mapping, numeric_features, categorical_features = _reduced_preprocessor(
+        preprocessor, forest
+    )
+    initial_types = [(name, FloatTensorType([None, 1])) for name in reduced.transformers_[0][2]]
+    initial_types += [(name, StringTensorType([None, 1])) for name in reduced.transformers_[1][2]]
+    graph = to_onnx(
+        Pipeline([("preprocessor", reduced), ("classifier", forest)]),
+        initial_types=initial_types,
+        options={id(forest): {"zipmap": False}},
+        target_opset=TARGET_OPSET,
+    )
+
+    # Les arbres lisent les colonnes de la sortie réduite
+    for node in graph.graph.node:
+        if node.op_type == "TreeEnsembleClassifier":
+            for attribute in node.attribute:
+                if attribute.name == "nodes_featureids":
+                    features = [mapping.get(feature, 0) for feature in attribute.ints]
+                    del attribute.ints[:]
+                    attribute.ints.extend(features)
+
+    metadata = {
+        "numeric_features": json.dumps(numeric_features),
+        "categorical_features": json.dumps(categorical_features),
+        "forest_signature": forest_signature(forest),
+    }
+    for key, value in metadata.items():
+        entry = graph.metadata_props.add()
+        entry.key, entry.value = key, value
+
+    if path is not None:
+        with open(path, "wb") as file:
+            file.write(graph.SerializeToString())
+        print(f"Graphe ONNX écrit dans {path} ({len(mapping)} features utilisées par la forêt)")
+    return graph
+
+
+def main(argv=None):
+    """
+    Export the model of the registry and optionally check the parity on a CSV file.
+    """
+    import joblib  # pylint: disable=import-outside-toplevel
+    import mlflow  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(description="Export the preprocessor and the forest to ONNX.")
+    parser.add_argument("--output", default="model.onnx")
+    parser.add_argument("--model-uri", default="models:/random_forest_detection/6")
+    parser.add_argument("--pipeline", default="complete_preprocessor_pipeline.pkl")
+    parser.add_argument("--parity-csv", help="CSV file of requests to compare the predictions on.")
+    args = parser.parse_args(argv)
+
+    complete_pipeline = joblib.load(args.pipeline)
+    model = mlflow.pyfunc.load_model(model_uri=args.model_uri)
+    export_onnx(complete_pipeline, model, args.output)
+
+    if args.parity_csv:
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        from src.models.onnx_backend import (  # pylint: disable=import-outside-toplevel
+            OnnxBackend,
+            check_parity,
+        )
+
+        report = check_parity(
+            OnnxBackend(args.output), complete_pipeline, model, pd.read_csv(args.parity_csv)
+        )
+        print(f"Parité avec scikit-learn : {report}")
+
+
+# Point d'entrée du script
+if __name__ == "__main__":
+    main()
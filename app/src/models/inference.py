@@ -0,0 +1,337 @@
+"""
+Module for running the preprocessing pipeline and the model in-process.
+
+This module gathers the steps shared by the API endpoints and the offline
+batch scorer: building the features of a DataFrame shaped like the original
+dataset, applying the fitted preprocessor and predicting with the model.
+
+Example usage:
+--------------
+predictions, details = predict_frame(df, complete_pipeline, model)
+urls = extract_urls(df["URL"])
+
+Functions:
+----------
+- predict_frame(data, complete_pipeline, model, monitor, predictor, prefilter, shadow, capture,
+  scheduler): Predicts the classification of each row.
+- predict_frames(frames, complete_pipeline, model, ...): Predicts the classification of the
+  rows of several DataFrames with one model call.
+- predict_chunks(chunks, complete_pipeline, model, monitor, predictor, prefilter, shadow, capture,
+  scheduler): Predicts the classification of the rows of successive DataFrames.
+- reusable_predictions(complete_pipeline): Tells whether a prediction can be reused for an
+  identical request.
+- extract_urls(urls): Extracts the URL from the "URL" column values.
+"""
+
+import time  # Horodatage des requêtes pour les features par fenêtre glissante
+from contextlib import nullcontext  # Prédiction sans contrôle des threads
+
+import numpy as np  # Conversion compacte de la matrice du modèle
+import pandas as pd  # Concaténation des features de plusieurs DataFrames
+
+# Colonnes du dataset original attendues par 'build_features'
+DATASET_COLUMNS = [
+    "Method",
+    "User-Agent",
+    "Pragma",
+    "Cache-Control",
+    "Accept",
+    "Accept-encoding",
+    "Accept-charset",
+    "language",
+    "host",
+    "cookie",
+    "content-type",
+    "connection",
+    "lenght",
+    "content",
+    "URL",
+]
+
+# Champs de 'PredictionRequest', dans le même ordre que DATASET_COLUMNS
+REQUEST_FIELDS = [
+    "Method",
+    "User_Agent",
+    "Pragma",
+    "Cache_Control",
+    "Accept",
+    "Accept_encoding",
+    "Accept_charset",
+    "language",
+    "host",
+    "cookie",
+    "content_type",
+    "connection",
+    "lenght",
+    "content",
+    "URL",
+]
+
+
+def _build_features(data, complete_pipeline, monitor=None):
+    """
+    Build the features of the rows with the feature builder of the pipeline.
+    """
+    # Ajouter la colonne 'classification' avec une valeur par défaut
+    data = data.assign(classification=0)
+
+    # Appliquer les transformations de prétraitement
+    feature_builder = complete_pipeline.named_steps["feature_builder"]
+    if getattr(feature_builder, "window_features", False):
+        if "timestamp" not in data.columns:
+            # Requêtes en ligne : datées de leur réception
+            data = data.assign(timestamp=time.time())
+        elif data["timestamp"].isna().any():
+            # Lignes rejouées sans horodatage lisible : datées comme une requête en ligne
+            data = data.assign(timestamp=data["timestamp"].astype(float).fillna(time.time()))
+    X_transformed = feature_builder.transform(data)
+    if isinstance(X_transformed, tuple):  # Pipeline sauvegardé avec la cible
+        X_transformed = X_transformed[0]
+    if monitor is not None:
+        monitor.update(X_transformed, data)
+    return X_transformed
+
+
+def _predict_features(
+    X_transformed, complete_pipeline, model, predictor=None, shadow=None, scheduler=None
+):
+    """
+    Apply the preprocessor to the features and predict with the model.
+    """
+    # Backend contenant lui-même le preprocessor (ONNX) : appelé sur les features
+    if not getattr(predictor, "preprocessed", True):
+        return predictor(X_transformed)
+
+    # Nombre de threads du preprocessor et de la forêt choisi selon la taille de l'appel
+    with scheduler.limit(len(X_transformed)) if scheduler is not None else nullcontext():
+        preprocessor = complete_pipeline.named_steps["preprocessor"]
+        X = preprocessor.transform(X_transformed)
+        if getattr(complete_pipeline.named_steps["feature_builder"], "compact", False):
+            # La forêt convertit X en float32 avant de prédire : conversion anticipée
+            # sans effet sur les prédictions
+            X = X.astype(np.float32)
+
+        print("Forme de X après preprocessor.transform:", X.shape)
+
+        # Prédiction
+        if predictor is not None:
+            predictions, details = predictor(X)
+        else:
+            predictions, details = np.asarray(model.predict(X)), {}
+
+    # Les modèles fantômes réutilisent la matrice déjà calculée, en arrière-plan
+    if shadow is not None:
+        shadow.submit(X, predictions)
+    return predictions, details
+
+
+def reusable_predictions(complete_pipeline):
+    """
+    Tell whether the prediction of a request can be reused for an identical request.
+
+    Parameters:
+    complete_pipeline (sklearn.pipeline.Pipeline): The fitted preprocessing pipeline.
+
+    Returns:
+    bool: False if the feature builder keeps a state updated by each request
+    (sliding-window features): every request must then go through it, and the
+    cache and the coalescing of identical requests must be disabled.
+    """
+    feature_builder = complete_pipeline.named_steps["feature_builder"]
+    return not getattr(feature_builder, "window_features", False)
+
+
+def predict_frame(
+    data,
+    complete_pipeline,
+    model,
+    monitor=None,
+    predictor=None,
+    prefilter=None,
+    shadow=None,
+    capture=None,
+    scheduler=None,
+):
+    """
+    Predict the classification of each row of a DataFrame.
+
+    Parameters:
+    data (pd.DataFrame): The requests, with the columns of `DATASET_COLUMNS`.
+    complete_pipeline (sklearn.pipeline.Pipeline): The fitted preprocessing pipeline.
+    model (mlflow.pyfunc.PyFuncModel): The classification model.
+    monitor (DriftMonitor): If given, the features of the rows are added to its statistics.
+    predictor (callable): If given, called on the preprocessed matrix instead of
+    `model.predict`; it returns the predictions and a dict of per-row details,
+    e.g. `EarlyExitPredictor`. A predictor with `preprocessed = False` (e.g.
+    `OnnxBackend`) includes the preprocessing and is called on the output of the
+    feature builder; the shadow models are then not fed.
+    prefilter (Prefilter): If given, the rows matching a rule get the verdict of
+    the rule and only the other rows go through the model.
+    shadow (ShadowScorer): If given, the rows scored by the model are also scored
+    by the shadow models, in the background.
+    capture (TrafficCapture): If given, a sample of the rows and their predictions
+    is written to the capture files, in the background.
+    scheduler (ThreadScheduler): If given, chooses the number of threads of the
+    preprocessor and the model from the number of rows scored by the model.
+
+    Returns:
+    np.ndarray: The predictions, one per row.
+    dict: Per-row details of the prediction ({name: array}), empty by default.
+    With a pre-filter, "decided_by" is "prefilter:<rule>" or "model".
+    """
+    return predict_frames(
+        [data], complete_pipeline, model, monitor, predictor, prefilter, shadow, capture, scheduler
+    )[0]
+
+
+def predict_frames(
+    frames,
+    complete_pipeline,
+    model,
+    monitor=None,
+    predictor=None,
+    prefilter=None,
+    shadow=None,
+    capture=None,
+    scheduler=None,
+):
+    """
+    Predict the classification of the rows of several DataFrames with one model call.
+
+    The label encoding of the categorical features depends on all the rows
+    given to the feature builder, so the features of each DataFrame are built
+    separately; only the preprocessor and the model, which work row by row,
+    are applied once to the rows of all the DataFrames. The result of each
+    DataFrame is the one `predict_frame` returns for it alone.
+
+    Parameters:
+    frames (list of pd.DataFrame): The requests, with the columns of `DATASET_COLUMNS`.
+    See `predict_frame` for the other parameters.
+
+    Returns:
+    list: The predictions and the details of each DataFrame, see `predict_frame`.
+    """
+    # Pré-filtre et features de chaque DataFrame, comme s'il était prédit seul
+    undecided, features = [], []
+    for data in frames:
+        if prefilter is None:
+            undecided.append(None)
+            rows = data
+        else:
+            verdicts, rules = prefilter.match_frame(data)
+            undecided.append((verdicts, rules))
+            rows = data[verdicts < 0].reset_index(drop=True)
+        if len(rows) or prefilter is None:
+            features.append(_build_features(rows, complete_pipeline, monitor))
+
+    # Preprocessor et modèle appliqués une seule fois à toutes les lignes non décidées
+    model_predictions, model_details = np.array([], dtype=int), {}
+    if features:
+        X_transformed = features[0] if len(features) == 1 else pd.concat(
+            features, ignore_index=True
+        )
+        model_predictions, model_details = _predict_features(
+            X_transformed, complete_pipeline, model, predictor, shadow, scheduler
+        )
+        model_predictions = np.asarray(model_predictions)
+        model_details = {key: np.asarray(values) for key, values in model_details.items()}
+
+    results = []
+    start = 0
+    for data, match in zip(frames, undecided):
+        if match is None:
+            stop = start + len(data)
+            predictions = model_predictions[start:stop]
+            details = {key: values[start:stop] for key, values in model_details.items()}
+        else:
+            predictions, rules = match
+            to_model = predictions < 0
+            stop = start + int(to_model.sum())
+            details = {
+                "decided_by": np.array(
+                    ["model" if rule is None else f"prefilter:{rule}" for rule in rules],
+                    dtype=object,
+                )
+            }
+            # Seules les lignes non couvertes par une règle sont passées par le modèle
+            if stop > start:
+                predictions[to_model] = model_predictions[start:stop]
+                for key, values in model_details.items():
+                    column = np.zeros(len(data), dtype=values.dtype)
+                    column[to_model] = values[start:stop]
+                    details[key] = column
+        start = stop
+        if capture is not None:
+            capture.submit(data, predictions)
+        results.append((predictions, details))
+    return results
+
+
+def predict_chunks(
+    chunks,
+    complete_pipeline,
+    model,
+    monitor=None,
+    predictor=None,
+    prefilter=None,
+    shadow=None,
+    capture=None,
+    scheduler=None,
+):
+    """
+    Predict the classification of the rows of successive DataFrames.
+
+    Only one chunk and its features are in memory at a time, which bounds the
+    working set of large batches; the results are concatenated.
+
+    Parameters:
+    chunks (Iterable[pd.DataFrame]): The requests, chunk by chunk.
+    See `predict_frame` for the other parameters.
+
+    Returns:
+    list: The URLs of the rows, see `extract_urls`.
+    np.ndarray: The predictions, one per row.
+    dict: Per-row details of the prediction, zero for the rows of the chunks
+    without this detail (e.g. chunks fully decided by the pre-filter).
+    """
+    urls, predictions, chunk_details = [], [], []
+    for chunk in chunks:
+        chunk_predictions, details = predict_frame(
+            chunk,
+            complete_pipeline,
+            model,
+            monitor,
+            predictor,
+            prefilter,
+            shadow,
+            capture,
+            scheduler,
+        )
+        urls.extend(extract_urls(chunk["URL"]))
+        predictions.append(np.asarray(chunk_predictions))
+        chunk_details.append(details)
+    if not predictions:
+        return urls, np.array([], dtype=int), {}
+
+    details = {}
+    offsets = np.cumsum([0] + [len(chunk) for chunk in predictions])
+    for index, chunk in enumerate(chunk_details):
+        for key, values in chunk.items():
+            values = np.asarray(values)
+            if key not in details:
+                details[key] = np.zeros(offsets[-1], dtype=values.dtype)
+            details[key][offsets[index]:offsets[index + 1]] = values
+    return urls, np.concatenate(predictions), details
+
+
+def extract_urls(urls):
+    """
+    Extract the URL from the "URL" column values.
+
+    Parameters:
+    urls (Iterable[str]): The values of the "URL" column, e.g. "/index.html HTTP/1.1".
+
+    Returns:
+    list: The URLs without the protocol suffix, e.g. "/index.html".
+    """
+    return [str(url).split(" ")[0] for url in urls]
@@ -0,0 +1,125 @@
+"""
+Module for the model-driven selection of the features computed at inference.
+
+A random forest only reads the columns its split nodes test. This module
+maps the split nodes of the fitted trees back to the features produced by
+`build_features`, through the fitted preprocessor (each output column of the
+`ColumnTransformer` belongs to one input feature, see `get_feature_names_out`):
+
+- a numeric feature is used if one of the trees splits on its column;
+- a categorical feature is used if one of the trees splits on one of its
+  one-hot columns.
+
+The URL and content features used by no tree need not be computed: they are
+replaced by a constant, the training mean learnt by the scaler (a scaled
+value of 0). As no split node reads their column, the constant cannot change
+any tree decision and the predictions are identical to the full computation.
+
+Example usage:
+--------------
+selection = select_features(preprocessor, [get_forest(model)])
+feature_builder.skipped_features = selection["skipped"]
+print(selection["splits"])
+
+Functions:
+----------
+- used_features(preprocessor, forests): Counts the split nodes of each input feature.
+- select_features(preprocessor, forests): Returns the features to compute and
+  the constants of the skipped ones.
+"""
+
+import numpy as np  # Comptage des nœuds de décision par colonne
+from src.features.build_features import CONTENT_FEATURE_FUNCTIONS, URL_FEATURE_FUNCTIONS
+from src.monitoring.drift import training_reference
+
+# Features dont le calcul peut être remplacé par une constante
+LAZY_FEATURES = list(
+    dict.fromkeys(list(URL_FEATURE_FUNCTIONS) + list(CONTENT_FEATURE_FUNCTIONS))
+)
+
+
+def _output_features(preprocessor):
+    """
+    Return the input feature of each output column of the fitted preprocessor.
+    """
+    n_outputs = max(indices.stop for indices in preprocessor.output_indices_.values())
+    owners = np.empty(n_outputs, dtype=object)
+    for name, transformer, columns in preprocessor.transformers_:
+        indices = preprocessor.output_indices_[name]
+        if transformer == "drop" or indices.stop == indices.start:
+            continue
+        columns = list(columns)
+        if transformer == "passthrough":
+            names = columns
+        else:
+            names = transformer.get_feature_names_out(columns)
+        # Une colonne one-hot est nommée "<feature>_<catégorie>" : feature la plus longue
+        by_length = sorted(columns, key=len, reverse=True)
+        for index, output in zip(range(indices.start, indices.stop), names):
+            owners[index] = output if output in columns else next(
+                (column for column in by_length if output.startswith(f"{column}_")), None
+            )
+    if len(owners) == 0 or any(owner is None for owner in owners):
+        raise ValueError("The output columns of the preprocessor cannot be mapped to features")
+    return owners
+
+
+def used_features(preprocessor, forests):
+    """
+    Count the split nodes of the forests on each input feature of the preprocessor.
+
+    Parameters:
+    preprocessor (sklearn.compose.ColumnTransformer): The fitted preprocessor.
+    forests (list): The fitted forests predicting from the output of the preprocessor.
+
+    Returns:
+    dict: {feature: number of split nodes}, for the features used by at least one tree.
+
+    Raises:
+    ValueError: If a forest does not take the output of the preprocessor as input.
+    """
+    owners = _output_features(preprocessor)
+    splits = np.zeros(len(owners), dtype=np.int64)
+    for forest in forests:
+        if getattr(forest, "n_features_in_", len(owners)) != len(owners):
+            raise ValueError(
+                f"The forest expects {forest.n_features_in_} columns, "
+                f"the preprocessor produces {len(owners)}"
+            )
+        for tree in forest.estimators_:
+            nodes = tree.tree_.feature
+            # Les feuilles ont un indice de feature négatif
+            splits += np.bincount(nodes[nodes >= 0], minlength=len(owners))
+    counts = {}
+    for index in np.flatnonzero(splits):
+        counts[owners[index]] = counts.get(owners[index], 0) + int(splits[index])
+    return counts
+
+
+def select_features(preprocessor, forests):
+    """
+    Select the URL and content features to compute for the forests.
+
+    Parameters:
+    preprocessor (sklearn.compose.ColumnTransformer): The fitted preprocessor.
+    forests (list): The fitted forests, e.g. the model and its shadow versions.
+
+    Returns:
+    dict: "splits" ({feature: number of split nodes}), "computed" (the URL and
+    content features used by a tree) and "skipped" ({feature: constant}, the
+    features used by no tree and the value replacing them).
+
+    Raises:
+    ValueError: If the forests cannot be mapped to the features, see `used_features`.
+    """
+    splits = used_features(preprocessor, forests)
+    reference = training_reference(preprocessor)
+    return {
+        "splits": dict(sorted(splits.items(), key=lambda item: -item[1])),
+        "computed": [feature for feature in LAZY_FEATURES if feature in splits],
+        "skipped": {
+            feature: reference.get(feature, (0.0, 1.0))[0]
+            for feature in LAZY_FEATURES
+            if feature not in splits
+        },
+    }
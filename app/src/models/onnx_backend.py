@@ -0,0 +1,136 @@
+"""
+Module for the onnxruntime inference backend.
+
+`OnnxBackend` runs the graph written by `src.models.export_onnx` on CPU with
+onnxruntime: it takes the output of the feature builder and replaces the
+`ColumnTransformer` and the forest of the scikit-learn path. It is used as
+the `predictor` of `predict_frame`; as it includes the preprocessing, it has
+`preprocessed = False` and is called on the features instead of the
+preprocessed matrix.
+
+The number of threads of onnxruntime is configurable: one intra-op thread
+per worker (the default) avoids oversubscribing the cores when the API runs
+several workers.
+
+Example usage:
+--------------
+backend = OnnxBackend("model.onnx", intra_op_threads=1)
+predictions, details = backend(X_transformed)
+print(check_parity(backend, complete_pipeline, model, df))
+
+Classes:
+--------
+- OnnxBackend: Predicts from the features with onnxruntime.
+
+Functions:
+----------
+- check_parity(backend, complete_pipeline, model, data): Compares the predictions
+  of the backend with the scikit-learn path.
+"""
+
+import contextlib  # Redirection des affichages du feature builder
+import io  # Tampon pour les affichages ignorés
+import json  # Colonnes enregistrées dans les métadonnées du graphe
+
+import numpy as np  # Conversion des features en tenseurs
+from src.models.export_onnx import forest_signature
+
+try:
+    import onnxruntime  # Exécution du graphe ONNX sur CPU
+except ImportError:  # pragma: no cover
+    onnxruntime = None
+
+
+class OnnxBackend:
+    """
+    Predict the classification from the features with onnxruntime.
+
+    Parameters:
+    path (str): The ONNX graph written by `export_onnx`.
+    intra_op_threads (int): The number of threads of each operator.
+    inter_op_threads (int): The number of operators run in parallel.
+    """
+
+    # Appelé sur la sortie du feature builder : le graphe contient le preprocessor
+    preprocessed = False
+
+    def __init__(self, path, intra_op_threads=1, inter_op_threads=1):
+        if onnxruntime is None:
+            raise ImportError("The ONNX backend requires onnxruntime")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.numeric_features = json.loads(metadata["numeric_features"])
+        self.categorical_features = json.loads(metadata["categorical_features"])
+        self.forest_signature = metadata.get("forest_signature")
+        # Entrées du graphe dans l'ordre des colonnes du preprocessor
+        inputs = [node.name for node in self.session.get_inputs()]
+        self._numeric_inputs = list(zip(inputs, self.numeric_features))
+        self._categorical_inputs = list(
+            zip(inputs[len(self.numeric_features):], self.categorical_features)
+        )
+
+    def matches(self, forest):
+        """
+        Return True if the graph was exported from this forest.
+
+        Parameters:
+        forest (sklearn.ensemble.RandomForestClassifier): The forest loaded by the API.
+        """
+        return forest is not None and forest_signature(forest) == self.forest_signature
+
+    def __call__(self, features):
+        """
+        Predict the classification of each row.
+
+        Parameters:
+        features (pd.DataFrame): The output of the feature builder.
+
+        Returns:
+        np.ndarray: The predictions, one per row.
+        dict: Per-row details of the prediction (none for this backend).
+        """
+        feed = {}
+        for name, column in self._numeric_inputs:
+            feed[name] = features[column].to_numpy(dtype=np.float32).reshape(-1, 1)
+        for name, column in self._categorical_inputs:
+            feed[name] = features[column].astype(str).to_numpy(dtype=object).reshape(-1, 1)
+        labels, _ = self.session.run(None, feed)
+        return labels, {}
+
+
+def check_parity(backend, complete_pipeline, model, data):
+    """
+    Compare the predictions of the backend with the scikit-learn path.
+
+    Parameters:
+    backend (OnnxBackend): The backend.
+    complete_pipeline (sklearn.pipeline.Pipeline): The fitted preprocessing pipeline.
+    model (mlflow.pyfunc.PyFuncModel): The classification model.
+    data (pd.DataFrame): The requests, with the columns of `DATASET_COLUMNS`.
+
+    Returns:
+    dict: The number of rows, the number of different predictions and the agreement rate.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        features = complete_pipeline.named_steps["feature_builder"].transform(
+            data.assign(classification=0)
+        )
+    if isinstance(features, tuple):  # Pipeline sauvegardé avec la cible
+        features = features[0]
+    expected = np.asarray(
+        model.predict(complete_pipeline.named_steps["preprocessor"].transform(features))
+    )
+    predictions, _ = backend(features)
+    different = int((np.asarray(predictions) != expected).sum())
+    return {
+        "rows": len(data),
+        "different": different,
+        "agreement_rate": 1.0 - different / len(data) if len(data) else 1.0,
+    }
@@ -0,0 +1,154 @@
+"""
+Module for scoring requests with shadow model versions.
+
+A shadow model is another version of the model, loaded next to the primary
+one to be validated on live traffic. The features and the preprocessed
+matrix are computed once per request: the primary model answers the request,
+then the matrix and the primary predictions are handed to a `ShadowScorer`,
+which scores them with each shadow version in a background thread and keeps
+agreement statistics. Only the primary predictions are returned.
+
+The background work is bounded: when `max_pending` batches are already
+waiting, new batches are dropped (and counted) rather than slowing down the
+serving path. A failure of a shadow version (prediction or comparison) is
+counted by version in `shadow_errors_total` and in the statistics, and never
+reaches the serving path.
+
+Example usage:
+--------------
+shadow = ShadowScorer({"7": model_v7})
+shadow.submit(X, predictions)
+print(shadow.snapshot())
+
+Classes:
+--------
+- ShadowScorer: Scores the preprocessed matrices with the shadow models in the background.
+"""
+
+import threading  # Statistiques partagées avec le thread d'arrière-plan
+from concurrent.futures import ThreadPoolExecutor  # Scoring en arrière-plan
+
+import numpy as np  # Comparaison des prédictions
+from src.serving.metrics import counter
+
+SHADOW_ROWS = counter("shadow_rows_total", "Rows scored by a shadow model, by version.")
+SHADOW_AGREEMENTS = counter(
+    "shadow_agreements_total", "Rows where a shadow model agrees with the primary model, by version."
+)
+SHADOW_DROPPED = counter(
+    "shadow_dropped_total", "Batches not scored by the shadow models because the queue was full."
+)
+SHADOW_ERRORS = counter("shadow_errors_total", "Shadow scoring failures, by version.")
+
+
+class ShadowScorer:
+    """
+    Score the preprocessed matrices with shadow model versions, in the background.
+
+    Parameters:
+    models (dict): The shadow models, by version ({version: model}). They must
+    accept the output of the preprocessor of the primary pipeline.
+    max_pending (int): The maximum number of batches waiting to be scored.
+    workers (int): The number of background threads.
+    """
+
+    def __init__(self, models, max_pending=64, workers=1):
+        self.models = dict(models)
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shadow")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {
+            version: {"rows": 0, "agreements": 0, "errors": 0, "confusion": {}}
+            for version in self.models
+        }
+
+    def submit(self, X, predictions):
+        """
+        Queue a batch for the shadow models, without waiting for the result.
+
+        Parameters:
+        X (array-like): The preprocessed matrix given to the primary model.
+        predictions (np.ndarray): The predictions of the primary model.
+
+        Returns:
+        bool: False if the batch was dropped because the queue was full.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                SHADOW_DROPPED.inc()
+                return False
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._score, X, np.array(predictions, copy=True))
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        # Filet de sécurité : une exception sortie de _score n'est pas perdue
+        future.add_done_callback(self._log_failure)
+        return True
+
+    def _score(self, X, predictions):
+        try:
+            for version, model in self.models.items():
+                try:
+                    shadow_predictions = np.asarray(model.predict(X))
+                    self._record(version, predictions, shadow_predictions)
+                except Exception as e:  # pylint: disable=broad-except
+                    self._count_error(version)
+                    print(f"Shadow {version} : échec du scoring : {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _count_error(self, version):
+        SHADOW_ERRORS.inc(version=version)
+        with self._lock:
+            self._stats[version]["errors"] += 1
+
+    @staticmethod
+    def _log_failure(future):
+        if not future.cancelled() and future.exception() is not None:
+            SHADOW_ERRORS.inc(version="unknown")
+            print(f"Shadow : échec du scoring : {future.exception()}")
+
+    def _record(self, version, predictions, shadow_predictions):
+        agreements = int((predictions == shadow_predictions).sum())
+        SHADOW_ROWS.inc(len(predictions), version=version)
+        SHADOW_AGREEMENTS.inc(agreements, version=version)
+        pairs, counts = np.unique(
+            np.stack([predictions, shadow_predictions]), axis=1, return_counts=True
+        )
+        with self._lock:
+            stats = self._stats[version]
+            stats["rows"] += len(predictions)
+            stats["agreements"] += agreements
+            for (primary, shadow), count in zip(pairs.T.tolist(), counts.tolist()):
+                key = f"{primary}->{shadow}"
+                stats["confusion"][key] = stats["confusion"].get(key, 0) + count
+        print(
+            f"Shadow {version} : {agreements}/{len(predictions)} prédictions identiques au modèle principal"
+        )
+
+    def snapshot(self):
+        """
+        Return the agreement statistics of each shadow version.
+
+        Returns:
+        dict: For each version, the number of rows scored, the number and rate of
+        agreements with the primary model, the number of failed batches and the
+        counts of (primary -> shadow) prediction pairs.
+        """
+        with self._lock:
+            versions = {}
+            for version, stats in self._stats.items():
+                rows = stats["rows"]
+                versions[version] = {
+                    "rows": rows,
+                    "agreements": stats["agreements"],
+                    "agreement_rate": stats["agreements"] / rows if rows else None,
+                    "errors": stats["errors"],
+                    "confusion": dict(stats["confusion"]),
+                }
+            return {"pending_batches": self._pending, "versions": versions}
@@ -0,0 +1,219 @@
+"""
+Module for capturing the scored traffic to JSONL files.
+
+The captured records can be replayed against a new model or relabelled and
+used for retraining: each line is a JSON object with the columns of the
+dataset (`DATASET_COLUMNS`, readable by `build_features`), the prediction,
+the model version and the capture time.
+
+Capturing never blocks the request path:
+
+- `submit` only samples the rows and puts a reference to them on a bounded
+  in-memory queue (bounded in rows); when the queue is full, the batch is
+  dropped and counted;
+- a background thread serializes the batches and appends them to gzip
+  compressed JSONL files, rotated when they exceed `max_bytes` compressed
+  bytes or are older than `max_seconds`. A file being written has the
+  ".part" suffix, renamed to ".jsonl.gz" when it is closed.
+
+Sampled, written and dropped rows are counted in `/metrics`.
+
+Example usage:
+--------------
+capture = TrafficCapture("capture", model_version="random_forest_detection:6", sample_rate=0.1)
+capture.submit(df, predictions)
+capture.close()
+data = pd.read_json("capture/capture-20240101-120000-1-0001.jsonl.gz", lines=True)
+
+Classes:
+--------
+- TrafficCapture: Samples the scored rows and writes them in the background.
+"""
+
+import gzip  # Compression des fichiers de capture
+import json  # Repli si orjson n'est pas installé
+import os  # Gestion des fichiers de capture
+import queue  # File bornée entre les requêtes et l'écriture
+import threading  # Écriture en arrière-plan
+import time  # Horodatage et rotation des fichiers
+
+import numpy as np  # Échantillonnage des lignes
+from src.models.inference import DATASET_COLUMNS
+from src.serving.metrics import counter, gauge
+
+try:
+    import orjson  # Sérialisation rapide des lignes
+except ImportError:  # pragma: no cover
+    orjson = None
+
+CAPTURE_ROWS = counter(
+    "capture_rows_total", "Scored rows seen by the capture, by result (written, sampled_out, dropped)."
+)
+CAPTURE_FILES = counter("capture_files_total", "Capture files closed after rotation.")
+CAPTURE_ERRORS = counter("capture_errors_total", "Batches lost because of a write error.")
+CAPTURE_QUEUED = gauge("capture_queued_rows", "Rows waiting to be written by the capture.")
+
+
+def _dumps(record):
+    if orjson is not None:
+        return orjson.dumps(record)
+    return json.dumps(record, ensure_ascii=False).encode("utf-8")
+
+
+def _value(value):
+    # Valeurs manquantes du DataFrame écrites en null
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return value if isinstance(value, (str, int, float, bool)) else str(value)
+
+
+class TrafficCapture:
+    """
+    Sample the scored rows and write them to rotated JSONL files in the background.
+
+    Parameters:
+    directory (str): The directory of the capture files.
+    model_version (str): The model version recorded with each row.
+    sample_rate (float): The share of the rows captured, between 0 and 1.
+    max_queued_rows (int): The maximum number of rows waiting to be written.
+    max_bytes (int): The compressed size after which a file is rotated.
+    max_seconds (float): The age after which a file is rotated.
+    batch_rows (int): The number of rows written between two checks of the rotation.
+    """
+
+    def __init__(
+        self,
+        directory,
+        model_version="",
+        sample_rate=1.0,
+        max_queued_rows=100000,
+        max_bytes=64 * 1024 * 1024,
+        max_seconds=3600.0,
+        batch_rows=1000,
+    ):
+        self.directory = directory
+        self.model_version = model_version
+        self.sample_rate = sample_rate
+        self.max_queued_rows = max_queued_rows
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.batch_rows = batch_rows
+        os.makedirs(directory, exist_ok=True)
+        self._queue = queue.SimpleQueue()
+        self._queued_rows = 0
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng()
+        self._file = None
+        self._raw = None
+        self._path = None
+        self._opened = 0.0
+        self._files = 0
+        self._thread = threading.Thread(target=self._write_loop, name="traffic-capture", daemon=True)
+        self._thread.start()
+
+    def submit(self, data, predictions):
+        """
+        Queue a sample of scored rows for writing, without blocking.
+
+        Parameters:
+        data (pd.DataFrame): The requests, with the columns of `DATASET_COLUMNS`.
+        predictions (np.ndarray): The predictions, one per row.
+        """
+        rows = len(data)
+        if rows == 0:
+            return
+        predictions = np.asarray(predictions)
+        if self.sample_rate < 1.0:
+            selected = np.flatnonzero(self._rng.random(rows) < self.sample_rate)
+            CAPTURE_ROWS.inc(rows - len(selected), result="sampled_out")
+            if len(selected) == 0:
+                return
+            data = data.iloc[selected]
+            predictions = predictions[selected]
+            rows = len(selected)
+
+        with self._lock:
+            if self._queued_rows + rows > self.max_queued_rows:
+                CAPTURE_ROWS.inc(rows, result="dropped")
+                return
+            self._queued_rows += rows
+            CAPTURE_QUEUED.set(self._queued_rows)
+        # Les colonnes sont sérialisées par le thread d'écriture, hors du chemin de la requête
+        self._queue.put(([data[column] for column in DATASET_COLUMNS], predictions, time.time()))
+
+    def _open(self):
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        self._files += 1
+        name = f"capture-{timestamp}-{os.getpid()}-{self._files:04d}.part"
+        self._path = os.path.join(self.directory, name)
+        self._raw = open(self._path, "wb")
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="wb")
+        self._opened = time.monotonic()
+
+    def _rotate(self):
+        """
+        Close the current file and give it its final name.
+        """
+        if self._file is None:
+            return
+        self._file.close()
+        self._raw.close()
+        os.replace(self._path, self._path[: -len(".part")] + ".jsonl.gz")
+        self._file = self._raw = self._path = None
+        CAPTURE_FILES.inc()
+
+    def _write(self, item):
+        columns, predictions, captured_at = item
+        if self._file is None:
+            self._open()
+        lines = []
+        for values, prediction in zip(zip(*columns), predictions.tolist()):
+            record = {name: _value(value) for name, value in zip(DATASET_COLUMNS, values)}
+            record["prediction"] = prediction
+            record["model_version"] = self.model_version
+            record["captured_at"] = captured_at
+            lines.append(_dumps(record))
+        lines.append(b"")
+        self._file.write(b"\n".join(lines))
+        CAPTURE_ROWS.inc(len(predictions), result="written")
+
+    def _write_loop(self):
+        written = 0
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                item = None
+            stop = item is self._queue
+            if item is not None and not stop:
+                rows = len(item[1])
+                try:
+                    self._write(item)
+                except Exception as e:
+                    CAPTURE_ERRORS.inc()
+                    print(f"Capture : écriture impossible ({e})")
+                with self._lock:
+                    self._queued_rows -= rows
+                    CAPTURE_QUEUED.set(self._queued_rows)
+                written += rows
+
+            # Rotation vérifiée par lots de lignes et à chaque attente sans requête
+            if self._file is not None and (item is None or stop or written >= self.batch_rows):
+                written = 0
+                too_old = time.monotonic() - self._opened >= self.max_seconds
+                if stop or too_old or self._raw.tell() >= self.max_bytes:
+                    try:
+                        self._rotate()
+                    except OSError as e:
+                        CAPTURE_ERRORS.inc()
+                        print(f"Capture : rotation impossible ({e})")
+            if stop:
+                return
+
+    def close(self):
+        """
+        Write the queued rows, close the current file and stop the writer thread.
+        """
+        # La file elle-même sert de marqueur de fin
+        self._queue.put(self._queue)
+        self._thread.join()
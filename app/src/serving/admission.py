@@ -0,0 +1,275 @@
+"""
+Module for the admission control of the prediction endpoints.
+
+Each endpoint gets an `AdmissionController` that bounds the work accepted
+by the API:
+
+- at most `concurrency` requests are processed at the same time;
+- at most `max_rows` rows are processed at the same time (row budget of the
+  batch endpoints); a request larger than the whole budget is never admitted;
+- the other requests wait in a FIFO queue of `queue_size` places (0: no
+  limit), for at most `queue_timeout` seconds.
+
+Requests that cannot be admitted are rejected immediately with an HTTP error
+and a Retry-After header estimated from the recent service time:
+
+- 413 when the request is larger than the row budget;
+- 429 when the queue is full;
+- 503 when the wait in the queue exceeds `queue_timeout`.
+
+Limits are read from the environment by `from_env`, a value of 0 disables a
+limit: ADMISSION_<ENDPOINT>_CONCURRENCY, ADMISSION_<ENDPOINT>_QUEUE,
+ADMISSION_<ENDPOINT>_MAX_ROWS and ADMISSION_QUEUE_TIMEOUT (e.g.
+ADMISSION_PREDICT_CSV_MAX_ROWS=100000).
+
+Example usage:
+--------------
+admission = from_env("predict_csv", concurrency=1, queue_size=4, max_rows=200000)
+rows = await run_in_threadpool(count_rows, file.file)
+async with admission.admit(rows):
+    ...
+
+Classes:
+--------
+- AdmissionController: Concurrency limit, row budget and bounded queue of an endpoint.
+
+Functions:
+----------
+- from_env(endpoint, concurrency, queue_size, max_rows): Creates a controller configured
+  from the environment.
+- count_rows(file): Counts the data rows of an uploaded CSV file without parsing it.
+- count_raw_requests(body): Estimates the number of raw HTTP requests of a body without parsing it.
+- count_records(body): Estimates the number of JSON requests of a body without decoding it.
+"""
+
+import asyncio  # File d'attente des requêtes en attente d'admission
+import math  # Arrondi de l'en-tête Retry-After
+import os  # Lecture de la configuration
+import time  # Mesure du temps de service
+from collections import deque  # File d'attente FIFO
+from contextlib import asynccontextmanager  # Admission sous forme de gestionnaire de contexte
+
+from fastapi import HTTPException  # Rejet des requêtes non admises
+from src.serving.metrics import counter, gauge
+
+ADMISSION_REJECTED = counter(
+    "admission_rejected_total", "Requests rejected by the admission control, by endpoint and reason."
+)
+ADMISSION_IN_FLIGHT = gauge(
+    "admission_in_flight", "Requests being processed, by endpoint."
+)
+ADMISSION_QUEUED = gauge(
+    "admission_queued", "Requests waiting for admission, by endpoint."
+)
+ADMISSION_ROWS_IN_FLIGHT = gauge(
+    "admission_rows_in_flight", "Rows being processed, by endpoint."
+)
+
+# Poids de la dernière mesure dans la moyenne glissante du temps de service
+_SERVICE_TIME_WEIGHT = 0.2
+_CHUNK_SIZE = 1 << 20
+
+
+class AdmissionController:
+    """
+    Concurrency limit, row budget and bounded wait queue of an endpoint.
+
+    Parameters:
+    endpoint (str): The endpoint name, used as label of the metrics.
+    concurrency (int): The maximum number of requests processed at the same time (0: no limit).
+    queue_size (int): The maximum number of requests waiting for admission (0: no limit).
+    queue_timeout (float): The maximum wait in the queue, in seconds.
+    max_rows (int): The maximum number of rows processed at the same time (0: no limit).
+    """
+
+    def __init__(self, endpoint, concurrency, queue_size, queue_timeout, max_rows=0):
+        self.endpoint = endpoint
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.max_rows = max_rows
+        self.in_flight = 0
+        self.rows_in_flight = 0
+        self.service_time = 0.0
+        self._waiters = deque()
+
+    def _fits(self, rows):
+        if self.concurrency and self.in_flight >= self.concurrency:
+            return False
+        return not self.max_rows or self.rows_in_flight + rows <= self.max_rows
+
+    def _enter(self, rows):
+        self.in_flight += 1
+        self.rows_in_flight += rows
+        ADMISSION_IN_FLIGHT.set(self.in_flight, endpoint=self.endpoint)
+        ADMISSION_ROWS_IN_FLIGHT.set(self.rows_in_flight, endpoint=self.endpoint)
+
+    def _leave(self, rows):
+        self.in_flight -= 1
+        self.rows_in_flight -= rows
+        ADMISSION_IN_FLIGHT.set(self.in_flight, endpoint=self.endpoint)
+        ADMISSION_ROWS_IN_FLIGHT.set(self.rows_in_flight, endpoint=self.endpoint)
+        self._wake()
+
+    def _wake(self):
+        # Admission dans l'ordre d'arrivée : la tête de file bloque les suivantes
+        while self._waiters:
+            rows, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if not self._fits(rows):
+                break
+            self._waiters.popleft()
+            self._enter(rows)
+            future.set_result(None)
+        ADMISSION_QUEUED.set(len(self._waiters), endpoint=self.endpoint)
+
+    def retry_after(self):
+        """
+        Return the estimated wait before a new request can be admitted, in seconds.
+        """
+        slots = self.concurrency or 1
+        return max(1, math.ceil(self.service_time * (len(self._waiters) + 1) / slots))
+
+    def _reject(self, status_code, reason, detail):
+        ADMISSION_REJECTED.inc(endpoint=self.endpoint, reason=reason)
+        headers = None if status_code == 413 else {"Retry-After": str(self.retry_after())}
+        return HTTPException(status_code=status_code, detail=detail, headers=headers)
+
+    @asynccontextmanager
+    async def admit(self, rows=1):
+        """
+        Wait for the admission of a request, and release it at the end of the block.
+
+        Parameters:
+        rows (int): The number of rows of the request.
+
+        Raises:
+        HTTPException: 413 if the request exceeds the row budget, 429 if the queue
+        is full, 503 if the wait in the queue exceeds `queue_timeout`.
+        """
+        if self.max_rows and rows > self.max_rows:
+            raise self._reject(
+                413,
+                "too_large",
+                f"La requête contient {rows} lignes, au-delà de la limite de {self.max_rows}",
+            )
+        if not self._waiters and self._fits(rows):
+            self._enter(rows)
+        else:
+            if self.queue_size and len(self._waiters) >= self.queue_size:
+                raise self._reject(429, "queue_full", "Trop de requêtes en attente, réessayez plus tard")
+            waiter = (rows, asyncio.get_running_loop().create_future())
+            self._waiters.append(waiter)
+            ADMISSION_QUEUED.set(len(self._waiters), endpoint=self.endpoint)
+            try:
+                await asyncio.wait_for(waiter[1], self.queue_timeout)
+            except BaseException as error:
+                # Admise juste avant l'expiration ou l'annulation : libérer la place
+                if waiter[1].done() and not waiter[1].cancelled():
+                    self._leave(rows)
+                else:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    self._wake()
+                if isinstance(error, asyncio.TimeoutError):
+                    raise self._reject(
+                        503, "timeout", "Service surchargé, réessayez plus tard"
+                    ) from error
+                raise
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self.service_time += _SERVICE_TIME_WEIGHT * (elapsed - self.service_time)
+            self._leave(rows)
+
+
+def _int_env(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+def from_env(endpoint, concurrency, queue_size, max_rows=0):
+    """
+    Create the admission controller of an endpoint, configured from the environment.
+
+    Parameters:
+    endpoint (str): The endpoint name, e.g. "predict_csv".
+    concurrency (int): The default concurrency limit.
+    queue_size (int): The default queue size.
+    max_rows (int): The default row budget.
+
+    Returns:
+    AdmissionController: The controller.
+    """
+    prefix = f"ADMISSION_{endpoint.upper()}"
+    return AdmissionController(
+        endpoint,
+        concurrency=_int_env(f"{prefix}_CONCURRENCY", concurrency),
+        queue_size=_int_env(f"{prefix}_QUEUE", queue_size),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2")),
+        max_rows=_int_env(f"{prefix}_MAX_ROWS", max_rows),
+    )
+
+
+def count_rows(file):
+    """
+    Count the data rows of an uploaded CSV file without parsing it.
+
+    Parameters:
+    file (file-like): The uploaded file, opened in binary mode and seekable.
+
+    Returns:
+    int: The number of lines after the header. Quoted line breaks are counted
+    as rows, so the count is an upper bound.
+
+    The file is read to the end: in the API, call it in the thread pool.
+    """
+    lines = 0
+    last = b"\n"
+    file.seek(0)
+    for chunk in iter(lambda: file.read(_CHUNK_SIZE), b""):
+        lines += chunk.count(b"\n")
+        last = chunk[-1:]
+    file.seek(0)
+    # Dernière ligne sans saut de ligne final
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def count_raw_requests(body):
+    """
+    Estimate the number of raw HTTP requests of a body without parsing it.
+
+    Parameters:
+    body (bytes): The concatenated raw HTTP requests.
+
+    Returns:
+    int: The number of " HTTP/1." occurrences, i.e. of request lines with a
+    version (at least 1). Occurrences in the request bodies are counted too,
+    so the count is an upper bound for the requests of the CSIC format.
+
+    The body is scanned to the end: in the API, call it in the thread pool.
+    """
+    return max(body.count(b" HTTP/1."), 1)
+
+
+def count_records(body):
+    """
+    Estimate the number of JSON requests of a body without decoding it.
+
+    Parameters:
+    body (bytes): A JSON object with the fields of `PredictionRequest`, or an
+    array of such objects.
+
+    Returns:
+    int: The number of "URL" keys (at least 1). A quote inside a JSON string is
+    escaped, so only the keys are counted: the count is exact for a valid body.
+
+    The body is scanned to the end: in the API, call it in the thread pool.
+    """
+    return max(body.count(b'"URL"'), 1)
@@ -0,0 +1,91 @@
+"""
+Module for coalescing identical concurrent predictions.
+
+During bursts, identical requests can reach `/predict` within the same few
+milliseconds. With single-flight coalescing, the first request of a given
+fingerprint (the leader) runs the computation in the thread pool, and the
+identical requests arriving while it runs wait for the same result instead
+of computing it again.
+
+The shared computation is not tied to the leader: if the leader's client
+disconnects, the other callers still receive the result. When an admission
+controller is given, only the shared computation is admitted: the callers
+waiting for it do not take a place of the controller.
+
+Example usage:
+--------------
+single_flight = SingleFlight()
+result = await single_flight.run(
+    request_fingerprint(row), predict_frame, data, ..., admission=admission["predict"]
+)
+
+Classes:
+--------
+- SingleFlight: Runs one computation per key at a time and shares its result.
+"""
+
+import asyncio  # Attente partagée du résultat
+import functools  # Nettoyage à la fin du calcul
+
+from fastapi.concurrency import run_in_threadpool  # Calculs bloquants hors de la boucle
+from src.serving.metrics import counter, gauge
+
+COALESCING_LEADERS = counter(
+    "coalescing_leaders_total", "Predictions computed by a leader request."
+)
+COALESCING_COALESCED = counter(
+    "coalescing_coalesced_total", "Requests served by the computation of an identical request."
+)
+COALESCING_IN_FLIGHT = gauge(
+    "coalescing_in_flight", "Distinct computations currently in flight."
+)
+
+
+class SingleFlight:
+    """
+    Run one computation per key at a time and share its result with the concurrent callers.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+
+    def _done(self, key, _future):
+        self._in_flight.pop(key, None)
+        COALESCING_IN_FLIGHT.set(len(self._in_flight))
+
+    @staticmethod
+    async def _compute(function, args, admission):
+        if admission is None:
+            return await run_in_threadpool(function, *args)
+        async with admission.admit():
+            return await run_in_threadpool(function, *args)
+
+    async def run(self, key, function, *args, admission=None):
+        """
+        Return the result of `function(*args)`, computed once for concurrent identical keys.
+
+        Parameters:
+        key (hashable): The fingerprint of the computation.
+        function (callable): The blocking computation, run in the thread pool of the API.
+        *args: The arguments of the computation.
+        admission (AdmissionController): If given, the controller admitting the
+        computation; the callers sharing it are not admitted separately.
+
+        Returns:
+        any: The result of the computation (shared between the callers, it must
+        not be modified).
+
+        Raises:
+        HTTPException: If the computation is not admitted, for all its callers.
+        """
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._compute(function, args, admission))
+            self._in_flight[key] = future
+            future.add_done_callback(functools.partial(self._done, key))
+            COALESCING_LEADERS.inc()
+            COALESCING_IN_FLIGHT.set(len(self._in_flight))
+        else:
+            COALESCING_COALESCED.inc()
+        # 'shield' : l'annulation d'un appelant n'annule pas le calcul partagé
+        return await asyncio.shield(future)
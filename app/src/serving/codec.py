@@ -0,0 +1,225 @@
+"""
+Module for fast request decoding and response encoding.
+
+This module provides the serialization path of the prediction endpoints
+that bypasses pydantic and the default FastAPI JSON encoder:
+
+- requests are decoded straight from the body bytes into compact
+  `msgspec` structs, then into a DataFrame with the dataset columns;
+- responses are encoded with `orjson`, which writes the NumPy prediction
+  arrays directly.
+
+Both libraries are optional: without them, the standard `json` module is
+used with the same validation rules and output.
+
+Functions:
+----------
+- decode_records(body): Decodes one or several prediction requests from JSON bytes.
+- decode_stream_records(body, first_id): Decodes the requests of a streaming message
+  and their correlation IDs.
+- encode_predictions(urls, predictions, columnar, details): Encodes the predictions as JSON bytes.
+"""
+
+import json  # Repli si msgspec/orjson ne sont pas installés
+from typing import List, Optional, Union  # Typage des structures décodées
+
+import numpy as np  # Tableaux de prédictions
+import pandas as pd  # Manipulation des données
+from src.models.inference import DATASET_COLUMNS, REQUEST_FIELDS
+
+try:
+    import msgspec  # Décodage JSON rapide vers des structures typées
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+try:
+    import orjson  # Encodage JSON rapide, y compris des tableaux NumPy
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# Champs pouvant être nuls dans 'PredictionRequest'
+OPTIONAL_FIELDS = {"content_type", "lenght", "content"}
+
+if msgspec is not None:
+
+    class PredictionRecord(msgspec.Struct, frozen=True, gc=False):
+        """
+        Compact counterpart of `PredictionRequest`, decoded directly from bytes.
+        """
+
+        Method: str
+        User_Agent: str
+        Pragma: str
+        Cache_Control: str
+        Accept: str
+        Accept_encoding: str
+        Accept_charset: str
+        language: str
+        host: str
+        cookie: str
+        content_type: Optional[str]
+        connection: str
+        lenght: Optional[str]
+        content: Optional[str]
+        URL: str
+
+    _DECODER = msgspec.json.Decoder(Union[PredictionRecord, List[PredictionRecord]])
+
+    class StreamRecord(PredictionRecord, frozen=True, gc=False):
+        """
+        `PredictionRecord` with the correlation ID of the streaming endpoint.
+        """
+
+        id: Union[str, int, None] = None
+
+    _STREAM_DECODER = msgspec.json.Decoder(Union[StreamRecord, List[StreamRecord]])
+
+
+def _validate_record(record):
+    """
+    Validate a decoded JSON object against the fields of `PredictionRequest`.
+
+    Parameters:
+    record (dict): The decoded JSON object.
+
+    Returns:
+    tuple: The values of the record, in the order of `REQUEST_FIELDS`.
+
+    Raises:
+    ValueError: If a field is missing or has an invalid type.
+    """
+    if not isinstance(record, dict):
+        raise ValueError(f"Expected an object, got {type(record).__name__}")
+    values = []
+    for field in REQUEST_FIELDS:
+        if field not in record:
+            raise ValueError(f"Object missing required field `{field}`")
+        value = record[field]
+        if not isinstance(value, str) and not (value is None and field in OPTIONAL_FIELDS):
+            raise ValueError(f"Expected `str` for field `{field}`")
+        values.append(value)
+    return tuple(values)
+
+
+def decode_records(body):
+    """
+    Decode one or several prediction requests from JSON bytes.
+
+    Parameters:
+    body (bytes): A JSON object with the fields of `PredictionRequest`, or an
+    array of such objects.
+
+    Returns:
+    pd.DataFrame: The requests, with the columns of `DATASET_COLUMNS`.
+
+    Raises:
+    ValueError: If the body is not valid JSON or a request is invalid.
+    """
+    if msgspec is not None:
+        try:
+            decoded = _DECODER.decode(body)
+        except msgspec.DecodeError as error:
+            raise ValueError(str(error)) from error
+        if isinstance(decoded, PredictionRecord):
+            decoded = [decoded]
+        rows = [msgspec.structs.astuple(record) for record in decoded]
+    else:
+        decoded = json.loads(body)
+        if isinstance(decoded, dict):
+            decoded = [decoded]
+        if not isinstance(decoded, list):
+            raise ValueError("Expected an object or an array of objects")
+        rows = [_validate_record(record) for record in decoded]
+    return pd.DataFrame.from_records(rows, columns=DATASET_COLUMNS)
+
+
+def decode_stream_records(body, first_id=0):
+    """
+    Decode the requests of a message of the streaming endpoint and their correlation IDs.
+
+    Parameters:
+    body (bytes): A JSON object with the fields of `PredictionRequest` and an
+    optional "id" (string or integer), or an array of such objects.
+    first_id (int): The ID given to the first request of the message if it has
+    none; the following requests without ID get the following integers.
+
+    Returns:
+    list: The correlation ID of each request.
+    pd.DataFrame: The requests, with the columns of `DATASET_COLUMNS`.
+
+    Raises:
+    ValueError: If the body is not valid JSON or a request is invalid.
+    """
+    if msgspec is not None:
+        try:
+            decoded = _STREAM_DECODER.decode(body)
+        except msgspec.DecodeError as error:
+            raise ValueError(str(error)) from error
+        if isinstance(decoded, StreamRecord):
+            decoded = [decoded]
+        rows = [msgspec.structs.astuple(record)[:-1] for record in decoded]
+        ids = [record.id for record in decoded]
+    else:
+        decoded = json.loads(body)
+        if isinstance(decoded, dict):
+            decoded = [decoded]
+        if not isinstance(decoded, list):
+            raise ValueError("Expected an object or an array of objects")
+        rows = [_validate_record(record) for record in decoded]
+        ids = [record.get("id") for record in decoded]
+        for value in ids:
+            if value is not None and (
+                not isinstance(value, (str, int)) or isinstance(value, bool)
+            ):
+                raise ValueError("Expected `str | int | null` for field `id`")
+    # Requêtes sans identifiant : numérotées dans l'ordre de la connexion
+    ids = [first_id + index if value is None else value for index, value in enumerate(ids)]
+    return ids, pd.DataFrame.from_records(rows, columns=DATASET_COLUMNS)
+
+
+def encode_predictions(urls, predictions, columnar=False, details=None):
+    """
+    Encode the predictions as JSON bytes.
+
+    Parameters:
+    urls (list of str): The URL of each request.
+    predictions (array-like): The prediction of each request.
+    columnar (bool): If True, the response is {"urls": [...], "predictions": [...]}
+    and the prediction array is written directly from NumPy. Otherwise the
+    response has the shape of `/predict_csv`: {"predictions": [{"url", "prediction"}]}.
+    details (dict): Optional per-row details ({name: array}), added as extra
+    fields of each row, or as extra arrays in the columnar layout.
+
+    Returns:
+    bytes: The encoded response.
+    """
+    predictions = np.ascontiguousarray(predictions, dtype=np.int64)
+    details = details or {}
+    if columnar:
+        payload = {"urls": urls, "predictions": predictions}
+        # orjson écrit directement les tableaux numériques, pas les tableaux d'objets
+        payload.update(
+            {
+                key: value.tolist() if np.asarray(value).dtype == object else value
+                for key, value in details.items()
+            }
+        )
+        if orjson is not None:
+            return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+        payload = {
+            key: value.tolist() if isinstance(value, np.ndarray) else value
+            for key, value in payload.items()
+        }
+    else:
+        columns = {key: np.asarray(value).tolist() for key, value in details.items()}
+        rows = [
+            {"url": url, "prediction": prediction}
+            for url, prediction in zip(urls, predictions.tolist())
+        ]
+        for key, values in columns.items():
+            for row, value in zip(rows, values):
+                row[key] = value
+        payload = {"predictions": rows}
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,58 @@
+"""
+Module for fingerprinting prediction requests.
+
+Two requests with the same fingerprint get the same prediction: the
+fingerprint covers the fields read by the pre-filter and by `build_features`
+(method, host, cookie, Accept, Content-Length, body and URL). The fields are
+hashed verbatim, as `predict_frame` receives them: a normalization here would
+have to match each consumer (the pre-filter compares the host exactly, for
+example), otherwise two requests decided differently could share a result.
+
+Example usage:
+--------------
+key = request_fingerprint(df.iloc[0])
+
+Functions:
+----------
+- request_fingerprint(row): Returns the fingerprint of a request.
+"""
+
+import hashlib  # Empreinte compacte des champs de la requête
+
+import pandas as pd  # Détection des valeurs manquantes
+
+_SEPARATOR = "\x1f"
+
+
+def _field(value):
+    """
+    Return the text of a field, keeping None and NaN distinct from the empty string.
+    """
+    if value is None:
+        return "\x00None"
+    if not isinstance(value, str) and pd.isna(value):
+        return "\x00nan"
+    return str(value)
+
+
+def request_fingerprint(row):
+    """
+    Return the fingerprint of a request.
+
+    Parameters:
+    row (Mapping): The request, keyed by the dataset columns (a dict or a
+    row of a DataFrame).
+
+    Returns:
+    bytes: A 16-byte digest of the fields, taken verbatim.
+    """
+    fields = (
+        _field(row["Method"]),
+        _field(row["host"]),
+        _field(row["cookie"]),
+        _field(row["Accept"]),
+        _field(row["lenght"]),
+        _field(row["content"]),
+        _field(row["URL"]),
+    )
+    return hashlib.blake2b(_SEPARATOR.join(fields).encode("utf-8"), digest_size=16).digest()
@@ -0,0 +1,417 @@
+"""
+Module for the asynchronous batch scoring jobs.
+
+A job scores a large CSV file outside of the HTTP request: the uploaded
+file is spooled to local disk, then a background worker pool reads it chunk
+by chunk, scores each chunk and writes it as a part file. When all the
+chunks are scored, the parts are assembled into a single Parquet or CSV
+result file.
+
+Each job lives in its own directory under the jobs root:
+
+- input.csv: the spooled upload;
+- status.json: the state, the progress and the chunks already written;
+- part-000000.parquet, ...: the scored chunks;
+- result.parquet (or result.csv): the assembled result.
+
+The status file is the checkpoint of the job: after a restart, `resume`
+queues the unfinished jobs again and only the missing chunks are scored.
+
+Several worker processes can share the jobs directory. A job is scored by
+the process holding its claim, an exclusive lock (`fcntl.flock`) on its
+"job.lock" file: `resume` only queues the jobs it could claim, and the claim
+is released by the system if the process dies, so that the next `resume`
+takes the job over. The disk quota is checked and the upload spooled under
+an exclusive lock on the jobs directory, so that concurrent uploads cannot
+both fit in the same free space.
+
+Example usage:
+--------------
+jobs = JobManager("jobs", score_chunk, workers=1, chunk_size=10000, quota_bytes=1 << 30)
+jobs.resume()
+job_id = jobs.submit(upload.file, "parquet")
+print(jobs.status(job_id))
+
+Classes:
+--------
+- JobManager: Spools, schedules and tracks the scoring jobs.
+- JobQuotaExceeded: Raised when an upload does not fit in the disk quota.
+"""
+
+import os  # Gestion des répertoires des jobs
+import re  # Validation des identifiants de jobs
+import shutil  # Suppression des jobs
+import threading  # Accès concurrents aux statuts
+import time  # Horodatage des jobs
+import uuid  # Identifiants des jobs
+from concurrent.futures import ThreadPoolExecutor  # Pool de workers en arrière-plan
+from contextlib import contextmanager  # Verrou du quota sous forme de gestionnaire de contexte
+
+import pandas as pd  # Manipulation des données
+from src.data.load_data import iter_csv_data  # Lecture du fichier par chunks
+from src.data.save_data import FILE_FORMATS, load_json, save_frame, save_json
+from src.models.inference import DATASET_COLUMNS, extract_urls
+from src.serving.admission import count_rows  # Estimation du nombre de lignes
+from src.serving.metrics import counter, gauge
+
+try:
+    import fcntl  # Verrous partagés entre les workers
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+JOBS_SUBMITTED = counter("jobs_submitted_total", "Scoring jobs submitted.")
+JOBS_FINISHED = counter("jobs_finished_total", "Scoring jobs finished, by state.")
+JOBS_ROWS = counter("jobs_rows_total", "Rows scored by the jobs.")
+JOBS_DISK_BYTES = gauge("jobs_disk_bytes", "Disk space used by the jobs directory.")
+
+STATUS_FILE = "status.json"
+INPUT_FILE = "input.csv"
+LOCK_FILE = "job.lock"
+QUOTA_LOCK_FILE = ".quota.lock"
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+_COPY_SIZE = 1 << 20
+
+
+class JobQuotaExceeded(Exception):
+    """
+    Raised when an upload does not fit in the disk quota of the jobs.
+    """
+
+
+class JobManager:
+    """
+    Spool, schedule and track the scoring jobs.
+
+    Parameters:
+    root (str): The directory of the jobs.
+    score_chunk (callable): Called on each chunk (a DataFrame with the columns of
+    `DATASET_COLUMNS`); returns the predictions and a dict of per-row details,
+    like `predict_frame`.
+    workers (int): The number of jobs scored at the same time.
+    chunk_size (int): The number of rows per chunk.
+    quota_bytes (int): The maximum disk space used by the jobs directory (0: no limit).
+    """
+
+    def __init__(self, root, score_chunk, workers=1, chunk_size=10000, quota_bytes=0):
+        self.root = root
+        self.score_chunk = score_chunk
+        self.chunk_size = chunk_size
+        self.quota_bytes = quota_bytes
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jobs")
+        self._lock = threading.Lock()
+        self._quota_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _job_dir(self, job_id):
+        if not _JOB_ID.match(job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.root, job_id)
+
+    def _status_path(self, job_id):
+        return os.path.join(self._job_dir(job_id), STATUS_FILE)
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            status = load_json(self._status_path(job_id))
+            status.update(changes, updated=time.time())
+            save_json(status, self._status_path(job_id))
+            return status
+
+    def _claim(self, job_id):
+        """
+        Take the exclusive claim of a job.
+
+        Returns:
+        int or None: The file descriptor holding the claim, None if another
+        process (or thread) holds it.
+        """
+        fd = os.open(os.path.join(self._job_dir(job_id), LOCK_FILE), os.O_RDWR | os.O_CREAT)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return None
+        return fd
+
+    @contextmanager
+    def _quota_guard(self):
+        """
+        Serialize the quota checks of the uploads, between threads and processes.
+        """
+        with self._quota_lock:
+            fd = os.open(os.path.join(self.root, QUOTA_LOCK_FILE), os.O_RDWR | os.O_CREAT)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)  # Libère aussi le verrou
+
+    def disk_usage(self):
+        """
+        Return the disk space used by the jobs directory, in bytes.
+        """
+        total = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(directory, name))
+                except OSError:  # Fichier temporaire renommé entre-temps
+                    pass
+        JOBS_DISK_BYTES.set(total)
+        return total
+
+    def submit(self, file, file_format="parquet"):
+        """
+        Spool an uploaded CSV file to disk and queue its scoring.
+
+        Parameters:
+        file (file-like): The uploaded CSV file, opened in binary mode.
+        file_format (str): The format of the result, "parquet" or "csv".
+
+        Returns:
+        str: The identifier of the job.
+
+        Raises:
+        ValueError: If the result format is not supported.
+        JobQuotaExceeded: If the file does not fit in the disk quota.
+        """
+        if file_format not in FILE_FORMATS:
+            raise ValueError(f"Unsupported file format: {file_format}")
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+        # Réclamé avant l'écriture du statut : aucun autre worker ne peut le reprendre
+        claim = self._claim(job_id)
+
+        try:
+            if self.quota_bytes:
+                # Vérification et copie atomiques : l'espace libre n'est compté qu'une fois
+                with self._quota_guard():
+                    available = self.quota_bytes - self.disk_usage()
+                    self._spool(file, job_dir, available)
+            else:
+                self._spool(file, job_dir, None)
+            with open(os.path.join(job_dir, INPUT_FILE), "rb") as spool:
+                total_rows = count_rows(spool)
+
+            now = time.time()
+            save_json(
+                {
+                    "job_id": job_id,
+                    "state": "queued",
+                    "format": file_format,
+                    "chunk_size": self.chunk_size,
+                    "total_rows": total_rows,
+                    "rows_done": 0,
+                    "chunks_done": [],
+                    "error": None,
+                    "created": now,
+                    "updated": now,
+                },
+                self._status_path(job_id),
+            )
+        except BaseException:
+            os.close(claim)
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        JOBS_SUBMITTED.inc()
+        self.disk_usage()
+        self._executor.submit(self._run, job_id, claim)
+        return job_id
+
+    @staticmethod
+    def _spool(file, job_dir, available):
+        """
+        Copy an upload to the input file of a job, by blocks, until `available` bytes.
+        """
+        written = 0
+        with open(os.path.join(job_dir, INPUT_FILE), "wb") as spool:
+            for block in iter(lambda: file.read(_COPY_SIZE), b""):
+                written += len(block)
+                if available is not None and written > available:
+                    raise JobQuotaExceeded(
+                        f"Le fichier dépasse l'espace disque disponible pour les jobs "
+                        f"({max(available, 0)} octets)"
+                    )
+                spool.write(block)
+
+    def resume(self):
+        """
+        Queue again the jobs left unfinished by a previous process.
+
+        Only the jobs whose claim is free are queued: the jobs being scored by
+        another worker process are left to it.
+
+        Returns:
+        list: The identifiers of the resumed jobs.
+        """
+        resumed = []
+        for job_id in sorted(os.listdir(self.root)):
+            if not _JOB_ID.match(job_id):
+                continue
+            status = load_json(self._status_path(job_id))
+            if status is None or status["state"] not in ("queued", "running"):
+                continue
+            claim = self._claim(job_id)
+            if claim is None:
+                continue
+            # Statut relu sous le verrou : le job a pu se terminer entre-temps
+            status = load_json(self._status_path(job_id))
+            if status is None or status["state"] not in ("queued", "running"):
+                os.close(claim)
+                continue
+            self._executor.submit(self._run, job_id, claim)
+            resumed.append(job_id)
+        if resumed:
+            print(f"Jobs repris après redémarrage : {len(resumed)}")
+        self.disk_usage()
+        return resumed
+
+    def status(self, job_id):
+        """
+        Return the status of a job.
+
+        Parameters:
+        job_id (str): The identifier of the job.
+
+        Returns:
+        dict: The state ("queued", "running", "done" or "failed"), the progress
+        (fraction of the estimated rows already scored) and the error, if any.
+
+        Raises:
+        KeyError: If the job does not exist.
+        """
+        status = load_json(self._status_path(job_id))
+        if status is None:
+            raise KeyError(job_id)
+        status = {key: value for key, value in status.items() if key != "chunks_done"}
+        total = status["total_rows"]
+        if status["state"] == "done":
+            status["progress"] = 1.0
+        else:
+            status["progress"] = min(status["rows_done"] / total, 1.0) if total else 0.0
+        return status
+
+    def result_path(self, job_id):
+        """
+        Return the path to the result file of a finished job.
+
+        Raises:
+        KeyError: If the job does not exist.
+        ValueError: If the job is not finished.
+        """
+        status = self.status(job_id)
+        if status["state"] != "done":
+            raise ValueError(f"Le job {job_id} n'est pas terminé (état : {status['state']})")
+        return os.path.join(self._job_dir(job_id), f"result.{status['format']}")
+
+    def delete(self, job_id):
+        """
+        Delete a job and its files.
+
+        Raises:
+        KeyError: If the job does not exist.
+        ValueError: If the job is being scored.
+        """
+        if self.status(job_id)["state"] in ("queued", "running"):
+            raise ValueError(f"Le job {job_id} est en cours de traitement")
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+        self.disk_usage()
+
+    def _part_path(self, job_id, chunk_index, file_format):
+        return os.path.join(self._job_dir(job_id), f"part-{chunk_index:06d}.{file_format}")
+
+    def _run(self, job_id, claim):
+        try:
+            status = self._update(job_id, state="running")
+            file_format = status["format"]
+            chunk_size = status["chunk_size"]
+            done = set(status["chunks_done"])
+            chunks = iter_csv_data(
+                os.path.join(self._job_dir(job_id), INPUT_FILE),
+                chunk_size,
+                usecols=lambda column: column in DATASET_COLUMNS or column == "timestamp",
+                dtype={**{column: "object" for column in DATASET_COLUMNS}, "timestamp": "float64"},
+            )
+            chunk_count = 0
+            for chunk_index, chunk in enumerate(chunks):
+                chunk_count += 1
+                if chunk_index in done:
+                    continue
+                chunk = chunk.reset_index(drop=True)
+                predictions, details = self.score_chunk(chunk)
+                result = pd.DataFrame(
+                    {
+                        "row": chunk.index + chunk_index * chunk_size,
+                        "url": extract_urls(chunk["URL"]),
+                        "prediction": predictions.astype(int),
+                    }
+                )
+                for key, values in details.items():
+                    result[key] = values
+                save_frame(result, self._part_path(job_id, chunk_index, file_format), file_format)
+                # Checkpoint : le chunk n'est recompté qu'une fois son fichier écrit
+                with self._lock:
+                    status = load_json(self._status_path(job_id))
+                    status["chunks_done"].append(chunk_index)
+                    status["rows_done"] += len(chunk)
+                    status["updated"] = time.time()
+                    save_json(status, self._status_path(job_id))
+                JOBS_ROWS.inc(len(chunk))
+
+            self._assemble(job_id, chunk_count, file_format)
+            self._update(job_id, state="done")
+            JOBS_FINISHED.inc(state="done")
+            print(f"Job {job_id} terminé")
+        except Exception as e:
+            print(f"Job {job_id} en échec : {e}")
+            self._update(job_id, state="failed", error=str(e))
+            JOBS_FINISHED.inc(state="failed")
+        finally:
+            os.close(claim)  # Libère le job
+            self.disk_usage()
+
+    def _assemble(self, job_id, chunk_count, file_format):
+        """
+        Concatenate the part files of a job into its result file, then remove them.
+
+        The parts may not have the same detail columns (e.g. a chunk entirely
+        decided by the pre-filter has no "trees_evaluated"): the result has the
+        union of their columns, missing values being left empty.
+        """
+        parts = [self._part_path(job_id, index, file_format) for index in range(chunk_count)]
+        path = os.path.join(self._job_dir(job_id), f"result.{file_format}")
+        tmp_path = f"{path}.tmp"
+        if not parts:
+            save_frame(pd.DataFrame({"row": [], "url": [], "prediction": []}), path, file_format)
+            return
+        if file_format == "parquet":
+            import pyarrow as pa  # Concaténation des parties sans passer par pandas
+            import pyarrow.parquet as pq
+
+            schema = pa.unify_schemas([pq.read_schema(part).remove_metadata() for part in parts])
+            with pq.ParquetWriter(tmp_path, schema) as writer:
+                for part in parts:
+                    table = pq.read_table(part)
+                    columns = [
+                        table.column(field.name).cast(field.type)
+                        if field.name in table.column_names
+                        else pa.nulls(len(table), field.type)
+                        for field in schema
+                    ]
+                    writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+        else:
+            columns = []
+            for part in parts:
+                for column in pd.read_csv(part, nrows=0).columns:
+                    if column not in columns:
+                        columns.append(column)
+            for index, part in enumerate(parts):
+                pd.read_csv(part, dtype=object, keep_default_na=False).reindex(
+                    columns=columns
+                ).to_csv(tmp_path, mode="w" if index == 0 else "a", header=index == 0, index=False)
+        os.replace(tmp_path, path)  # Renommage atomique
+        for part in parts:
+            os.remove(part)
@@ -0,0 +1,268 @@
+"""
+Module for the memory accounting of the batch prediction endpoints.
+
+A batch request turns a modest upload into a much larger working set: the
+parsed DataFrame, the 32 derived feature columns, the one-hot matrix and the
+response. `MemoryBudget` estimates this footprint before the request is
+processed and measures it while it is processed:
+
+- the projected footprint is rows x estimated bytes per row, the bytes per row
+  being derived from the upload size per row (parsed strings) plus a fixed
+  cost for the features, the preprocessed matrix and the response;
+- a request whose projected footprint exceeds the budget is either rejected
+  (413) or processed by chunks sized to fit in the budget. The label encoding
+  of the categorical features depends on the rows encoded together, so the
+  predictions of a chunked request may differ from those of the same request
+  processed at once: chunking must be enabled explicitly;
+- a body that is parsed as a whole (raw HTTP or JSON requests) is checked from
+  its size alone, before it is read: its parsed strings cannot be chunked;
+- when allocation tracing is enabled, the peak allocation of the request is
+  measured with `tracemalloc` and used to recalibrate the estimate.
+
+Projected and measured peaks are reported per endpoint in `/metrics`.
+
+Configuration: MEMORY_BUDGET_MB (default 512, 0 disables the budget),
+MEMORY_OVER_BUDGET ("reject" by default, or "chunk") and MEMORY_TRACE=1
+(tracing slows down the allocations, it is meant for calibration; call
+`close` at shutdown to stop it).
+
+Example usage:
+--------------
+budget = from_env()
+plan = budget.plan("predict_csv", rows, upload_bytes)
+with budget.track(plan):
+    ...  # Traitement en une fois, ou par blocs de plan.chunk_rows lignes
+
+Classes:
+--------
+- MemoryPlan: The projected footprint and processing mode of a request.
+- MemoryBudget: Projects, limits and measures the memory of the requests.
+
+Functions:
+----------
+- from_env(): Creates the memory budget configured from the environment.
+"""
+
+import os  # Lecture de la configuration
+import threading  # Une seule mesure tracemalloc à la fois
+import tracemalloc  # Mesure des allocations pendant une requête
+from contextlib import contextmanager  # Mesure sous forme de gestionnaire de contexte
+
+from fastapi import HTTPException  # Rejet des requêtes trop grosses
+from src.serving.metrics import counter, gauge
+
+MEMORY_PROJECTED = gauge(
+    "memory_projected_bytes", "Projected footprint of the last batch request, by endpoint."
+)
+MEMORY_PEAK = gauge(
+    "memory_peak_bytes", "Measured peak allocation of the last traced batch request, by endpoint."
+)
+MEMORY_PEAK_MAX = gauge(
+    "memory_peak_bytes_max", "Largest measured peak allocation of a batch request, by endpoint."
+)
+MEMORY_ROW_BYTES = gauge(
+    "memory_row_bytes", "Estimated bytes per row of the last batch request, by endpoint."
+)
+MEMORY_REQUESTS = counter(
+    "memory_requests_total", "Batch requests, by endpoint and processing mode."
+)
+MEMORY_REJECTED = counter(
+    "memory_rejected_total", "Batch requests rejected by the memory budget, by endpoint."
+)
+
+# Octets en mémoire par octet téléversé : chaînes Python du DataFrame et copies du pipeline
+RAW_EXPANSION = 6.0
+# Octets par ligne indépendants de la taille des requêtes : features, matrice one-hot
+FIXED_ROW_BYTES = 1200
+# Octets par ligne de la réponse, conservée en entier même avec un traitement par blocs
+RESPONSE_ROW_BYTES = 200
+# Poids de la dernière mesure dans la correction de l'estimation, et bornes de la correction
+_CALIBRATION_WEIGHT = 0.2
+_CALIBRATION_BOUNDS = (0.25, 4.0)
+
+
+class MemoryPlan:
+    """
+    The projected footprint and processing mode of a request.
+
+    Parameters:
+    endpoint (str): The endpoint name, used as label of the metrics.
+    rows (int): The number of rows of the request.
+    row_bytes (int): The estimated bytes per row.
+    chunk_rows (int): The number of rows per chunk, or None to process the rows at once.
+    """
+
+    def __init__(self, endpoint, rows, row_bytes, chunk_rows=None):
+        self.endpoint = endpoint
+        self.rows = rows
+        self.row_bytes = row_bytes
+        self.chunk_rows = chunk_rows
+
+    @property
+    def projected(self):
+        return self.rows * (self.row_bytes + RESPONSE_ROW_BYTES)
+
+
+class MemoryBudget:
+    """
+    Project, limit and measure the memory footprint of the batch requests.
+
+    Parameters:
+    budget_bytes (int): The maximum projected footprint of a request (0: no limit).
+    over_budget (str): "reject" to reject the requests over budget with a 413
+    error, "chunk" to process them by chunks (the predictions may then differ,
+    see the module docstring).
+    trace (bool): Whether to measure the peak allocation of the requests with `tracemalloc`.
+    """
+
+    def __init__(self, budget_bytes=0, over_budget="reject", trace=False):
+        if over_budget not in ("chunk", "reject"):
+            raise ValueError(f"Unknown over-budget mode: {over_budget}")
+        self.budget_bytes = budget_bytes
+        self.over_budget = over_budget
+        self.trace = trace
+        self.calibration = 1.0
+        self._tracing = threading.Lock()
+        self._started = False  # Traçage tracemalloc démarré par ce budget
+
+    def row_bytes(self, rows, upload_bytes):
+        """
+        Return the estimated bytes per row of a request.
+
+        Parameters:
+        rows (int): The number of rows.
+        upload_bytes (int): The size of the uploaded body.
+
+        Returns:
+        int: The estimated bytes per row, excluding the response.
+        """
+        per_row = upload_bytes / max(rows, 1)
+        return int((per_row * RAW_EXPANSION + FIXED_ROW_BYTES) * self.calibration)
+
+    def check_upload(self, endpoint, upload_bytes):
+        """
+        Reject a body whose parsed strings alone would exceed the budget.
+
+        Parameters:
+        endpoint (str): The endpoint name.
+        upload_bytes (int): The size of the body, e.g. from its Content-Length header.
+
+        Raises:
+        HTTPException: 413 if the body, parsed as a whole, exceeds the budget.
+        """
+        parsed = int(upload_bytes * RAW_EXPANSION * self.calibration)
+        if self.budget_bytes and parsed > self.budget_bytes:
+            MEMORY_REJECTED.inc(endpoint=endpoint)
+            raise HTTPException(
+                status_code=413,
+                detail=(
+                    f"Corps de {upload_bytes // 2**20} Mo, trop gros pour le budget "
+                    f"mémoire de {self.budget_bytes // 2**20} Mo"
+                ),
+            )
+
+    def plan(self, endpoint, rows, upload_bytes):
+        """
+        Project the footprint of a request and choose how to process it.
+
+        Parameters:
+        endpoint (str): The endpoint name.
+        rows (int): The number of rows.
+        upload_bytes (int): The size of the uploaded body.
+
+        Returns:
+        MemoryPlan: The plan, with `chunk_rows` set if the request is over budget.
+
+        Raises:
+        HTTPException: 413 if the request is over budget and cannot be chunked,
+        i.e. in "reject" mode or if its response alone exceeds the budget.
+        """
+        plan = MemoryPlan(endpoint, rows, self.row_bytes(rows, upload_bytes))
+        MEMORY_PROJECTED.set(plan.projected, endpoint=endpoint)
+        MEMORY_ROW_BYTES.set(plan.row_bytes, endpoint=endpoint)
+        if not self.budget_bytes or plan.projected <= self.budget_bytes:
+            return plan
+
+        # Blocs dimensionnés pour tenir dans le budget, à côté de la réponse complète
+        available = self.budget_bytes - rows * RESPONSE_ROW_BYTES
+        chunk_rows = available // plan.row_bytes
+        if self.over_budget == "reject" or chunk_rows < 1:
+            MEMORY_REJECTED.inc(endpoint=endpoint)
+            raise HTTPException(
+                status_code=413,
+                detail=(
+                    f"Empreinte mémoire estimée de {plan.projected // 2**20} Mo, "
+                    f"au-delà du budget de {self.budget_bytes // 2**20} Mo"
+                ),
+            )
+        plan.chunk_rows = int(chunk_rows)
+        return plan
+
+    @contextmanager
+    def track(self, plan):
+        """
+        Count a request and, when tracing is enabled, measure its peak allocation.
+
+        The allocations of the whole process are traced: the peak is measured only
+        if no other request is being traced, so that it is not mixed with the
+        allocations of concurrent requests.
+
+        Parameters:
+        plan (MemoryPlan): The plan of the request.
+        """
+        MEMORY_REQUESTS.inc(
+            endpoint=plan.endpoint, mode="full" if plan.chunk_rows is None else "chunked"
+        )
+        if not self.trace or not self._tracing.acquire(blocking=False):
+            yield
+            return
+        try:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started = True
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            yield
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            self._record(plan, peak)
+        finally:
+            self._tracing.release()
+
+    def close(self):
+        """
+        Stop the allocation tracing started by the budget, if any.
+        """
+        with self._tracing:
+            if self._started and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self._started = False
+
+    def _record(self, plan, peak):
+        """
+        Report the measured peak of a request and recalibrate the estimate.
+        """
+        endpoint = plan.endpoint
+        MEMORY_PEAK.set(peak, endpoint=endpoint)
+        if peak > MEMORY_PEAK_MAX.value(endpoint=endpoint):
+            MEMORY_PEAK_MAX.set(peak, endpoint=endpoint)
+        rows = plan.rows if plan.chunk_rows is None else min(plan.rows, plan.chunk_rows)
+        expected = rows * plan.row_bytes + plan.rows * RESPONSE_ROW_BYTES
+        if expected > 0:
+            ratio = self.calibration * peak / expected
+            ratio = min(max(ratio, _CALIBRATION_BOUNDS[0]), _CALIBRATION_BOUNDS[1])
+            self.calibration += _CALIBRATION_WEIGHT * (ratio - self.calibration)
+        print(f"Mémoire ({endpoint}) : pic de {peak // 2**20} Mo pour {plan.rows} lignes")
+
+
+def from_env():
+    """
+    Create the memory budget configured from the environment.
+
+    Returns:
+    MemoryBudget: The budget read from MEMORY_BUDGET_MB, MEMORY_OVER_BUDGET and MEMORY_TRACE.
+    """
+    return MemoryBudget(
+        budget_bytes=int(os.getenv("MEMORY_BUDGET_MB", "512")) * 1024 * 1024,
+        over_budget=os.getenv("MEMORY_OVER_BUDGET", "reject"),
+        trace=os.getenv("MEMORY_TRACE", "0") == "1",
+    )
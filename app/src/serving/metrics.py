@@ -0,0 +1,161 @@
+"""
+Module for the API metrics.
+
+This module provides a minimal registry of counters and gauges, rendered in
+the Prometheus text exposition format by the `/metrics` endpoint, so that
+the serving stages (pre-filter, caches, admission control...) can expose
+their counters without an extra dependency.
+
+Example usage:
+--------------
+DECISIONS = counter("prefilter_decisions_total", "Rows decided by the pre-filter.")
+DECISIONS.inc(rule="static_assets")
+print(render())
+
+Functions:
+----------
+- counter(name, documentation): Returns the counter registered under this name.
+- gauge(name, documentation): Returns the gauge registered under this name.
+- render(): Renders all the metrics in the Prometheus text format.
+"""
+
+import threading  # Mises à jour concurrentes des métriques
+
+_REGISTRY = {}
+_LOCK = threading.Lock()
+
+
+class _Metric:
+    """
+    A metric with optional labels, whose values are stored per label set.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def value(self, **labels):
+        """
+        Return the current value for a label set.
+        """
+        return self.values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        """
+        Return the (labels, value) pairs of the metric.
+        """
+        with self.lock:
+            return list(self.values.items())
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing counter.
+    """
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """
+        Increment the counter of a label set.
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A value that can go up and down.
+    """
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        """
+        Set the value of a label set.
+        """
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+    def inc(self, amount=1, **labels):
+        """
+        Increment the value of a label set.
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        """
+        Decrement the value of a label set.
+        """
+        self.inc(-amount, **labels)
+
+
+def _register(metric_class, name, documentation):
+    with _LOCK:
+        metric = _REGISTRY.get(name)
+        if metric is None:
+            metric = _REGISTRY[name] = metric_class(name, documentation)
+        return metric
+
+
+def counter(name, documentation):
+    """
+    Return the counter registered under this name, creating it if needed.
+
+    Parameters:
+    name (str): The metric name, e.g. "prefilter_decisions_total".
+    documentation (str): The help text of the metric.
+
+    Returns:
+    Counter: The counter.
+    """
+    return _register(Counter, name, documentation)
+
+
+def gauge(name, documentation):
+    """
+    Return the gauge registered under this name, creating it if needed.
+
+    Parameters:
+    name (str): The metric name.
+    documentation (str): The help text of the metric.
+
+    Returns:
+    Gauge: The gauge.
+    """
+    return _register(Gauge, name, documentation)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def render():
+    """
+    Render all the metrics in the Prometheus text exposition format.
+
+    Returns:
+    str: The metrics.
+    """
+    lines = []
+    with _LOCK:
+        metrics = sorted(_REGISTRY.values(), key=lambda metric: metric.name)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in sorted(metric.samples()):
+            lines.append(f"{metric.name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,241 @@
+"""
+Module for the two-tier prediction cache of `/predict`.
+
+The cache is keyed by a namespace (model name, version and inference
+settings) and the request fingerprint of `src.serving.fingerprint`:
+
+- L1 is an in-process LRU dictionary, private to each worker;
+- L2 is an embedded SQLite database in WAL mode, shared by all the workers
+  and replicas that open the same file on the node (e.g. on the /dev/shm
+  tmpfs). Readers access it directly through the file, without any round
+  trip to another process, and do not block the writers.
+
+An L2 hit is copied into L1. L2 holds at most `max_entries` entries: the
+oldest ones are evicted every `evict_every` insertions. Hits and misses are
+counted per tier in `/metrics`.
+
+`get_local` and `put_local` only touch L1 and never block: they can be called
+from the event loop. `get_shared`, `put_shared` (and `get`, `put`, which
+combine both tiers) may wait for the SQLite lock (up to one second): from an
+async handler, call them in the thread pool.
+
+Example usage:
+--------------
+cache = PredictionCache("random_forest_detection:6:full", path="/dev/shm/predictions.sqlite")
+value = cache.get_local(fingerprint)
+if value is None and cache.shared:
+    value = await run_in_threadpool(cache.get_shared, fingerprint)
+
+Classes:
+--------
+- PredictionCache: The two-tier cache.
+"""
+
+import json  # Sérialisation des prédictions en cache
+import sqlite3  # Cache partagé entre workers
+import threading  # Connexions SQLite par thread
+import time  # Ordre d'insertion pour l'éviction
+from collections import OrderedDict  # Cache LRU en mémoire
+
+from src.serving.metrics import counter
+
+CACHE_REQUESTS = counter(
+    "prediction_cache_requests_total", "Prediction cache lookups, by tier and result."
+)
+CACHE_EVICTIONS = counter(
+    "prediction_cache_evictions_total", "Entries evicted from the prediction cache, by tier."
+)
+CACHE_ERRORS = counter(
+    "prediction_cache_errors_total", "Failed accesses to the shared prediction cache."
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    key BLOB PRIMARY KEY,
+    value TEXT NOT NULL,
+    created REAL NOT NULL
+)
+"""
+
+
+class PredictionCache:
+    """
+    Two-tier cache of the `/predict` results.
+
+    Parameters:
+    namespace (str): The model name, version and inference settings; entries of
+    another namespace are never returned.
+    path (str): The SQLite file of the shared tier (None: L1 only).
+    l1_size (int): The maximum number of entries of the in-process tier.
+    max_entries (int): The maximum number of entries of the shared tier.
+    evict_every (int): The number of insertions between two evictions of the shared tier.
+    """
+
+    def __init__(self, namespace, path=None, l1_size=4096, max_entries=100000, evict_every=1000):
+        self.prefix = namespace.encode("utf-8") + b"\x00"
+        self.path = path
+        self.l1_size = l1_size
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._inserts = 0
+        if path is not None:
+            connection = self._connection()
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(_SCHEMA)
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS predictions_created ON predictions (created)"
+            )
+            connection.commit()
+
+    def _connection(self):
+        # Une connexion par thread : les connexions SQLite ne se partagent pas
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _get_l1(self, key):
+        with self._lock:
+            value = self._l1.get(key)
+            if value is not None:
+                self._l1.move_to_end(key)
+            return value
+
+    def _put_l1(self, key, value):
+        with self._lock:
+            self._l1[key] = value
+            self._l1.move_to_end(key)
+            if len(self._l1) > self.l1_size:
+                self._l1.popitem(last=False)
+                CACHE_EVICTIONS.inc(tier="l1")
+
+    @property
+    def shared(self):
+        """
+        bool: Whether the cache has a shared (SQLite) tier.
+        """
+        return self.path is not None
+
+    def get(self, fingerprint):
+        """
+        Return the cached result of a request, or None.
+
+        Parameters:
+        fingerprint (bytes): The request fingerprint.
+
+        Returns:
+        dict or None: The cached result.
+        """
+        value = self.get_local(fingerprint)
+        if value is None and self.shared:
+            value = self.get_shared(fingerprint)
+        return value
+
+    def get_local(self, fingerprint):
+        """
+        Return the result cached in L1, or None, without blocking.
+
+        Parameters:
+        fingerprint (bytes): The request fingerprint.
+
+        Returns:
+        dict or None: The cached result.
+        """
+        value = self._get_l1(self.prefix + fingerprint)
+        CACHE_REQUESTS.inc(tier="l1", result="miss" if value is None else "hit")
+        return value
+
+    def get_shared(self, fingerprint):
+        """
+        Return the result cached in L2, or None; a hit is copied into L1.
+
+        Parameters:
+        fingerprint (bytes): The request fingerprint.
+
+        Returns:
+        dict or None: The cached result.
+        """
+        if not self.shared:
+            return None
+        key = self.prefix + fingerprint
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM predictions WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            CACHE_ERRORS.inc()
+            print(f"Cache partagé indisponible : {e}")
+            return None
+        if row is None:
+            CACHE_REQUESTS.inc(tier="l2", result="miss")
+            return None
+        CACHE_REQUESTS.inc(tier="l2", result="hit")
+        value = json.loads(row[0])
+        self._put_l1(key, value)
+        return value
+
+    def put(self, fingerprint, value):
+        """
+        Store the result of a request in both tiers.
+
+        Parameters:
+        fingerprint (bytes): The request fingerprint.
+        value (dict): The result, serializable in JSON.
+        """
+        self.put_local(fingerprint, value)
+        self.put_shared(fingerprint, value)
+
+    def put_local(self, fingerprint, value):
+        """
+        Store the result of a request in L1, without blocking.
+
+        Parameters:
+        fingerprint (bytes): The request fingerprint.
+        value (dict): The result.
+        """
+        self._put_l1(self.prefix + fingerprint, value)
+
+    def put_shared(self, fingerprint, value):
+        """
+        Store the result of a request in L2.
+
+        Parameters:
+        fingerprint (bytes): The request fingerprint.
+        value (dict): The result, serializable in JSON.
+        """
+        if not self.shared:
+            return
+        key = self.prefix + fingerprint
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO predictions (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+            connection.commit()
+            with self._lock:
+                self._inserts += 1
+                evict = self._inserts % self.evict_every == 0
+            if evict:
+                self._evict(connection)
+        except sqlite3.Error as e:
+            CACHE_ERRORS.inc()
+            print(f"Cache partagé indisponible : {e}")
+
+    def _evict(self, connection):
+        """
+        Remove the oldest entries of the shared tier beyond `max_entries`.
+        """
+        cursor = connection.execute(
+            "DELETE FROM predictions WHERE key IN ("
+            "SELECT key FROM predictions ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        connection.commit()
+        if cursor.rowcount > 0:
+            CACHE_EVICTIONS.inc(cursor.rowcount, tier="l2")
@@ -0,0 +1,195 @@
+"""
+Module for the rule-based pre-filter of the prediction endpoints.
+
+The pre-filter runs before the feature computation and the model. It is
+loaded from a YAML rules file and compiled at startup; requests matching an
+allow rule (e.g. GET of a static asset without query string nor body) get
+the verdict of the rule immediately. Every other request goes through the
+model, which stays authoritative for anything not covered by a rule.
+
+Rules file:
+-----------
+rules:
+  - name: static_assets        # Nom de la règle, reporté dans "decided_by"
+    verdict: 0                 # Classe renvoyée (0 = requête normale)
+    methods: [GET, HEAD]       # Méthodes acceptées
+    extensions: [.css, .js]    # Extensions du chemin (insensibles à la casse)
+    path_prefixes: [/static/]  # Préfixes du chemin
+    path_regex: "^/img/"       # Expression régulière sur le chemin
+    hosts: [localhost:8080]    # Valeurs acceptées de l'en-tête Host
+    no_query: true             # Pas de chaîne de requête ni de fragment
+    no_encoding: true          # Pas de caractère encodé (%) dans le chemin
+    empty_content: true        # Pas de corps
+
+All the conditions of a rule must hold; the first matching rule decides.
+
+Example usage:
+--------------
+prefilter = load_prefilter("prefilter_rules.yaml")
+verdicts, decided_by = prefilter.match_frame(df)
+
+Classes:
+--------
+- Prefilter: The compiled rules.
+
+Functions:
+----------
+- load_prefilter(path): Loads and compiles a rules file.
+"""
+
+import os  # Vérification de l'existence du fichier de règles
+import re  # Compilation des conditions sur le chemin
+
+import numpy as np  # Tableaux de verdicts
+import pandas as pd  # Détection des valeurs manquantes
+from src.config.load_config import load_config  # Lecture du fichier YAML de règles
+from src.serving.metrics import counter
+
+PREFILTER_DECISIONS = counter(
+    "prefilter_decisions_total", "Rows decided by a pre-filter rule, by rule."
+)
+PREFILTER_PASSED = counter(
+    "prefilter_passed_total", "Rows matched by no pre-filter rule and sent to the model."
+)
+
+_SCHEME = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*://[^/]*")
+
+
+def _is_empty(value):
+    """
+    Return True if a body or Content-Length value denotes an empty body.
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return True
+    value = str(value).strip()
+    return value == "" or value.rsplit(":", 1)[-1].strip() in ("", "0")
+
+
+class _Rule:
+    """
+    A compiled pre-filter rule.
+    """
+
+    def __init__(self, spec, index):
+        self.name = str(spec.get("name", f"rule_{index}"))
+        self.verdict = int(spec.get("verdict", 0))
+        methods = spec.get("methods")
+        self.methods = frozenset(method.upper() for method in methods) if methods else None
+        hosts = spec.get("hosts")
+        self.hosts = frozenset(hosts) if hosts else None
+        self.no_query = bool(spec.get("no_query", False))
+        self.no_encoding = bool(spec.get("no_encoding", False))
+        self.empty_content = bool(spec.get("empty_content", False))
+
+        # Extensions, préfixes et expression régulière compilés en une seule expression
+        patterns = []
+        extensions = spec.get("extensions")
+        if extensions:
+            alternatives = "|".join(re.escape(ext.lstrip(".")) for ext in extensions)
+            patterns.append(rf"(?i:.*\.(?:{alternatives})\Z)")
+        prefixes = spec.get("path_prefixes")
+        if prefixes:
+            patterns.append("(?:" + "|".join(re.escape(prefix) for prefix in prefixes) + ")")
+        if spec.get("path_regex"):
+            patterns.append(f"(?:{spec['path_regex']})")
+        self.path = None
+        if patterns:
+            self.path = re.compile("".join(f"(?={pattern})" for pattern in patterns))
+
+    def matches(self, method, host, target, content, length):
+        """
+        Return True if all the conditions of the rule hold for a request.
+        """
+        if self.methods is not None and method not in self.methods:
+            return False
+        if self.hosts is not None and host not in self.hosts:
+            return False
+        if self.no_query and ("?" in target or "#" in target):
+            return False
+        path = target.split("?", 1)[0]
+        if self.no_encoding and "%" in path:
+            return False
+        if self.empty_content and not (_is_empty(content) and _is_empty(length)):
+            return False
+        return self.path is None or self.path.match(path) is not None
+
+
+class Prefilter:
+    """
+    Rules compiled from a rules file, evaluated before the model.
+
+    Parameters:
+    rules (list of dict): The rule specifications, see the module documentation.
+    """
+
+    def __init__(self, rules):
+        self.rules = [_Rule(spec, index) for index, spec in enumerate(rules)]
+
+    def match(self, method, host, url, content, length):
+        """
+        Return the first rule matching a request, or None.
+
+        Parameters:
+        method (str): The HTTP method.
+        host (str): The Host header.
+        url (str): The "URL" field, e.g. "http://host/index.html HTTP/1.1".
+        content (str): The body.
+        length (str): The Content-Length field.
+
+        Returns:
+        _Rule or None: The matching rule.
+        """
+        # Chemin relatif, sans protocole ni hôte, et sans le suffixe " HTTP/1.1"
+        target = _SCHEME.sub("", str(url).split(" ", 1)[0]) or "/"
+        method = str(method).upper()
+        for rule in self.rules:
+            if rule.matches(method, host, target, content, length):
+                return rule
+        return None
+
+    def match_frame(self, data):
+        """
+        Evaluate the rules on each row of a DataFrame.
+
+        Parameters:
+        data (pd.DataFrame): The requests, with the columns of the dataset.
+
+        Returns:
+        np.ndarray: The verdict of each row, -1 when no rule matched.
+        np.ndarray: The name of the deciding rule of each row, None when no rule matched.
+        """
+        verdicts = np.full(len(data), -1, dtype=np.int64)
+        decided_by = np.full(len(data), None, dtype=object)
+        rows = zip(
+            data["Method"], data["host"], data["URL"], data["content"], data["lenght"]
+        )
+        for index, row in enumerate(rows):
+            rule = self.match(*row)
+            if rule is not None:
+                verdicts[index] = rule.verdict
+                decided_by[index] = rule.name
+                PREFILTER_DECISIONS.inc(rule=rule.name)
+        PREFILTER_PASSED.inc(int((verdicts < 0).sum()))
+        return verdicts, decided_by
+
+
+def load_prefilter(path):
+    """
+    Load and compile a rules file.
+
+    Parameters:
+    path (str): The path to the YAML rules file.
+
+    Returns:
+    Prefilter: The compiled rules.
+
+    Raises:
+    FileNotFoundError: If the file does not exist (e.g. a mistyped path).
+    ValueError: If the file defines no rule.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Pre-filter rules file not found: {path}")
+    rules = (load_config(path) or {}).get("rules") or []
+    if not rules:
+        raise ValueError(f"Pre-filter rules file defines no rule: {path}")
+    return Prefilter(rules)
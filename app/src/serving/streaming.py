@@ -0,0 +1,315 @@
+"""
+Module for the WebSocket streaming classification channel.
+
+Log shippers send request records continuously. Over `/predict`, each record
+pays for a connection, the parsing of the HTTP headers and the routing of
+FastAPI. On the streaming channel, a client keeps one WebSocket open, sends
+records (one JSON object or an array of objects per message, each with an
+optional correlation "id") and receives the predictions tagged with these IDs.
+
+The records of all the connections go through a `StreamBatcher`:
+
+- the messages are queued, and a single task groups the queued messages
+  into batches of at most `max_batch_rows` rows, waiting at most `max_delay`
+  seconds for more records when the queue is empty;
+- each batch is scored with `predict_frames` in the thread pool: the features
+  of each message are built separately, so that the prediction of a record
+  does not depend on the messages of the other connections (the label
+  encoding of the categorical features depends on all the rows of a call),
+  and the preprocessor and the model run once for the whole batch.
+
+Flow control bounds the memory whatever the speed of the producers: a
+connection has at most `max_pending_rows` rows queued or awaiting their
+response, and the batcher at most `max_queued_rows` rows. Once a limit is
+reached, the connection stops reading its socket until responses are sent,
+so a fast producer is slowed down by TCP instead of filling the memory. An
+error response (invalid or too large message) holds the credit of one row
+until it is sent, so a client sending only invalid messages is slowed down
+in the same way. The responses of a connection are sent in the order of its
+messages.
+
+Example usage:
+--------------
+batcher = StreamBatcher(lambda frames: predict_frames(frames, complete_pipeline, model))
+await serve_stream(websocket, batcher, columnar=False, max_pending_rows=1024)
+
+Classes:
+--------
+- StreamBatcher: Scores the records of all the connections by batches.
+
+Functions:
+----------
+- serve_stream(websocket, batcher, columnar, max_pending_rows): Serves one connection.
+"""
+
+import asyncio  # Files d'attente et tâches de la boucle d'événements
+import json  # Repli si orjson n'est pas installé
+
+import numpy as np  # Prédictions des messages vides
+from fastapi.concurrency import run_in_threadpool  # Calculs bloquants hors de la boucle
+from src.models.inference import extract_urls
+from src.serving.codec import decode_stream_records, encode_predictions
+from src.serving.metrics import counter, gauge
+
+try:
+    import orjson  # Encodage JSON rapide des erreurs
+except ImportError:  # pragma: no cover
+    orjson = None
+
+STREAM_CONNECTIONS = gauge(
+    "stream_connections", "Open connections of the streaming endpoint."
+)
+STREAM_MESSAGES = counter(
+    "stream_messages_total", "Messages received by the streaming endpoint, by result."
+)
+STREAM_ROWS = counter(
+    "stream_rows_total", "Records scored by the streaming endpoint."
+)
+STREAM_BATCHES = counter(
+    "stream_batches_total", "Batches scored by the streaming endpoint."
+)
+STREAM_BATCH_ROWS = gauge(
+    "stream_batch_rows", "Number of records of the last batch of the streaming endpoint."
+)
+STREAM_QUEUED_ROWS = gauge(
+    "stream_queued_rows", "Records queued or being scored by the streaming endpoint."
+)
+STREAM_THROTTLED = counter(
+    "stream_throttled_total", "Messages whose reading waited for the flow control."
+)
+
+
+def _encode_error(detail, ids=None):
+    """
+    Encode an error message of the streaming endpoint.
+    """
+    payload = {"error": detail, "ids": ids or []}
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+class _RowCredit:
+    """
+    Bound the number of rows admitted and not yet released.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.rows = 0
+        self._released = asyncio.Condition()
+
+    def _fits(self, rows):
+        # Un message plus grand que la limite passe seul, quand rien n'est en cours
+        return self.rows == 0 or self.rows + rows <= self.limit
+
+    async def acquire(self, rows):
+        """
+        Wait until `rows` more rows fit in the limit, and return True if it had to wait.
+        """
+        async with self._released:
+            waited = not self._fits(rows)
+            await self._released.wait_for(lambda: self._fits(rows))
+            self.rows += rows
+        return waited
+
+    async def release(self, rows):
+        """
+        Release `rows` rows.
+        """
+        async with self._released:
+            self.rows -= rows
+            self._released.notify_all()
+
+
+class StreamBatcher:
+    """
+    Score the records of all the connections of the streaming endpoint by batches.
+
+    Parameters:
+    predict (callable): Called in the thread pool with the list of the DataFrames of
+    requests of a batch, returns the predictions and the per-row details of each
+    DataFrame, e.g. `predict_frames`.
+    max_batch_rows (int): The maximum number of rows of a batch.
+    max_delay (float): The maximum time, in seconds, a batch waits for more
+    records when the queue is empty.
+    max_queued_rows (int): The maximum number of rows queued or being scored.
+    """
+
+    def __init__(self, predict, max_batch_rows=512, max_delay=0.002, max_queued_rows=8192):
+        self.predict = predict
+        self.max_batch_rows = max(1, max_batch_rows)
+        self.max_delay = max_delay
+        self._credit = _RowCredit(max_queued_rows)
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    async def submit(self, data):
+        """
+        Queue the requests of a message, waiting for room in the queue.
+
+        Parameters:
+        data (pd.DataFrame): The requests, with the columns of `DATASET_COLUMNS`.
+
+        Returns:
+        asyncio.Future: Resolved with the predictions and the details of the rows.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        await self._credit.acquire(len(data))
+        STREAM_QUEUED_ROWS.set(self._credit.rows)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((data, future))
+        return future
+
+    async def close(self):
+        """
+        Stop the batching task; the queued messages are not scored.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _next_batch(self):
+        """
+        Wait for a message, then collect the following ones up to `max_batch_rows` rows.
+        """
+        batch = [await self._queue.get()]
+        rows = len(batch[0][0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while rows < self.max_batch_rows:
+            if self._queue.empty():
+                # Attente courte des messages suivants, seulement si la file est vide
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self._queue.get_nowait()
+            batch.append(item)
+            rows += len(item[0])
+        return batch, rows
+
+    async def _run(self):
+        """
+        Score the batches one after the other.
+        """
+        while True:
+            batch, rows = await self._next_batch()
+            try:
+                results = await run_in_threadpool(self.predict, [data for data, _ in batch])
+            except Exception as error:  # pylint: disable=broad-except
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                STREAM_BATCHES.inc()
+                STREAM_BATCH_ROWS.set(rows)
+                STREAM_ROWS.inc(rows)
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                await self._credit.release(rows)
+                STREAM_QUEUED_ROWS.set(self._credit.rows)
+
+
+async def _send_responses(websocket, responses, credit, columnar):
+    """
+    Send the response of each message of a connection, in the order of the messages.
+    """
+    while True:
+        ids, urls, future, error, rows = await responses.get()
+        try:
+            if error is not None:
+                payload = _encode_error(error, ids)
+            else:
+                try:
+                    predictions, details = await future
+                except Exception as exception:  # pylint: disable=broad-except
+                    print(f"Exception: {exception}")
+                    payload = _encode_error(f"Error during prediction: {exception}", ids)
+                else:
+                    details = dict(details, id=np.array(ids, dtype=object))
+                    payload = encode_predictions(urls, predictions, columnar, details)
+            await websocket.send_text(payload.decode("utf-8"))
+        finally:
+            await credit.release(rows)
+
+
+async def _reply_error(responses, credit, error):
+    """
+    Queue an error response, holding the credit of one row until it is sent.
+    """
+    if await credit.acquire(1):
+        STREAM_THROTTLED.inc()
+    responses.put_nowait(([], None, None, error, 1))
+
+
+async def serve_stream(websocket, batcher, columnar=False, max_pending_rows=1024):
+    """
+    Serve one connection of the streaming endpoint until the client disconnects.
+
+    Each message of the client gets one response: the predictions of its
+    records, with the shape of `/predict_records` and the correlation IDs in
+    an "id" field, or {"error": ..., "ids": [...]} if it cannot be processed
+    (invalid JSON or request, more than `max_pending_rows` records); an error
+    response holds the credit of one row until it is sent.
+
+    Parameters:
+    websocket (fastapi.WebSocket): The accepted connection.
+    batcher (StreamBatcher): The batcher shared by the connections.
+    columnar (bool): Whether the responses use the columnar layout.
+    max_pending_rows (int): The maximum number of rows of the connection queued
+    or awaiting their response; the socket is not read beyond it.
+    """
+    credit = _RowCredit(max_pending_rows)
+    responses = asyncio.Queue()
+    sender = asyncio.ensure_future(_send_responses(websocket, responses, credit, columnar))
+    STREAM_CONNECTIONS.inc()
+    next_id = 0
+    try:
+        while not sender.done():
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            body = message.get("bytes")
+            if body is None:
+                body = (message.get("text") or "").encode("utf-8")
+            try:
+                ids, data = decode_stream_records(body, first_id=next_id)
+            except ValueError as error:
+                STREAM_MESSAGES.inc(result="invalid")
+                await _reply_error(responses, credit, f"Invalid message: {error}")
+                continue
+            next_id += len(ids)
+            if len(ids) > max_pending_rows:
+                STREAM_MESSAGES.inc(result="too_large")
+                await _reply_error(
+                    responses,
+                    credit,
+                    f"Message of {len(ids)} records, the limit is {max_pending_rows}",
+                )
+                continue
+            # Contrôle de flux : le socket n'est plus lu tant que les réponses sont en attente
+            if await credit.acquire(len(ids)):
+                STREAM_THROTTLED.inc()
+            STREAM_MESSAGES.inc(result="accepted")
+            if ids:
+                future = await batcher.submit(data)
+            else:
+                future = asyncio.get_running_loop().create_future()
+                future.set_result((np.array([], dtype=int), {}))
+            responses.put_nowait((ids, extract_urls(data["URL"]), future, None, len(ids)))
+    finally:
+        # Client déconnecté : les réponses en attente ne peuvent plus être envoyées
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+        STREAM_CONNECTIONS.dec()
@@ -0,0 +1,238 @@
+"""
+Module for the batch-size-aware thread control of the model prediction.
+
+The parallelism of the random forest (`n_jobs`) and of the BLAS/OpenMP
+thread pools is a loss for small calls: starting the threads costs more than
+the prediction of a few rows, and several workers sharing a limited CPU
+quota oversubscribe it. Large batches, on the other hand, leave the cores
+idle without it. `ThreadScheduler` chooses the number of threads per call:
+
+- a call gets one thread per `parallel_min_rows` rows (rounded down), up to
+  the share of the available CPUs of the worker; the threads in use by the
+  other calls of the worker are subtracted, so concurrent batches never use
+  more threads than the worker's share;
+- a call with a single thread (every call of fewer than twice
+  `parallel_min_rows` rows) runs on the calling thread, without any pool
+  (joblib sequential backend).
+
+The parallelism of a call comes from joblib only, whose configuration is
+local to the calling thread. The BLAS/OpenMP pools are process-wide: they are
+limited to one thread once, by `configure`, and never changed by the calls,
+so that concurrent calls cannot leave them raised (and the threads of a
+parallel call do not start BLAS threads of their own).
+
+The available CPUs take the CPU affinity and the cgroup quota (v1 or v2) of
+the container into account: with `cpu: 1000m`, a single core is available
+whatever the number of cores of the node.
+
+Configuration: INFERENCE_THREADS ("auto" by default: the CPU share of the
+worker, or a maximum number of threads, 1 disables the parallelism),
+INFERENCE_PARALLEL_MIN_ROWS (default 2000) and WEB_CONCURRENCY (the number
+of uvicorn workers sharing the CPUs, default 1).
+
+Example usage:
+--------------
+scheduler = from_env()
+scheduler.configure(get_forest(model), complete_pipeline)
+with scheduler.limit(len(X)):
+    predictions = model.predict(X)
+
+Classes:
+--------
+- ThreadScheduler: Chooses the number of threads of each prediction call.
+
+Functions:
+----------
+- available_cpus(): Returns the number of CPUs available to the process.
+- from_env(): Creates the scheduler configured from the environment.
+"""
+
+import os  # Lecture de la configuration et de l'affinité CPU
+import threading  # Comptage des threads utilisés par les appels simultanés
+from contextlib import contextmanager  # Limite sous forme de gestionnaire de contexte
+
+from joblib import parallel_config  # Parallélisme de la forêt, local au thread appelant
+from src.serving.metrics import counter, gauge
+
+try:
+    from threadpoolctl import ThreadpoolController  # Pools BLAS/OpenMP
+except ImportError:  # pragma: no cover
+    ThreadpoolController = None
+
+INFERENCE_CPUS = gauge(
+    "inference_cpus_available", "CPUs available to the worker (affinity and cgroup quota)."
+)
+INFERENCE_THREADS_MAX = gauge(
+    "inference_threads_max", "Maximum number of prediction threads of the worker."
+)
+INFERENCE_THREADS = gauge(
+    "inference_threads", "Number of threads of the last prediction call."
+)
+INFERENCE_THREADS_IN_USE = gauge(
+    "inference_threads_in_use", "Threads in use by the parallel prediction calls."
+)
+INFERENCE_CALLS = counter(
+    "inference_calls_total", "Prediction calls, by number of threads."
+)
+
+# Fichiers du quota CPU : cgroup v2, puis cgroup v1 (selon le montage)
+_CGROUP_V2 = "/sys/fs/cgroup/cpu.max"
+_CGROUP_V1 = ["/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct"]
+
+
+def _cgroup_quota():
+    """
+    Return the CPU quota of the cgroup of the process, in CPUs, or None if unlimited.
+    """
+    try:
+        with open(_CGROUP_V2, encoding="utf-8") as file:
+            quota, period = file.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    for directory in _CGROUP_V1:
+        try:
+            with open(os.path.join(directory, "cpu.cfs_quota_us"), encoding="utf-8") as file:
+                quota = int(file.read())
+            with open(os.path.join(directory, "cpu.cfs_period_us"), encoding="utf-8") as file:
+                period = int(file.read())
+        except (OSError, ValueError):
+            continue
+        return None if quota <= 0 or period <= 0 else quota / period
+    return None
+
+
+def available_cpus():
+    """
+    Return the number of CPUs available to the process.
+
+    Returns:
+    int: The number of CPUs of the affinity mask, bounded by the cgroup quota
+    (rounded down, at least 1).
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:  # pragma: no cover
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_quota()
+    if quota is not None:
+        cpus = min(cpus, int(quota))
+    return max(1, cpus)
+
+
+class ThreadScheduler:
+    """
+    Choose the number of threads of each prediction call from its number of rows.
+
+    Parameters:
+    cpus (int): The CPUs available to the process, see `available_cpus`.
+    workers (int): The number of worker processes sharing these CPUs.
+    max_threads (int): If given, the maximum number of threads of a call
+    (default: the share of the CPUs of the worker).
+    parallel_min_rows (int): The number of rows per thread; smaller calls
+    run on the calling thread.
+    """
+
+    def __init__(self, cpus=None, workers=1, max_threads=None, parallel_min_rows=2000):
+        self.cpus = cpus or available_cpus()
+        share = max(1, self.cpus // max(1, workers))
+        self.max_threads = max(1, min(share, max_threads or share))
+        self.parallel_min_rows = max(1, parallel_min_rows)
+        self._in_use = 0
+        self._lock = threading.Lock()
+        self._controller = ThreadpoolController() if ThreadpoolController else None
+        self._limits = None
+        INFERENCE_CPUS.set(self.cpus)
+        INFERENCE_THREADS_MAX.set(self.max_threads)
+
+    def configure(self, forest=None, complete_pipeline=None):
+        """
+        Hand the parallelism of the model over to the scheduler.
+
+        The `n_jobs` of the forest and of the preprocessor are reset to None, so
+        that joblib uses the configuration of each call, and the BLAS/OpenMP
+        pools are limited to one thread for the lifetime of the process.
+
+        Parameters:
+        forest (sklearn.ensemble.RandomForestClassifier): The forest of the model, if any.
+        complete_pipeline (sklearn.pipeline.Pipeline): The preprocessing pipeline, if any.
+        """
+        if forest is not None:
+            forest.n_jobs = None
+        if complete_pipeline is not None:
+            complete_pipeline.named_steps["preprocessor"].n_jobs = None
+        if self._controller is not None:
+            self._limits = self._controller.limit(limits=1)
+
+    def threads_for(self, rows):
+        """
+        Return the number of threads wanted for a call, before the threads in use are subtracted.
+
+        Parameters:
+        rows (int): The number of rows of the call.
+        """
+        return max(1, min(self.max_threads, rows // self.parallel_min_rows))
+
+    def _reserve(self, wanted):
+        """
+        Reserve at most `wanted` threads among the free threads of the worker.
+        """
+        if wanted <= 1:
+            return 1
+        with self._lock:
+            threads = max(1, min(wanted, self.max_threads - self._in_use))
+            if threads > 1:
+                self._in_use += threads
+                INFERENCE_THREADS_IN_USE.set(self._in_use)
+        return threads
+
+    def _release(self, threads):
+        """
+        Release the threads reserved by `_reserve`.
+        """
+        with self._lock:
+            self._in_use -= threads
+            INFERENCE_THREADS_IN_USE.set(self._in_use)
+
+    @contextmanager
+    def limit(self, rows):
+        """
+        Run the prediction of `rows` rows with the chosen number of threads.
+
+        Only the joblib configuration, local to the calling thread, is changed.
+
+        Parameters:
+        rows (int): The number of rows of the call.
+
+        Yields:
+        int: The number of threads of the call.
+        """
+        threads = self._reserve(self.threads_for(rows))
+        INFERENCE_THREADS.set(threads)
+        INFERENCE_CALLS.inc(threads=str(threads))
+        if threads == 1:
+            # Petits appels : aucun thread démarré
+            with parallel_config(backend="sequential"):
+                yield threads
+            return
+        try:
+            with parallel_config(backend="threading", n_jobs=threads):
+                yield threads
+        finally:
+            self._release(threads)
+
+
+def from_env():
+    """
+    Create the scheduler configured from the environment.
+
+    Returns:
+    ThreadScheduler: The scheduler read from INFERENCE_THREADS,
+    INFERENCE_PARALLEL_MIN_ROWS and WEB_CONCURRENCY.
+    """
+    max_threads = os.getenv("INFERENCE_THREADS", "auto")
+    return ThreadScheduler(
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        max_threads=None if max_threads == "auto" else int(max_threads),
+        parallel_min_rows=int(os.getenv("INFERENCE_PARALLEL_MIN_ROWS", "2000")),
+    )
@@ -0,0 +1,116 @@
+"""
+Benchmark of the request/response serialization paths.
+
+This script compares, for batches of synthetic requests:
+
+- the current path: pydantic validation of `PredictionRequest`, `.dict()`,
+  DataFrame construction, then `jsonable_encoder` + `json.dumps` as done by
+  FastAPI's default `JSONResponse`;
+- the fast codec path of `src.serving.codec`: `decode_records` from bytes and
+  `encode_predictions` (per-row and columnar layouts).
+
+Usage:
+------
+    PYTHONPATH=app python benchmarks/bench_codec.py --rows 1 100 10000
+"""
+
+import argparse  # Analyse des arguments de la ligne de commande
+import json  # Encodage JSON de référence
+import time  # Mesure des durées
+from typing import List  # Typage de la liste de requêtes
+
+import numpy as np  # Prédictions synthétiques
+import pandas as pd  # Manipulation des données
+from fastapi.encoders import jsonable_encoder  # Encodeur par défaut de FastAPI
+from pydantic import TypeAdapter  # Validation d'une liste de requêtes
+from main import PredictionRequest  # Modèle de requête de l'API
+from src.models.inference import DATASET_COLUMNS, extract_urls
+from src.serving.codec import decode_records, encode_predictions
+
+EXAMPLE = PredictionRequest.model_config["json_schema_extra"]["example"]
+
+
+def _payload(rows):
+    """
+    Build a JSON body of `rows` requests with distinct URLs.
+    """
+    records = [dict(EXAMPLE, URL=f"/page/{i}.html?id={i} HTTP/1.1") for i in range(rows)]
+    return json.dumps(records).encode("utf-8")
+
+
+def _current_path(body, predictions, adapter):
+    """
+    Decode and encode with pydantic and the default FastAPI encoder.
+    """
+    requests = adapter.validate_json(body)
+    data = pd.DataFrame([request.dict() for request in requests])
+    data.columns = DATASET_COLUMNS
+    urls = extract_urls(data["URL"])
+    response = [
+        {"url": url, "prediction": int(prediction)}
+        for url, prediction in zip(urls, predictions)
+    ]
+    return json.dumps(
+        jsonable_encoder({"predictions": response}),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _fast_path(body, predictions, columnar):
+    """
+    Decode and encode with the fast codec.
+    """
+    data = decode_records(body)
+    urls = extract_urls(data["URL"])
+    return encode_predictions(urls, predictions, columnar=columnar)
+
+
+def _timeit(function, repeat):
+    """
+    Return the best duration of `repeat` calls, in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    """
+    Run the benchmark and print one line per batch size and path.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    adapter = TypeAdapter(List[PredictionRequest])
+    for rows in args.rows:
+        body = _payload(rows)
+        predictions = np.random.default_rng(0).integers(0, 2, size=rows)
+        results = {
+            "actuel (pydantic + jsonable_encoder)": _timeit(
+                lambda: _current_path(body, predictions, adapter), args.repeat
+            ),
+            "codec (msgspec + orjson)": _timeit(
+                lambda: _fast_path(body, predictions, False), args.repeat
+            ),
+            "codec colonnaire": _timeit(
+                lambda: _fast_path(body, predictions, True), args.repeat
+            ),
+        }
+        reference = results["actuel (pydantic + jsonable_encoder)"]
+        for name, duration in results.items():
+            print(
+                f"{rows:>8} lignes | {name:<38} | {duration * 1e3:9.3f} ms "
+                f"| {rows / duration:12,.0f} lignes/s | x{reference / duration:5.1f}"
+            )
+
+
+# Point d'entrée du script
+if __name__ == "__main__":
+    main()
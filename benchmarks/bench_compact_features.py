@@ -0,0 +1,145 @@
+"""
+Benchmark of the compact feature representation of `build_features`.
+
+This script builds the features of a batch twice, with the default
+representation (int64 counters, one Python string per categorical value)
+and with `compact=True` (narrow integer counters, categorical codes), then
+reports for each mode:
+
+- the memory of the feature DataFrame (`memory_usage(deep=True)`);
+- the peak memory allocated while building the features and applying the
+  preprocessor (tracemalloc);
+- the throughput in rows per second.
+
+It also checks that the preprocessor outputs are identical, and, when a
+model URI is given, that the predictions are identical.
+
+Usage:
+------
+    PYTHONPATH=app python benchmarks/bench_compact_features.py --csv data.csv
+    PYTHONPATH=app python benchmarks/bench_compact_features.py --rows 100000 \\
+        --model-uri models:/random_forest_detection/6
+"""
+
+import argparse  # Analyse des arguments de la ligne de commande
+import contextlib  # Redirection des affichages de 'build_features'
+import io  # Tampon pour les affichages ignorés
+import time  # Mesure des durées
+import tracemalloc  # Mesure du pic d'allocation
+
+import joblib  # Pour charger le pipeline de prétraitement
+import numpy as np  # Comparaison des matrices
+import pandas as pd  # Manipulation des données
+import scipy.sparse as sp  # Matrices creuses produites par le OneHotEncoder
+from src.data.load_data import load_csv_data
+from src.features.build_features import build_features
+
+
+def synthetic_requests(rows, seed=0):
+    """
+    Build a DataFrame of synthetic GET/POST requests shaped like the dataset.
+    """
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(0, 10_000, size=rows)
+    post = rng.random(rows) < 0.3
+    urls = [
+        f"http://localhost:8080/tienda1/publico/{'anadir' if is_post else 'index'}.jsp"
+        + ("" if is_post else f"?id={i}&nombre=Vino+Rioja")
+        + " HTTP/1.1"
+        for i, is_post in zip(ids, post)
+    ]
+    contents = [
+        f"id={i}&nombre=Vino+Rioja&precio=85" if is_post else np.nan
+        for i, is_post in zip(ids, post)
+    ]
+    return pd.DataFrame(
+        {
+            "Method": np.where(post, "POST", "GET"),
+            "User-Agent": "Mozilla/5.0 (compatible; Konqueror/3.5; Linux)",
+            "Pragma": "no-cache",
+            "Cache-Control": "no-cache",
+            "Accept": "text/xml,application/xml,application/xhtml+xml",
+            "Accept-encoding": "x-gzip, x-deflate, gzip, deflate",
+            "Accept-charset": "utf-8, utf-8;q=0.5, *;q=0.5",
+            "language": "en",
+            "host": "localhost:8080",
+            "cookie": [f"JSESSIONID={i:032X}" for i in ids],
+            "content-type": np.where(post, "application/x-www-form-urlencoded", None),
+            "connection": "close",
+            "lenght": [
+                f"Content-Length: {len(c)}" if isinstance(c, str) else np.nan
+                for c in contents
+            ],
+            "content": contents,
+            "URL": urls,
+            "classification": 0,
+        }
+    )
+
+
+def _run(data, preprocessor, compact):
+    """
+    Build the features and apply the preprocessor, measuring memory and time.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        features, _, _, _ = build_features(data, compact=compact)
+    X = preprocessor.transform(features)
+    if compact:
+        X = X.astype(np.float32)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return X, {
+        "features_mb": features.memory_usage(deep=True).sum() / 1e6,
+        "peak_mb": peak / 1e6,
+        "rows_per_s": len(data) / duration,
+    }
+
+
+def _same(a, b):
+    """
+    Return True if two (possibly sparse) matrices are equal once cast to float32.
+    """
+    if sp.issparse(a):
+        return (a.astype(np.float32) != b.astype(np.float32)).nnz == 0
+    return np.array_equal(np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32))
+
+
+def main(argv=None):
+    """
+    Run the benchmark and print the comparison.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--csv", help="CSV file of requests. Default: synthetic requests.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--pipeline", default="complete_preprocessor_pipeline.pkl")
+    parser.add_argument("--model-uri", help="Also compare the predictions of this model.")
+    args = parser.parse_args(argv)
+
+    data = load_csv_data(args.csv) if args.csv else synthetic_requests(args.rows)
+    preprocessor = joblib.load(args.pipeline).named_steps["preprocessor"]
+
+    X_default, default = _run(data, preprocessor, compact=False)
+    X_compact, compact = _run(data, preprocessor, compact=True)
+
+    print(f"{len(data)} lignes")
+    for name, stats in (("défaut", default), ("compact", compact)):
+        print(
+            f"{name:<8} | features {stats['features_mb']:9.1f} Mo "
+            f"| pic {stats['peak_mb']:9.1f} Mo | {stats['rows_per_s']:10,.0f} lignes/s"
+        )
+    print(f"Sorties du preprocessor identiques : {_same(X_default, X_compact)}")
+
+    if args.model_uri:
+        import mlflow  # pylint: disable=import-outside-toplevel
+
+        model = mlflow.pyfunc.load_model(model_uri=args.model_uri)
+        identical = np.array_equal(model.predict(X_default), model.predict(X_compact))
+        print(f"Prédictions identiques : {identical}")
+
+
+# Point d'entrée du script
+if __name__ == "__main__":
+    main()
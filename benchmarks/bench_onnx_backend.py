@@ -0,0 +1,106 @@
+"""
+Benchmark of the onnxruntime backend against the scikit-learn path.
+
+This script builds the features of batches of requests once, then measures
+from these features:
+
+- the scikit-learn path: `preprocessor.transform` and `model.predict`;
+- the ONNX backend of `src.models.onnx_backend`, for each number of
+  intra-op threads.
+
+For single-row batches it reports the median and 99th percentile latency,
+for larger batches the throughput in rows per second. It also checks that
+the predictions of both paths are identical.
+
+Usage:
+------
+    PYTHONPATH=app python benchmarks/bench_onnx_backend.py \\
+        --model-uri models:/random_forest_detection/6 --rows 1 100 10000 --threads 1 4
+"""
+
+import argparse  # Analyse des arguments de la ligne de commande
+import contextlib  # Redirection des affichages du feature builder
+import io  # Tampon pour les affichages ignorés
+import os  # Fichier temporaire du graphe exporté
+import tempfile  # Répertoire du graphe exporté
+import time  # Mesure des durées
+
+import joblib  # Pour charger le pipeline de prétraitement
+import numpy as np  # Percentiles des latences
+from bench_compact_features import synthetic_requests  # Requêtes synthétiques
+from src.data.load_data import load_csv_data
+from src.models.export_onnx import export_onnx
+from src.models.onnx_backend import OnnxBackend, check_parity
+
+
+def _latencies(function, repeat):
+    """
+    Return the durations of `repeat` calls, in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return np.array(durations)
+
+
+def main(argv=None):
+    """
+    Run the benchmark and print one line per batch size and path.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--csv", help="CSV file of requests. Default: synthetic requests.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--pipeline", default="complete_preprocessor_pipeline.pkl")
+    parser.add_argument("--model-uri", default="models:/random_forest_detection/6")
+    parser.add_argument("--onnx", help="Exported graph. Default: exported from the model.")
+    args = parser.parse_args(argv)
+
+    import mlflow  # pylint: disable=import-outside-toplevel
+
+    complete_pipeline = joblib.load(args.pipeline)
+    model = mlflow.pyfunc.load_model(model_uri=args.model_uri)
+    preprocessor = complete_pipeline.named_steps["preprocessor"]
+    path = args.onnx
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "model.onnx")
+        export_onnx(complete_pipeline, model, path)
+    backends = {threads: OnnxBackend(path, intra_op_threads=threads) for threads in args.threads}
+
+    data = load_csv_data(args.csv) if args.csv else synthetic_requests(max(args.rows))
+    data = data.drop(columns="classification", errors="ignore")
+    parity = check_parity(backends[args.threads[0]], complete_pipeline, model, data)
+    print(f"Parité avec scikit-learn : {parity}")
+
+    for rows in args.rows:
+        with contextlib.redirect_stdout(io.StringIO()):
+            features = complete_pipeline.named_steps["feature_builder"].transform(
+                data.iloc[:rows].assign(classification=0)
+            )
+        if isinstance(features, tuple):  # Pipeline sauvegardé avec la cible
+            features = features[0]
+
+        paths = {"scikit-learn": lambda: model.predict(preprocessor.transform(features))}
+        for threads, backend in backends.items():
+            paths[f"onnxruntime ({threads} thread(s))"] = lambda backend=backend: backend(features)
+        for name, function in paths.items():
+            function()  # Préchauffage
+            durations = _latencies(function, args.repeat)
+            if rows == 1:
+                print(
+                    f"{rows:>8} ligne  | {name:<28} | p50 {np.median(durations) * 1e3:8.3f} ms "
+                    f"| p99 {np.percentile(durations, 99) * 1e3:8.3f} ms"
+                )
+            else:
+                print(
+                    f"{rows:>8} lignes | {name:<28} | {durations.min() * 1e3:9.3f} ms "
+                    f"| {rows / durations.min():12,.0f} lignes/s"
+                )
+
+
+# Point d'entrée du script
+if __name__ == "__main__":
+    main()
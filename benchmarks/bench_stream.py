@@ -0,0 +1,129 @@
+"""
+Benchmark of the WebSocket streaming channel against `/predict`.
+
+This script sends the same synthetic records to a running API:
+
+- through `/predict`, one HTTP request per record on a keep-alive connection,
+  each request waiting for its response;
+- through `/ws/predict`, on `--connections` WebSocket connections, with
+  `--message-rows` records per message; the messages are sent without
+  waiting for the responses, the flow control of the server slowing the
+  producer down.
+
+It reports the sustained throughput of both paths in records per second,
+and checks that every correlation ID of the stream gets its prediction.
+
+Usage:
+------
+    uvicorn app.main:app --port 5000 &
+    PYTHONPATH=app python benchmarks/bench_stream.py --url http://localhost:5000 \\
+        --records 2000 --message-rows 1 10 --connections 1 4
+"""
+
+import argparse  # Analyse des arguments de la ligne de commande
+import asyncio  # Connexions WebSocket simultanées
+import http.client  # Requêtes HTTP sur une connexion persistante
+import json  # Encodage des messages
+import time  # Mesure des durées
+from urllib.parse import urlparse  # Hôte et port de l'API
+
+import websockets  # Client WebSocket
+from main import PredictionRequest  # Modèle de requête de l'API
+
+EXAMPLE = PredictionRequest.model_config["json_schema_extra"]["example"]
+
+
+def _records(count):
+    """
+    Build `count` records with distinct URLs, so that the prediction cache is not used.
+    """
+    return [dict(EXAMPLE, URL=f"/page/{i}.html?id={i} HTTP/1.1") for i in range(count)]
+
+
+def _predict_throughput(url, records):
+    """
+    Return the throughput of `/predict`, in records per second.
+    """
+    location = urlparse(url)
+    connection = http.client.HTTPConnection(location.hostname, location.port)
+    headers = {"Content-Type": "application/json"}
+    start = time.perf_counter()
+    for record in records:
+        connection.request("POST", "/predict", json.dumps(record), headers)
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"/predict: HTTP {response.status}")
+    duration = time.perf_counter() - start
+    connection.close()
+    return len(records) / duration
+
+
+async def _stream(url, records, message_rows):
+    """
+    Stream the records on one connection and return the correlation IDs received.
+    """
+    received = set()
+    async with websockets.connect(url, max_size=None) as websocket:
+
+        async def send():
+            for start in range(0, len(records), message_rows):
+                await websocket.send(json.dumps(records[start:start + message_rows]))
+
+        sender = asyncio.ensure_future(send())
+        while len(received) < len(records):
+            response = json.loads(await websocket.recv())
+            if "error" in response:
+                raise RuntimeError(f"/ws/predict: {response['error']}")
+            received.update(row["id"] for row in response["predictions"])
+        await sender
+    return received
+
+
+async def _stream_throughput(url, records, message_rows, connections):
+    """
+    Return the throughput of `/ws/predict` with several connections, in records per second.
+    """
+    url = urlparse(url)._replace(scheme="ws", path="/ws/predict").geturl()
+    shares = [
+        [dict(record, id=index) for index, record in enumerate(records[share::connections])]
+        for share in range(connections)
+    ]
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_stream(url, share, message_rows) for share in shares))
+    duration = time.perf_counter() - start
+    for share, received in zip(shares, results):
+        if received != set(range(len(share))):
+            raise RuntimeError("/ws/predict: missing correlation IDs")
+    return len(records) / duration
+
+
+def main(argv=None):
+    """
+    Run the benchmark and print one line per path.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--message-rows", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args(argv)
+
+    records = _records(args.records)
+    _predict_throughput(args.url, records[:10])  # Préchauffage
+    throughput = _predict_throughput(args.url, records)
+    print(f"/predict      | 1 requête par enregistrement      | {throughput:10,.0f} enreg./s")
+    for connections in args.connections:
+        for message_rows in args.message_rows:
+            throughput = asyncio.run(
+                _stream_throughput(args.url, records, message_rows, connections)
+            )
+            print(
+                f"/ws/predict   | {connections} connexion(s), {message_rows:>4} enreg./message "
+                f"| {throughput:10,.0f} enreg./s"
+            )
+
+
+# Point d'entrée du script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Parity report of the bounded-cost feature mode (`scan_cap`).
+
+This script builds the features of a labelled dataset (e.g. the training
+data) without cap and with each given scan cap, predicts with the model and
+reports for each cap:
+
+- the rows whose URL or body is truncated;
+- the rows whose features differ from the uncapped features;
+- the agreement of the predictions with the uncapped predictions;
+- the accuracy against the "classification" label, with and without cap.
+
+It then measures the worst case: the time to build the features of a single
+request whose body has `--worst-case-mb` megabytes, without cap and with
+each cap.
+
+Usage:
+------
+    PYTHONPATH=app python benchmarks/report_scan_cap.py --csv data.csv \\
+        --caps 1024 4096 8192 --model-uri models:/random_forest_detection/6
+"""
+
+import argparse  # Analyse des arguments de la ligne de commande
+import contextlib  # Redirection des affichages de 'build_features'
+import io  # Tampon pour les affichages ignorés
+import time  # Mesure des durées
+
+import joblib  # Pour charger le pipeline de prétraitement
+import numpy as np  # Comparaison des features et des prédictions
+from bench_compact_features import synthetic_requests  # Requête synthétique du pire cas
+from src.data.load_data import load_csv_data
+from src.features.build_features import NUMERIC_FEATURES, build_features
+
+
+def _features(data, scan_cap):
+    """
+    Build the features of the rows, without the prints of `build_features`.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return build_features(data, scan_cap=scan_cap)
+
+
+def _worst_case(megabytes, caps):
+    """
+    Return the time to build the features of one request with a huge body, per cap.
+    """
+    request = synthetic_requests(1)
+    body = "id=1&nombre=" + "A%27+OR+1%3D1--+" * (megabytes * 2**20 // 16)
+    request["Method"], request["content"] = "POST", body
+    durations = {}
+    for cap in [None] + caps:
+        start = time.perf_counter()
+        _features(request, cap)
+        durations[cap] = time.perf_counter() - start
+    return durations
+
+
+def main(argv=None):
+    """
+    Run the report and print one line per cap.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--csv", required=True, help="Labelled CSV file, e.g. the training data.")
+    parser.add_argument("--caps", type=int, nargs="+", default=[1024, 4096, 8192])
+    parser.add_argument("--pipeline", default="complete_preprocessor_pipeline.pkl")
+    parser.add_argument("--model-uri", default="models:/random_forest_detection/6")
+    parser.add_argument("--worst-case-mb", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    import mlflow  # pylint: disable=import-outside-toplevel
+
+    data = load_csv_data(args.csv)
+    preprocessor = joblib.load(args.pipeline).named_steps["preprocessor"]
+    model = mlflow.pyfunc.load_model(model_uri=args.model_uri)
+    numeric = list(dict.fromkeys(NUMERIC_FEATURES))
+
+    reference, y, _, _ = _features(data, None)
+    expected = np.asarray(model.predict(preprocessor.transform(reference)))
+    print(f"{len(data)} lignes | sans plafond | exactitude {np.mean(expected == y):.4%}")
+
+    for cap in args.caps:
+        features, _, _, _ = _features(data, cap)
+        predictions = np.asarray(model.predict(preprocessor.transform(features)))
+        truncated = (features["url_truncated"] | features["content_truncated"]).astype(bool)
+        different = (features[numeric].to_numpy() != reference[numeric].to_numpy()).any(axis=1)
+        print(
+            f"plafond {cap:>7} | tronquées {truncated.mean():8.4%} "
+            f"| features différentes {different.mean():8.4%} "
+            f"| prédictions identiques {np.mean(predictions == expected):8.4%} "
+            f"| exactitude {np.mean(predictions == y):.4%}"
+        )
+
+    print(f"Pire cas : une requête avec un corps de {args.worst_case_mb} Mo")
+    for cap, duration in _worst_case(args.worst_case_mb, args.caps).items():
+        print(f"plafond {str(cap):>7} | {duration * 1e3:10.1f} ms")
+
+
+# Point d'entrée du script
+if __name__ == "__main__":
+    main()
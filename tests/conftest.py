@@ -0,0 +1,76 @@
+"""
+Shared configuration of the tests: the modules of the API are imported as
+`src....`, like in `app/main.py`.
+"""
+
+import os  # Chemin du dossier de l'application
+import sys  # Chemin d'import des modules
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "app"))
+
+import numpy as np  # Génération des requêtes synthétiques
+import pandas as pd  # Requêtes sous forme de DataFrame
+import pytest
+
+
+def _requests(rows, seed=0):
+    """
+    Return `rows` synthetic requests with the columns of the dataset, 40 % of them attacks.
+    """
+    rng = np.random.default_rng(seed)
+    records = []
+    for index in range(rows):
+        attack = rng.random() < 0.4
+        post = rng.random() < 0.3
+        page = "anadir" if post else "index"
+        url = f"http://localhost:8080/tienda1/publico/{page}.jsp"
+        if not post:
+            url += f"?id={index}" + ("&x=%27OR%201=1--" if attack else "")
+        content = f"id={index}&nombre=Vino" + ("%3Cscript%3E" if attack else "") if post else np.nan
+        records.append(
+            {
+                "Method": "POST" if post else "GET",
+                "User-Agent": "Mozilla/5.0",
+                "Pragma": "no-cache",
+                "Cache-Control": "no-cache",
+                "Accept": "text/html",
+                "Accept-encoding": "gzip",
+                "Accept-charset": "utf-8",
+                "language": "en",
+                "host": f"localhost:{8080 + index % 3}",
+                "cookie": f"JSESSIONID={index % 7}",
+                "content-type": "application/x-www-form-urlencoded" if post else np.nan,
+                "connection": "close",
+                "lenght": f"Content-Length: {len(content)}" if post else np.nan,
+                "content": content,
+                "classification": int(attack),
+                "URL": f"{url} HTTP/1.1",
+            }
+        )
+    return pd.DataFrame(records)
+
+
+@pytest.fixture
+def make_requests():
+    """
+    Return the factory of synthetic requests: make_requests(rows, seed=0).
+    """
+    return _requests
+
+
+@pytest.fixture(scope="session")
+def trained():
+    """
+    Return a preprocessing pipeline and a small forest fitted on synthetic requests.
+    """
+    from sklearn.ensemble import RandomForestClassifier  # pylint: disable=import-outside-toplevel
+    from src.features.preprocessing import (  # pylint: disable=import-outside-toplevel
+        preprocessing_pipeline,
+    )
+
+    data = _requests(300)
+    pipeline, _, _ = preprocessing_pipeline(n_jobs=None)
+    X = pipeline.fit_transform(data, data["classification"])
+    forest = RandomForestClassifier(n_estimators=24, max_depth=6, random_state=0)
+    forest.fit(X, data["classification"])
+    return pipeline, forest
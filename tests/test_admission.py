@@ -0,0 +1,157 @@
+"""
+Tests of the admission control and of its use with the single-flight coalescing.
+"""
+
+import asyncio  # Requêtes simultanées
+import io  # Fichiers CSV en mémoire
+import threading  # Calcul bloquant contrôlé par le test
+
+import pytest
+from fastapi import HTTPException
+from src.data.raw_http import parse_raw_requests
+from src.serving.admission import (
+    AdmissionController,
+    count_raw_requests,
+    count_records,
+    count_rows,
+)
+from src.serving.coalescing import SingleFlight
+
+
+def _controller(concurrency=1, queue_size=4, queue_timeout=1.0, max_rows=0):
+    return AdmissionController("test", concurrency, queue_size, queue_timeout, max_rows)
+
+
+async def _hold(controller, name, order, release, rows=1):
+    async with controller.admit(rows):
+        order.append(name)
+        await release.wait()
+
+
+def test_waiting_requests_are_admitted_in_arrival_order():
+    async def scenario():
+        controller = _controller(concurrency=1)
+        order, release = [], asyncio.Event()
+        tasks = []
+        for name in "abcd":
+            tasks.append(asyncio.ensure_future(_hold(controller, name, order, release)))
+            await asyncio.sleep(0)
+        assert order == ["a"] and len(controller._waiters) == 3
+        release.set()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["a", "b", "c", "d"]
+
+
+def test_head_of_queue_blocks_smaller_requests():
+    async def scenario():
+        controller = _controller(concurrency=0, max_rows=10)
+        order, release = [], asyncio.Event()
+        first = asyncio.ensure_future(_hold(controller, "first", order, release, rows=6))
+        await asyncio.sleep(0)
+        large = asyncio.ensure_future(_hold(controller, "large", order, release, rows=8))
+        await asyncio.sleep(0)
+        small = asyncio.ensure_future(_hold(controller, "small", order, release, rows=2))
+        await asyncio.sleep(0)
+        # La petite requête tiendrait dans le budget, mais attend derrière la grande
+        assert order == ["first"]
+        release.set()
+        await asyncio.gather(first, large, small)
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "large", "small"]
+
+
+def test_rejections():
+    async def scenario():
+        controller = _controller(concurrency=1, queue_size=1, queue_timeout=0.05, max_rows=10)
+        with pytest.raises(HTTPException) as too_large:
+            async with controller.admit(11):
+                pass
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(_hold(controller, "a", [], release))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(_hold(controller, "b", [], release))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as queue_full:
+            async with controller.admit():
+                pass
+        with pytest.raises(HTTPException) as timeout:
+            await waiter
+        release.set()
+        await holder
+        return too_large.value, queue_full.value, timeout.value, controller
+
+    too_large, queue_full, timeout, controller = asyncio.run(scenario())
+    assert too_large.status_code == 413 and too_large.headers is None
+    assert queue_full.status_code == 429 and "Retry-After" in queue_full.headers
+    assert timeout.status_code == 503
+    assert controller.in_flight == 0 and not controller._waiters
+
+
+def test_zero_queue_size_means_no_limit():
+    async def scenario():
+        controller = _controller(concurrency=1, queue_size=0)
+        order, release = [], asyncio.Event()
+        tasks = [asyncio.ensure_future(_hold(controller, i, order, release)) for i in range(20)]
+        await asyncio.sleep(0)
+        assert len(controller._waiters) == 19
+        release.set()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == list(range(20))
+
+
+def test_coalesced_requests_take_one_admission_place():
+    started, finish = threading.Event(), threading.Event()
+
+    def compute(value):
+        started.set()
+        finish.wait(5)
+        return value * 2
+
+    async def scenario():
+        controller = _controller(concurrency=1, queue_size=0)
+        single_flight = SingleFlight()
+        calls = [
+            asyncio.ensure_future(single_flight.run("key", compute, 21, admission=controller))
+            for _ in range(5)
+        ]
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        assert controller.in_flight == 1 and not controller._waiters
+        finish.set()
+        results = await asyncio.gather(*calls)
+        return results, controller
+
+    results, controller = asyncio.run(scenario())
+    assert results == [42] * 5
+    assert controller.in_flight == 0
+
+
+@pytest.mark.parametrize(
+    "content, rows",
+    [(b"", 0), (b"a,b\n", 0), (b"a,b\n1,2", 1), (b"a,b\n1,2\n3,4\n", 2)],
+)
+def test_count_rows(content, rows):
+    file = io.BytesIO(content)
+    assert count_rows(file) == rows
+    assert file.tell() == 0
+
+
+def test_count_raw_requests_is_an_upper_bound():
+    body = (
+        b"GET http://localhost:8080/index.jsp HTTP/1.1\r\nHost: localhost:8080\r\n\r\n"
+        b"POST http://localhost:8080/anadir.jsp HTTP/1.1\r\nContent-Length: 9\r\n\r\n"
+        b"a HTTP/1."
+    )
+    assert len(parse_raw_requests(body)) == 2
+    assert count_raw_requests(body) >= 2
+    assert count_raw_requests(b"") == 1
+
+
+def test_count_records():
+    record = b'{"Method": "GET", "content": "\\"URL\\"", "URL": "/ HTTP/1.1"}'
+    assert count_records(record) == 1
+    assert count_records(b"[" + b", ".join([record] * 3) + b"]") == 3
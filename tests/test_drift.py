@@ -0,0 +1,29 @@
+"""
+Tests of the running statistics of the drift monitor.
+"""
+
+import numpy as np
+import pytest
+from src.features.build_features import NUMERIC_FEATURES
+from src.monitoring.drift import DriftMonitor
+
+
+@pytest.mark.parametrize("layout", ["built", "consolidated", "extension"])
+def test_statistics_match_the_features(trained, make_requests, layout):
+    pipeline, _ = trained
+    requests = make_requests(64, seed=1).assign(classification=0)
+    features = pipeline.named_steps["feature_builder"].transform(requests)
+    features = features[0] if isinstance(features, tuple) else features
+    # Colonnes réparties autrement dans les blocs du DataFrame
+    if layout == "consolidated":
+        features = features.copy()
+    elif layout == "extension":
+        features = features.astype({"url_length": "Int64"})
+
+    monitor = DriftMonitor(NUMERIC_FEATURES, ["Method"], buffer_size=len(features))
+    monitor.update(features.iloc[:1], requests.iloc[:1])  # Une ligne, puis le reste
+    monitor.update(features.iloc[1:], requests.iloc[1:])
+    expected = features[monitor.numeric_features].to_numpy(dtype=np.float64)
+    assert monitor.count == len(features)
+    np.testing.assert_allclose(monitor.mean, expected.mean(axis=0))
+    np.testing.assert_array_equal(monitor.max, expected.max(axis=0))
@@ -0,0 +1,27 @@
+"""
+Tests of the early-exit evaluation of the random forest.
+"""
+
+import numpy as np  # Comparaison des prédictions
+from src.models.early_exit import EarlyExitPredictor
+from src.models.inference import DATASET_COLUMNS, predict_frame
+
+
+def test_early_exit_matches_the_full_forest(trained, make_requests):
+    pipeline, forest = trained
+    requests = make_requests(200, seed=2)[DATASET_COLUMNS]
+    X = pipeline.transform(requests.assign(classification=0))
+    predictions, details = EarlyExitPredictor(forest, chunk_size=4)(X)
+    np.testing.assert_array_equal(predictions, forest.predict(X))
+    trees = details["trees_evaluated"]
+    assert trees.min() >= 4 and trees.max() <= len(forest.estimators_)
+
+
+def test_early_exit_in_predict_frame(trained, make_requests):
+    pipeline, forest = trained
+    requests = make_requests(50, seed=3)[DATASET_COLUMNS]
+    predictions, details = predict_frame(
+        requests, pipeline, forest, predictor=EarlyExitPredictor(forest)
+    )
+    np.testing.assert_array_equal(predictions, predict_frame(requests, pipeline, forest)[0])
+    assert len(details["trees_evaluated"]) == len(requests)
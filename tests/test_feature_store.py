@@ -0,0 +1,35 @@
+"""
+Tests of the on-disk feature store.
+"""
+
+import os  # Répertoires des versions
+
+import pandas as pd  # Comparaison des features
+import pytest
+from src.features.build_features import build_features
+from src.features.custom_transformers import FeatureBuilder
+from src.features.feature_store import FeatureStore
+
+pytest.importorskip("pyarrow")
+
+
+def test_store_matches_build_features(tmp_path, make_requests):
+    data = make_requests(60)
+    store = FeatureStore(str(tmp_path))
+    expected = build_features(data)[0]
+    for _ in range(2):  # Calcul, puis relecture des partitions
+        pd.testing.assert_frame_equal(store.build_features(data)[0], expected)
+    assert store.last_stats["url"]["computed"] == 0
+
+
+def test_stale_versions_are_only_removed_by_prune(tmp_path, make_requests):
+    stale = tmp_path / "url" / "0000000000000000"
+    os.makedirs(stale)
+    builder = FeatureBuilder(feature_store=str(tmp_path), return_target=False)
+    builder.fit(make_requests(5))
+    builder.transform(make_requests(5))
+    store = builder.store_
+    builder.transform(make_requests(5))
+    assert builder.store_ is store and stale.exists()
+    assert store.prune() == ["url/0000000000000000"]
+    assert not stale.exists()
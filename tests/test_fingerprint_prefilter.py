@@ -0,0 +1,106 @@
+"""
+Tests of the request fingerprint against the pre-filter.
+
+Requests sharing a fingerprint share the coalesced and cached result, so two
+requests with the same fingerprint must get the same pre-filter decision.
+"""
+
+import itertools  # Paires de variantes
+
+import numpy as np  # Valeurs manquantes
+import pandas as pd  # Requêtes sous forme de DataFrame
+import pytest
+from src.serving.fingerprint import request_fingerprint
+from src.serving.prefilter import Prefilter, load_prefilter
+
+RULES = [
+    {
+        "name": "static_assets",
+        "verdict": 0,
+        "methods": ["GET"],
+        "hosts": ["localhost:8080"],
+        "extensions": [".css"],
+        "no_query": True,
+        "empty_content": True,
+    }
+]
+
+BASE = {
+    "Method": "GET",
+    "User-Agent": "Mozilla/5.0",
+    "Pragma": "no-cache",
+    "Cache-Control": "no-cache",
+    "Accept": "text/css",
+    "Accept-encoding": "gzip",
+    "Accept-charset": "utf-8",
+    "language": "en",
+    "host": "localhost:8080",
+    "cookie": "JSESSIONID=1",
+    "content-type": None,
+    "connection": "close",
+    "lenght": None,
+    "content": None,
+    "classification": None,
+    "URL": "http://localhost:8080/style.css HTTP/1.1",
+}
+
+# Variantes de chaque champ lu par le pré-filtre ou par build_features
+VARIANTS = {
+    "Method": ["GET", "get", " GET", "GET ", "POST"],
+    "host": ["localhost:8080", "LOCALHOST:8080", " localhost:8080", "localhost:8080 "],
+    "lenght": [None, np.nan, "", "0", "Content-Length: 0", "Content-Length: 12"],
+    "content": [None, np.nan, "", "a=1"],
+    "URL": [
+        "http://localhost:8080/style.css HTTP/1.1",
+        "http://localhost:8080/style.CSS HTTP/1.1",
+        "http://localhost:8080/style.css?v=1 HTTP/1.1",
+    ],
+}
+
+
+def _requests():
+    """
+    Return the requests differing from BASE by one field.
+    """
+    return [dict(BASE, **{field: value}) for field, values in VARIANTS.items() for value in values]
+
+
+def _decision(prefilter, request):
+    rule = prefilter.match(
+        request["Method"], request["host"], request["URL"], request["content"], request["lenght"]
+    )
+    return None if rule is None else (rule.name, rule.verdict)
+
+
+def test_same_fingerprint_implies_same_prefilter_decision():
+    prefilter = Prefilter(RULES)
+    for first, second in itertools.combinations(_requests(), 2):
+        if request_fingerprint(first) == request_fingerprint(second):
+            assert _decision(prefilter, first) == _decision(prefilter, second)
+
+
+@pytest.mark.parametrize("field", ["Method", "host"])
+def test_case_and_whitespace_variants_have_distinct_fingerprints(field):
+    fingerprints = {request_fingerprint(dict(BASE, **{field: value})) for value in VARIANTS[field]}
+    assert len(fingerprints) == len(VARIANTS[field])
+
+
+def test_missing_values_are_distinct_from_empty_string():
+    fingerprints = {
+        request_fingerprint(dict(BASE, content=value)) for value in (None, np.nan, "")
+    }
+    assert len(fingerprints) == 3
+
+
+def test_dataframe_row_and_dict_share_the_fingerprint():
+    frame = pd.DataFrame([BASE])
+    assert request_fingerprint(frame.iloc[0]) == request_fingerprint(BASE)
+
+
+def test_load_prefilter_rejects_missing_or_empty_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_prefilter(str(tmp_path / "missing.yaml"))
+    empty = tmp_path / "empty.yaml"
+    empty.write_text("rules: []\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_prefilter(str(empty))
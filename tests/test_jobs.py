@@ -0,0 +1,89 @@
+"""
+Tests of the claims and of the disk quota of the scoring jobs shared by several workers.
+"""
+
+import io  # Fichiers CSV en mémoire
+import threading  # Uploads simultanés et scoring bloqué
+
+import numpy as np  # Prédictions factices
+import pytest
+from src.models.inference import DATASET_COLUMNS
+from src.serving.jobs import JobManager, JobQuotaExceeded
+
+
+def _csv(rows):
+    lines = [",".join(DATASET_COLUMNS)]
+    lines += [",".join(["GET"] + ["x"] * (len(DATASET_COLUMNS) - 2) + [f"/p{i}"]) for i in range(rows)]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _score(chunk):
+    return np.zeros(len(chunk), dtype=int), {}
+
+
+def test_running_job_is_not_resumed_by_another_worker(tmp_path):
+    started, finish = threading.Event(), threading.Event()
+
+    def blocked_score(chunk):
+        started.set()
+        finish.wait(5)
+        return _score(chunk)
+
+    first = JobManager(str(tmp_path), blocked_score)
+    job_id = first.submit(io.BytesIO(_csv(3)), "csv")
+    assert started.wait(5)
+    # Second worker démarré pendant le scoring : le job reste au premier
+    second = JobManager(str(tmp_path), _score)
+    assert second.resume() == []
+    finish.set()
+    first._executor.shutdown(wait=True)
+    assert first.status(job_id)["state"] == "done"
+    assert second.resume() == []
+
+
+def test_unclaimed_unfinished_job_is_resumed_once(tmp_path):
+    first = JobManager(str(tmp_path), _score)
+    job_id = first.submit(io.BytesIO(_csv(3)), "csv")
+    first._executor.shutdown(wait=True)
+    # Job interrompu par l'arrêt d'un worker : état non terminé, verrou libre
+    first._update(job_id, state="running", chunks_done=[], rows_done=0)
+    workers = [JobManager(str(tmp_path), _score) for _ in range(2)]
+    resumed = [worker.resume() for worker in workers]
+    for worker in workers:
+        worker._executor.shutdown(wait=True)
+    assert sorted(resumed, key=len) == [[], [job_id]]
+    assert first.status(job_id)["state"] == "done"
+
+
+def test_concurrent_uploads_share_the_quota(tmp_path):
+    upload = _csv(2000)
+    manager = JobManager(str(tmp_path), _score, quota_bytes=int(len(upload) * 1.5))
+    idle = threading.Event()
+    manager._executor.submit(idle.wait, 5)  # Aucun job scoré pendant le test
+    outcomes, barrier = [], threading.Barrier(2)
+
+    def submit():
+        barrier.wait()
+        try:
+            outcomes.append(manager.submit(io.BytesIO(upload), "csv"))
+        except JobQuotaExceeded as error:
+            outcomes.append(error)
+
+    threads = [threading.Thread(target=submit) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    usage = manager.disk_usage()
+    idle.set()
+    manager._executor.shutdown(wait=True)
+    assert sum(isinstance(outcome, JobQuotaExceeded) for outcome in outcomes) == 1
+    assert usage <= manager.quota_bytes
+
+
+def test_rejected_upload_leaves_no_job(tmp_path):
+    manager = JobManager(str(tmp_path), _score, quota_bytes=10)
+    with pytest.raises(JobQuotaExceeded):
+        manager.submit(io.BytesIO(_csv(10)), "csv")
+    assert manager.resume() == []
+    assert [path.name for path in tmp_path.iterdir() if not path.name.startswith(".")] == []
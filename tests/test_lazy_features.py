@@ -0,0 +1,28 @@
+"""
+Tests of the model-driven selection of the features computed at inference.
+"""
+
+import copy  # Pipeline modifié sans toucher à la fixture partagée
+
+import numpy as np  # Comparaison des prédictions
+from src.models.inference import DATASET_COLUMNS, predict_frame
+from src.models.lazy_features import LAZY_FEATURES, select_features, used_features
+
+
+def test_selection_covers_the_lazy_features(trained):
+    pipeline, forest = trained
+    selection = select_features(pipeline.named_steps["preprocessor"], [forest])
+    assert selection["skipped"], "the small forest should leave some features unused"
+    assert set(selection["computed"]) | set(selection["skipped"]) == set(LAZY_FEATURES)
+    assert selection["splits"] == used_features(pipeline.named_steps["preprocessor"], [forest])
+
+
+def test_lazy_features_keep_the_predictions(trained, make_requests):
+    pipeline, forest = trained
+    requests = make_requests(200, seed=2)[DATASET_COLUMNS]
+    selection = select_features(pipeline.named_steps["preprocessor"], [forest])
+    lazy = copy.deepcopy(pipeline)
+    lazy.named_steps["feature_builder"].skipped_features = selection["skipped"]
+    expected, _ = predict_frame(requests, pipeline, forest)
+    predictions, _ = predict_frame(requests, lazy, forest)
+    np.testing.assert_array_equal(predictions, expected)
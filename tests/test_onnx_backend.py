@@ -0,0 +1,27 @@
+"""
+Tests of the ONNX export and of the onnxruntime inference backend.
+"""
+
+import numpy as np  # Comparaison des prédictions
+import pytest
+from src.models.inference import DATASET_COLUMNS, predict_frame
+
+
+def test_onnx_backend_matches_scikit_learn(trained, make_requests, tmp_path):
+    pytest.importorskip("skl2onnx")
+    pytest.importorskip("onnxruntime")
+    from src.models.export_onnx import export_onnx  # pylint: disable=import-outside-toplevel
+    from src.models.onnx_backend import (  # pylint: disable=import-outside-toplevel
+        OnnxBackend,
+        check_parity,
+    )
+
+    pipeline, forest = trained
+    requests = make_requests(200, seed=2)[DATASET_COLUMNS]
+    path = str(tmp_path / "model.onnx")
+    export_onnx(pipeline, forest, path)
+    backend = OnnxBackend(path)
+    assert backend.matches(forest)
+    assert check_parity(backend, pipeline, forest, requests)["different"] == 0
+    predictions, _ = predict_frame(requests, pipeline, forest, predictor=backend)
+    np.testing.assert_array_equal(predictions, predict_frame(requests, pipeline, forest)[0])
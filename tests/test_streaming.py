@@ -0,0 +1,152 @@
+"""
+Tests of the WebSocket streaming channel: flow control and batching.
+"""
+
+import asyncio  # Connexions simulées
+import json  # Messages des clients
+
+import numpy as np  # Prédictions factices
+import pytest
+from src.models.inference import DATASET_COLUMNS, REQUEST_FIELDS, predict_frame, predict_frames
+from src.serving.prefilter import Prefilter
+from src.serving.streaming import StreamBatcher, serve_stream
+
+
+class _Socket:
+    """
+    A WebSocket connection whose messages and sends are driven by the test.
+    """
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.received = 0
+        self.sent = []
+        self.can_send = asyncio.Event()
+        self.can_send.set()
+
+    def push(self, payload):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": json.dumps(payload)})
+
+    def push_raw(self, text):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": text})
+
+    def close(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect"})
+
+    async def receive(self):
+        message = await self.incoming.get()
+        self.received += 1
+        return message
+
+    async def send_text(self, text):
+        await self.can_send.wait()
+        self.sent.append(json.loads(text))
+
+
+def _record(index, **fields):
+    row = dict(
+        zip(
+            REQUEST_FIELDS,
+            ["GET", "Mozilla/5.0", "no-cache", "no-cache", "text/html", "gzip", "utf-8",
+             "en", "localhost:8080", "JSESSIONID=1", None, "close", None, None,
+             f"http://localhost:8080/page/{index}.html HTTP/1.1"],
+        )
+    )
+    row.update(fields)
+    return row
+
+
+async def _until(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+
+def test_error_responses_hold_flow_control_credit():
+    async def scenario():
+        socket = _Socket()
+        socket.can_send.clear()
+        batcher = StreamBatcher(lambda frames: [(np.zeros(len(f), dtype=int), {}) for f in frames])
+        for _ in range(10):
+            socket.push_raw("not json")
+        server = asyncio.ensure_future(serve_stream(socket, batcher, max_pending_rows=3))
+        await asyncio.sleep(0.05)
+        # Trois erreurs en attente d'envoi : la quatrième attend du crédit, le socket n'est plus lu
+        assert socket.received == 4
+        socket.can_send.set()
+        await _until(lambda: len(socket.sent) == 10)
+        socket.close()
+        await server
+        await batcher.close()
+        return socket.sent
+
+    sent = asyncio.run(scenario())
+    assert all(response["error"].startswith("Invalid message") for response in sent)
+
+
+def test_too_large_message_is_rejected_and_the_connection_continues():
+    async def scenario():
+        socket = _Socket()
+        batcher = StreamBatcher(lambda frames: [(np.ones(len(f), dtype=int), {}) for f in frames])
+        socket.push([_record(i) for i in range(5)])
+        socket.push([_record(i, id=f"r{i}") for i in range(2)])
+        server = asyncio.ensure_future(serve_stream(socket, batcher, max_pending_rows=4))
+        await _until(lambda: len(socket.sent) == 2)
+        socket.close()
+        await server
+        await batcher.close()
+        return socket.sent
+
+    too_large, accepted = asyncio.run(scenario())
+    assert too_large["error"] == "Message of 5 records, the limit is 4"
+    assert [row["id"] for row in accepted["predictions"]] == ["r0", "r1"]
+    assert [row["prediction"] for row in accepted["predictions"]] == [1, 1]
+
+
+def test_batches_keep_the_messages_of_the_connections_apart():
+    batches = []
+
+    def predict(frames):
+        batches.append([len(frame) for frame in frames])
+        return [(np.full(len(frame), index), {}) for index, frame in enumerate(frames)]
+
+    async def scenario():
+        sockets = [_Socket(), _Socket()]
+        batcher = StreamBatcher(predict, max_delay=0.05)
+        sockets[0].push([_record(i) for i in range(3)])
+        sockets[1].push([_record(i) for i in range(2)])
+        servers = [asyncio.ensure_future(serve_stream(socket, batcher)) for socket in sockets]
+        await _until(lambda: all(socket.sent for socket in sockets))
+        for socket in sockets:
+            socket.close()
+        await asyncio.gather(*servers)
+        await batcher.close()
+        return [socket.sent[0]["predictions"] for socket in sockets]
+
+    first, second = asyncio.run(scenario())
+    assert batches == [[3, 2]]
+    assert [row["prediction"] for row in first] == [0, 0, 0]
+    assert [row["prediction"] for row in second] == [1, 1]
+    assert [row["id"] for row in second] == [0, 1]
+
+
+@pytest.mark.parametrize(
+    "prefilter", [None, Prefilter([{"name": "posts", "verdict": 1, "methods": ["POST"]}])]
+)
+def test_batched_prediction_matches_each_message_alone(trained, make_requests, prefilter):
+    pipeline, forest = trained
+    requests = make_requests(90, seed=1)[DATASET_COLUMNS]
+    # Messages de connexions différentes, avec des valeurs catégorielles différentes
+    frames = [
+        requests.iloc[:40].reset_index(drop=True),
+        requests.iloc[40:43].reset_index(drop=True),
+        requests.iloc[43:].reset_index(drop=True),
+    ]
+    batched = predict_frames(frames, pipeline, forest, prefilter=prefilter)
+    for frame, (predictions, details) in zip(frames, batched):
+        expected, expected_details = predict_frame(frame, pipeline, forest, prefilter=prefilter)
+        np.testing.assert_array_equal(predictions, expected)
+        assert details.keys() == expected_details.keys()
+        for key, values in details.items():
+            np.testing.assert_array_equal(values, expected_details[key])
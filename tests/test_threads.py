@@ -0,0 +1,47 @@
+"""
+Tests of the batch-size-aware thread control of the prediction.
+"""
+
+from joblib.parallel import SequentialBackend, get_active_backend
+from src.serving.threads import ThreadScheduler
+
+
+class _Controller:
+    """
+    Record the BLAS/OpenMP limits set through threadpoolctl.
+    """
+
+    def __init__(self):
+        self.limits = []
+
+    def limit(self, limits):
+        self.limits.append(limits)
+
+
+def test_threads_follow_the_rows_and_the_threads_in_use():
+    scheduler = ThreadScheduler(cpus=4, max_threads=4, parallel_min_rows=100)
+    assert [scheduler.threads_for(rows) for rows in (1, 199, 200, 350, 10_000)] == [1, 1, 2, 3, 4]
+    with scheduler.limit(300) as first:
+        assert get_active_backend()[1] == 3
+        with scheduler.limit(10_000) as second:
+            # Un seul thread encore libre : appel exécuté sur le thread appelant
+            assert (first, second) == (3, 1)
+            assert isinstance(get_active_backend()[0], SequentialBackend)
+    assert scheduler._in_use == 0
+    with scheduler.limit(10_000) as threads:
+        assert threads == 4
+
+
+def test_calls_never_change_the_blas_limit():
+    scheduler = ThreadScheduler(cpus=4, max_threads=4, parallel_min_rows=100)
+    scheduler._controller = _Controller()
+    scheduler.configure()
+    assert scheduler._controller.limits == [1]
+    # Appels simultanés terminés dans le désordre : la limite du processus n'est pas modifiée
+    first, second = scheduler.limit(200), scheduler.limit(200)
+    first.__enter__()
+    second.__enter__()
+    first.__exit__(None, None, None)
+    second.__exit__(None, None, None)
+    assert scheduler._controller.limits == [1]
+    assert scheduler._in_use == 0
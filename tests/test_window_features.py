@@ -0,0 +1,101 @@
+"""
+Tests of the sliding-window features and of their use by the feature builder.
+"""
+
+import numpy as np  # Horodatages
+import pandas as pd  # Lignes de journal rejouées
+import pytest
+from src.data.access_logs import parse_log_line
+from src.features.custom_transformers import FeatureBuilder
+from src.features.window_features import WINDOW_FEATURES, SlidingWindowFeatures
+from src.models.inference import DATASET_COLUMNS, predict_frame, reusable_predictions
+
+
+def _timestamped(requests, seconds):
+    return requests.assign(timestamp=1_700_000_000.0 + np.asarray(seconds, dtype=float))
+
+
+def test_requests_without_timestamp_are_rejected(make_requests):
+    requests = make_requests(10)
+    with pytest.raises(ValueError, match="timestamp"):
+        FeatureBuilder(window_features=True).fit(requests)
+    with pytest.raises(ValueError, match="timestamp"):
+        SlidingWindowFeatures().transform(requests)
+
+
+def test_counts_follow_the_timestamps(make_requests):
+    requests = make_requests(4).assign(host="a", cookie="c")
+    # Deux requêtes, puis deux autres deux fenêtres plus tard
+    features = SlidingWindowFeatures(window_seconds=60).transform(
+        _timestamped(requests, [0, 1, 200, 201])
+    )
+    assert features["host_window_requests"].tolist() == [1, 2, 1, 2]
+
+
+def test_fit_resets_the_counters(make_requests):
+    requests = _timestamped(make_requests(30), np.arange(30))
+    builder = FeatureBuilder(window_features=True, return_target=False)
+    first = builder.fit_transform(requests)[WINDOW_FEATURES]
+    builder.transform(requests)
+    second = builder.fit_transform(requests)[WINDOW_FEATURES]
+    assert first.equals(second)
+
+
+class _Recorder:
+    """
+    Drift monitor stand-in that records the window counts of the scored rows.
+    """
+
+    def __init__(self):
+        self.counts = []
+
+    def update(self, features, data):  # pylint: disable=unused-argument
+        self.counts += features["host_window_requests"].tolist()
+
+
+def _window_model(requests):
+    """
+    Return a pipeline with window features and a small forest fitted on the requests.
+    """
+    from sklearn.ensemble import RandomForestClassifier  # pylint: disable=import-outside-toplevel
+    from src.features.preprocessing import (  # pylint: disable=import-outside-toplevel
+        preprocessing_pipeline,
+    )
+
+    data = _timestamped(requests, np.arange(len(requests)))
+    pipeline, _, _ = preprocessing_pipeline(window_features=True)
+    X = pipeline.fit_transform(data, data["classification"])
+    forest = RandomForestClassifier(n_estimators=4, random_state=0).fit(X, data["classification"])
+    return pipeline, forest
+
+
+def test_identical_requests_are_all_counted(make_requests):
+    pipeline, forest = _window_model(make_requests(100))
+
+    # L'API ne réutilise pas les prédictions : chaque requête identique est comptée
+    assert not reusable_predictions(pipeline)
+    request = make_requests(1)[DATASET_COLUMNS].assign(host="example.org")
+    recorder = _Recorder()
+    for _ in range(5):
+        predict_frame(request, pipeline, forest, monitor=recorder)
+    assert recorder.counts == [1, 2, 3, 4, 5]
+
+
+def test_replayed_logs_keep_their_time(make_requests):
+    pipeline, forest = _window_model(make_requests(100))
+    lines = [
+        b'10.0.0.1 - - [10/Oct/2000:13:55:%02d -0700] "GET /a HTTP/1.1" 200 12' % second
+        for second in (0, 1)
+    ] + [b'10.0.0.1 - - [10/Oct/2000:14:05:00 -0700] "GET /a HTTP/1.1" 200 12']
+    rows = [parse_log_line(line, default_host="example.org") for line in lines]
+    assert rows[1]["timestamp"] - rows[0]["timestamp"] == 1
+
+    # Deux lignes dans la même fenêtre, la troisième dix minutes plus tard
+    recorder = _Recorder()
+    predict_frame(
+        pd.DataFrame(rows, columns=DATASET_COLUMNS + ["timestamp"]),
+        pipeline,
+        forest,
+        monitor=recorder,
+    )
+    assert recorder.counts == [1, 2, 1]